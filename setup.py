@@ -91,7 +91,7 @@ setup(
     packages      = find_packages('src'),
     
     # scripts list isn't affected by the package_dir dict
-    scripts      = ["src/DDNTool.py"],
+    scripts      = ["src/DDNTool.py", "src/DDNArchive.py"],
 
     # this is the sample configuration file and the appropriate startup script
     data_files   = [('/etc/', ['src/ddntool.conf.sample']), startup_tuple]
@@ -0,0 +1,58 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import unittest
+
+from DDNToolSupport.backoff import RestartBackoff, CLOSED, OPEN, HALF_OPEN
+
+class Backoff_Test( unittest.TestCase):
+
+    def testDoubling(self):
+        # random_func always returns 0, so the delay is exactly half
+        backoff = RestartBackoff( 'sfa1', 2.0, 30.0, 60.0, lambda: 0.0)
+        now = 1000.0
+        delays = [ ]
+        for i in range(6):
+            delays.append( backoff.process_died( now))
+            self.assertEqual( backoff.state, OPEN)
+            self.assertFalse( backoff.should_restart( now + delays[-1] - 0.1))
+            now += delays[-1]
+            self.assertTrue( backoff.should_restart( now))
+            self.assertEqual( backoff.state, HALF_OPEN)
+        self.assertEqual( delays, [ 1.0, 2.0, 4.0, 8.0, 15.0, 15.0 ])
+
+    def testJitter(self):
+        backoff = RestartBackoff( 'sfa1', 2.0, 30.0, 60.0, lambda: 0.999)
+        backoff.process_died( 0.0)
+        delay = backoff.process_died( 0.0)
+        self.assertTrue( 2.0 < delay < 4.0)
+
+    def testRecovery(self):
+        backoff = RestartBackoff( 'sfa1', 2.0, 30.0, 60.0, lambda: 0.5)
+        backoff.process_died( 0.0)
+        backoff.process_died( 0.0)
+        self.assertTrue( backoff.should_restart( 100.0))
+        backoff.process_alive( 150.0)
+        self.assertEqual( backoff.state, HALF_OPEN)
+        backoff.process_alive( 160.0)
+        self.assertEqual( backoff.state, CLOSED)
+        self.assertEqual( backoff.failures, 0)
+        # Closed circuits never ask for a restart
+        self.assertFalse( backoff.should_restart( 1000.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
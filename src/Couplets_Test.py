@@ -0,0 +1,48 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import unittest
+
+from DDNToolSupport.couplets import group_couplets
+
+class Couplets_Test( unittest.TestCase):
+    
+    def testGrouping(self):
+        # Note: this is the order bracket_expand() produces
+        hosts = [ 'sfa1a', 'sfa2a', 'sfa1b', 'sfa2b', 'other' ]
+        self.assertEqual( group_couplets( hosts, [ 'a', 'b' ]),
+                          [ ('sfa1', [ 'sfa1a', 'sfa1b' ]),
+                            ('sfa2', [ 'sfa2a', 'sfa2b' ]),
+                            ('other', [ 'other' ]) ])
+        
+    def testNoSuffixes(self):
+        hosts = [ 'sfa1a', 'sfa1b' ]
+        self.assertEqual( group_couplets( hosts, [ ]),
+                          [ ('sfa1a', [ 'sfa1a' ]), ('sfa1b', [ 'sfa1b' ]) ])
+        
+    def testSingleMember(self):
+        # no partner:  keeps its own name
+        self.assertEqual( group_couplets( [ 'sfa1a', 'sfa2b' ], [ 'a', 'b' ]),
+                          [ ('sfa1a', [ 'sfa1a' ]), ('sfa2b', [ 'sfa2b' ]) ])
+        
+    def testQualifiedNames(self):
+        hosts = [ 'sfa1-c0.example.com', 'sfa1-c1.example.com' ]
+        self.assertEqual( group_couplets( hosts, [ '-c0', '-c1' ]),
+                          [ ('sfa1.example.com', hosts) ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Dumps one LUN's history from the local archive files that DDNTool writes
+when the config file has an [archive] section.  (See
+DDNToolSupport.SFAClientUtils.SFAArchive)
+'''
+
+import argparse
+import calendar
+import sys
+import time
+
+from DDNToolSupport.SFAClientUtils.SFAArchive import read_lun_history
+
+TIME_FORMATS = [ '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d' ]
+
+
+def parse_time( value):
+    '''
+    Converts a command line time (UTC date, date & time, or Unix seconds)
+    to Unix seconds
+    '''
+    try:
+        return int( value)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            return calendar.timegm( time.strptime( value, time_format))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError( "Can't parse time '%s'"%value)
+
+
+def main_func():
+    parser = argparse.ArgumentParser(
+            description = "Dump one LUN's history from the DDNTool archive")
+    parser.add_argument( 'directory', help = "The archive directory (from the config file)")
+    parser.add_argument( 'host', help = "The controller's host name")
+    parser.add_argument( 'lun', type = int, help = "The LUN number")
+    parser.add_argument( '-s', '--start', type = parse_time,
+                         help = "Start time (UTC 'YYYY-MM-DD [HH:MM[:SS]]' "
+                                "or Unix seconds).  Default is 24 hours "
+                                "before the end time.")
+    parser.add_argument( '-e', '--end', type = parse_time,
+                         help = "End time.  Default is now.")
+    parser.add_argument( '-c', '--columns',
+                         help = "Comma separated list of columns to print.  "
+                                "Default is all of them.")
+    parser.add_argument( '-r', '--rates', action = 'store_true',
+                         help = "Print the rate of change (per second) "
+                                "between samples instead of the raw counters")
+    args = parser.parse_args()
+
+    end = args.end
+    if end is None:
+        end = int( time.time())
+    start = args.start
+    if start is None:
+        start = end - 86400
+    columns = None
+    if args.columns:
+        columns = [ c.strip() for c in args.columns.split( ',') ]
+
+    read_start = time.time()
+    try:
+        (times, values) = read_lun_history( args.directory, args.host,
+                                            args.lun, start, end, columns)
+    except ValueError, e:
+        # Unknown column name
+        print >> sys.stderr, "Error: %s"%e
+        return 1
+    read_seconds = time.time() - read_start
+
+    if columns is None:
+        columns = sorted( values.keys())
+
+    print ','.join( [ 'time' ] + columns)
+    for i in range( len(times)):
+        if args.rates:
+            if i == 0:
+                continue
+            elapsed = times[i] - times[i-1]
+            if elapsed <= 0:
+                continue
+            row = [ (values[c][i] - values[c][i-1]) / float(elapsed) for c in columns ]
+            if min( row or [0]) < 0:
+                continue    # counters were reset
+            print ','.join( [ str(times[i]) ] + [ '%.1f'%v for v in row ])
+        else:
+            print ','.join( [ str(times[i]) ] + [ str(values[c][i]) for c in columns ])
+
+    print >> sys.stderr, "%d samples read in %.1f ms"%(len(times), read_seconds * 1000)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit( main_func())
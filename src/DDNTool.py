@@ -33,17 +33,15 @@ import logging.handlers # Don't delete this line! It's needed for logging to sys
 import os
 import signal
 import time
-import sys
 
-from DDNToolSupport.SFAClientUtils import SFAClient, SFAMySqlDb
+from DDNToolSupport.SFAClientUtils import SFAClient
+from DDNToolSupport.SFAClientUtils.SFABackends import load_backend, \
+                                                     load_configured_backends
+from DDNToolSupport.SFAClientUtils.SFARateWindows import parse_rate_windows
 
-try:
-    from DDNToolSupport.SFAClientUtils import SFAInfluxDb    
-except ImportError:
-    # InfluxDb support is optional.  If SFAInfluxDb can't import (because its
-    # dependencies aren't installed) and the config file is asking for it,
-    # then we'll throw a runtime exception down in the config parsing section.
-    pass
+# Note: the database backends are optional and are only imported if the
+# config file asks for them.  (See load_configured_backends() down in
+# main_func().)
 
 import ssl
 try:
@@ -56,6 +54,12 @@ else:
     ssl._create_default_https_context = _create_unverified_https_context
 
 from DDNToolSupport import bracket_expand, bracket_aware_split
+from DDNToolSupport.bracket_expand import BracketGrammarError
+from DDNToolSupport.backoff import RestartBackoff, OPEN
+from DDNToolSupport.couplets import group_couplets
+from DDNToolSupport.sharding import LeaseManager, DEFAULT_LEASE_TIME
+from DDNToolSupport.status_server import StatusServer, SnapshotReader, \
+                                         StatusCache, HistoryCache, MetricsCache
 
 ####################### Remote Debugging using winpdb #######################
 #import rpdb2
@@ -74,25 +78,56 @@ DEFAULT_CONF_FILE="./ddntool.conf"  # config file to use if not specified on the
 logger = None   # logging object at global (module) scope so everyone can use it
                 # Initialized down in main_func()
 
+reload_requested = False    # Set by the SIGHUP handler.  main_loop() checks
+                            # it once per iteration and re-reads the config
+                            # file when it's True.
+
+snapshot_queue = None   # multiprocessing.Queue the sub-processes send their
+                        # stats snapshots to (only if the http_api section
+                        # is in the config file)
+SNAPSHOT_QUEUE_SIZE = 1000
+
+host_groups = [ ]   # (name, members) tuples for every controller (or couplet)
+                    # in the config file.  (See read_host_groups().)
+
+lease_manager = None    # LeaseManager object if the sharding section is in
+                        # the config file.  Then we only poll the hosts
+                        # whose leases we hold.  (See sync_processes().)
+
 class ProcessData:
     '''
     Holds a few things we need to keep track of for each process: the process
     object itself and an Event that the process will wait on
     '''
-    def __init__(self, host, conf_file, update_time):
+    def __init__(self, host, conf_file, update_time, members = None):
         '''
         Create an event and a process, then start the process.
         
         
-        host is a string with the hostname
+        host is a string with the hostname (or the couplet name)
         conf_file is a string with the name of the config file
         update_time is a shared memory value (Multiprocessing.Value) object
         that the processes will use to get their update time values.
+        members is the list of controllers in the couplet.  Only one of
+        them is polled at a time.  (See failover().)  Defaults to just host.
         '''
         
         self.host=host
         self.conf_file=conf_file
         self.update_time=update_time
+        self.members = members
+        if members is None:
+            self.members = [ host ]
+        self.active = 0     # index (in members) of the controller we poll
+        
+        # Keeps a controller that's down from being restarted every
+        # iteration.  (See check_process().)
+        self.backoff = RestartBackoff( host)
+        
+        # Shared memory value used to pass commands (reload the config,
+        # exit) to this one process.  (See the CONTROL_* values in
+        # SFAClient.py.)
+        self.control = multiprocessing.Value( 'i', SFAClient.CONTROL_NONE)
         
         self.restart()
         
@@ -101,18 +136,35 @@ class ProcessData:
                 
         self.e = multiprocessing.Event()
         self.e.clear()
+        self.control.value = SFAClient.CONTROL_NONE
         
+        address = self.members[self.active]
         proc_name = 'DDNTool_' + self.host
-        logger.debug( "Creating process for host '%s'"%self.host)
+        logger.debug( "Creating process for host '%s'"%address)
         self.p = multiprocessing.Process(name=proc_name,
                                          target=one_controller,
-                                         args=(self.host, self.conf_file, 
-                                               self.e, self.update_time))
+                                         args=(address, self.conf_file, 
+                                               self.e, self.update_time,
+                                               self.control, snapshot_queue,
+                                               self.host))
         self.p.daemon = False
-        logger.info("Starting background process for %s", self.host)
-        print "Starting background process for", self.host
+        logger.info("Starting background process for %s", address)
+        print "Starting background process for", address
         self.p.start()
     
+    def failover( self):
+        '''
+        Switch to the next controller in the couplet.  (Does nothing for a
+        single controller.)  Call this before restart() when the process
+        died, since the most likely reason is that the controller stopped
+        responding.
+        '''
+        if len(self.members) > 1:
+            old_address = self.members[self.active]
+            self.active = (self.active + 1) % len(self.members)
+            logger.warning( "Couplet %s: failing over from %s to %s",
+                            self.host, old_address, self.members[self.active])
+    
     def is_alive(self):
         '''
         Check to see if the process is still alive
@@ -144,13 +196,68 @@ class ProcessData:
             
         return not process_dead
     
+    def check_process(self, now):
+        '''
+        Restarts the process if it has died, subject to the crash-loop
+        backoff.  Called once per iteration of main_loop().
+        
+        Note: the processes are forked from this one, which has already
+        imported the DDN API, pywbem and the database modules, so a restart
+        doesn't have to pay for any of those imports again.
+        '''
+        if self.is_alive():
+            self.backoff.process_alive( now)
+            return
+        
+        if self.backoff.state != OPEN:
+            # Just noticed it
+            logger.error( "Process %s has crashed!"%self.p.name)
+            self.failover()
+            self.backoff.process_died( now)
+        
+        if self.backoff.should_restart( now):
+            self.restart()
+    
+    def request_reload(self):
+        '''
+        Tell the process to re-read the polling settings from the config file
+        the next time it wakes up.
+        
+        Only call this while the process is waiting on its event.  (ie: in
+        between iterations of main_loop())
+        '''
+        self.control.value = SFAClient.CONTROL_RELOAD
+        
+    def stop(self):
+        '''
+        Tell the process to exit and wait for it to do so.
+        
+        Used when a host is removed from the config file.  Everything else
+        shuts down via the shared update_time value.  (See main_func())
+        '''
+        # Let the process finish whatever iteration it's currently working on
+        while self.is_alive() and self.e.is_set():
+            time.sleep( 0.01)
+        
+        if self.is_alive():
+            self.control.value = SFAClient.CONTROL_EXIT
+            self.e.set()
+            self.p.join()
+        
+        # Tell the status server to forget about this host
+        if snapshot_queue is not None:
+            snapshot_queue.put( (None, self.host, None))
+    
        
 # event is a multiprocessing.Event object.
-# update_time is a multiprocessing.Value object
-def one_controller(host, conf_file, event, update_time):
+# update_time and control are multiprocessing.Value objects
+def one_controller(host, conf_file, event, update_time, control,
+                   snapshot_queue, host_name):
     '''
     This is the function that gets called in a separate process.  It handles
-    the polling and database updating for a single controller.
+    the polling and database updating for a single controller.  host is the
+    controller's address and host_name is the name its data is reported
+    under.  (They're different for couplets.)
     '''
     logger = logging.getLogger( "DDNTool")
     
@@ -158,9 +265,13 @@ def one_controller(host, conf_file, event, update_time):
     # Ctrl-C, the signal will end up going to the main process (which will
     # trap it and shut down cleanly).
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Same thing for SIGHUP:  the main process handles config reloads and
+    # passes the relevant bits on to us.
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
 
     try:
-        client = SFAClient.SFAClient( host, conf_file, event, update_time)
+        client = SFAClient.SFAClient( host, conf_file, event, update_time,
+                                      control, snapshot_queue, host_name)
         client.run()
         # run() loops until the main process sets update_time to 0
     except Exception, e:
@@ -171,15 +282,208 @@ def one_controller(host, conf_file, event, update_time):
     print "Process ", host, " is exiting."
 
 
+def sighup_handler( signum, frame):
+    '''
+    Signal handler for SIGHUP.  Just sets a flag.  The actual work is done
+    by main_loop() in between iterations.
+    '''
+    global reload_requested
+    reload_requested = True
+
+
+def read_host_list( config):
+    '''
+    Returns the (bracket expanded) list of controller hosts from the
+    ddn_hardware section of the config.
+    '''
+    sfa_hosts = [ host.strip() for host in
+            bracket_aware_split(config.get('ddn_hardware', 'sfa_hosts')) ]
+    bracket_expand( sfa_hosts)
+    return sfa_hosts
+
+
+def read_host_groups( config):
+    '''
+    Returns the list of controllers from the ddn_hardware section of the
+    config, grouped into couplets.  (See group_couplets().)  The couplets
+    are only grouped if the couplet_suffixes option is set.  Otherwise,
+    each controller is its own group.
+    '''
+    suffixes = [ ]
+    if config.has_option('ddn_hardware', 'couplet_suffixes'):
+        suffixes = [ s.strip() for s in
+                     config.get('ddn_hardware', 'couplet_suffixes').split(',') ]
+    return group_couplets( read_host_list( config), suffixes)
+
+
+def read_lease_manager( config):
+    '''
+    Returns a LeaseManager built from the sharding section of the config, or
+    None if there's no sharding section.
+    '''
+    if not config.has_section('sharding'):
+        return None
+    node_name = None
+    if config.has_option('sharding', 'node_name'):
+        node_name = config.get('sharding', 'node_name')
+    lease_time = DEFAULT_LEASE_TIME
+    if config.has_option('sharding', 'lease_time'):
+        lease_time = config.getfloat('sharding', 'lease_time')
+    check_lease_time( lease_time,
+                      config.getfloat('polling', 'fast_poll_interval'))
+    return LeaseManager( config.get('sharding', 'lease_directory'),
+                         node_name, lease_time)
+
+
+def check_lease_time( lease_time, fast_poll_interval):
+    '''
+    Raises ValueError if a lease could expire between two fast polls.
+    '''
+    if lease_time < 3 * fast_poll_interval:
+        raise ValueError( "lease_time must be at least 3 times "
+                          "fast_poll_interval")
+
+
+def read_loop_settings( config):
+    '''
+    Returns a tuple of the settings main_loop() needs from the polling
+    section of the config:  the wake time (in seconds) and the stagger
+    fraction.
+    
+    stagger_fraction is optional.  If it's greater than 0, the processes are
+    woken one at a time, spread evenly across that fraction of the wake
+    time.  (0, the default, wakes them all at once.)
+    '''
+    wake_time = config.getfloat('polling', 'fast_poll_interval')
+    stagger_fraction = 0.0
+    if config.has_option('polling', 'stagger_fraction'):
+        stagger_fraction = config.getfloat('polling', 'stagger_fraction')
+        if stagger_fraction < 0.0 or stagger_fraction >= 1.0:
+            raise ValueError( "stagger_fraction must be at least 0.0 and "
+                              "less than 1.0")
+    return (wake_time, stagger_fraction)
+
+
+# proc_list is a list of ProcessData objects (modified in place)
+# loop_settings is the current (wake_time, stagger_fraction) tuple
+# update_time is the multiprocessing.Value object shared by all the processes
+def reload_config( conf_file, proc_list, loop_settings, update_time):
+    '''
+    Re-read the config file after a SIGHUP.
+    
+    Starts processes for hosts that have been added to sfa_hosts, stops
+    processes for hosts that have been removed and tells everything else to
+    re-read the polling section.  Processes for hosts that didn't change are
+    left alone, so their time series data and controller connections
+    survive.
+    
+    Returns the (possibly new) main loop settings.  (See
+    read_loop_settings().)  If the config file can't be read or parsed, the
+    current settings are kept.  (That includes a fast_poll_interval that's
+    too long for the lease_time we're running with.  The sharding section
+    itself is only read at startup.)
+    '''
+    global reload_requested
+    reload_requested = False
+    
+    logger.info( "Reloading config file %s", conf_file)
+    config = ConfigParser.ConfigParser()
+    try:
+        if not config.read(conf_file):
+            logger.error( "Could not read config file %s.  Keeping the "
+                          "current settings.", conf_file)
+            return loop_settings
+        new_groups = read_host_groups( config)
+        new_loop_settings = read_loop_settings( config)
+        if lease_manager is not None:
+            check_lease_time( lease_manager.lease_time, new_loop_settings[0])
+    except (ConfigParser.Error, ValueError, BracketGrammarError), e:
+        logger.error( "Error parsing config file %s (%s).  Keeping the "
+                      "current settings.", conf_file, e)
+        return loop_settings
+    
+    global host_groups
+    old_groups = dict( host_groups)
+    for (host, members) in new_groups:
+        if host not in old_groups:
+            logger.info( "Host %s was added to the config file.", host)
+    for host in old_groups:
+        if host not in dict( new_groups):
+            logger.info( "Host %s was removed from the config file.", host)
+    host_groups = new_groups
+    
+    # The existing processes need to pick up the new polling settings.
+    # (Telling the ones that are about to be stopped is harmless.)
+    for p in proc_list:
+        p.request_reload()
+    sync_processes( proc_list, conf_file, update_time)
+    
+    if new_loop_settings[0] != loop_settings[0]:
+        logger.info( "Fast poll interval changed from %.2f to %.2f seconds",
+                     loop_settings[0], new_loop_settings[0])
+    if new_loop_settings[1] != loop_settings[1]:
+        logger.info( "Stagger fraction changed from %.2f to %.2f",
+                     loop_settings[1], new_loop_settings[1])
+    
+    return new_loop_settings
+
+
+# proc_list is a list of ProcessData objects (modified in place)
+# update_time is the multiprocessing.Value object shared by all the processes
+def sync_processes( proc_list, conf_file, update_time):
+    '''
+    Starts and stops processes so that proc_list has one process for each
+    group in host_groups (or, if sharding is enabled, for each group whose
+    lease we hold).  Processes for couplets whose members changed are
+    restarted.
+    
+    Only call this while the processes are waiting on their events.
+    '''
+    groups = host_groups
+    if lease_manager is not None:
+        owned = lease_manager.update( [ host for (host, members) in host_groups ])
+        groups = [ (host, members) for (host, members) in host_groups
+                   if host in owned ]
+    wanted = dict( groups)
+    
+    for p in [ p for p in proc_list if wanted.get( p.host) != p.members]:
+        logger.info( "Stopping the process for %s", p.host)
+        p.stop()
+        proc_list.remove( p)
+        if lease_manager is not None and p.host not in wanted:
+            # Only give the lease up after the process has stopped, so the
+            # new owner can't start polling while we still are
+            lease_manager.release( p.host)
+    
+    current_hosts = [ p.host for p in proc_list]
+    for (host, members) in groups:
+        if host not in current_hosts:
+            proc_list.append( ProcessData( host, conf_file, update_time, members))
+
+
 # proc_list is a list of ProcessData objects
-# wake_time is how often the sub-processes should wake (in seconds)
+# loop_settings is a (wake_time, stagger_fraction) tuple.  wake_time is how
+# often the sub-processes should wake (in seconds).  See read_loop_settings()
+# for stagger_fraction.
 # update_time is shared_mem object (multiprocessing.Value) that all the 
 # sub-processes will use for their LastUpdate fields
-def main_loop( proc_list, wake_time, update_time):
+# conf_file is the name of the config file (re-read on SIGHUP)
+def main_loop( proc_list, loop_settings, update_time, conf_file):
     '''
     Called by main_func() after the initialization has been completed.  Its
     job is to wake up all the processes at set intervals.
     
+    If staggering is enabled, the processes are woken one at a time, evenly
+    spaced across part of the interval, instead of all at once.  That
+    spreads their database writes out instead of having every process hit
+    the database at the same instant.  All the processes still get the same
+    update_time value, so the timestamps in the database stay aligned.
+    
+    If sharding is enabled, the processes are started and stopped as this
+    node gains and loses hosts.  (The leases are renewed by the
+    LeaseManager's own thread, so a slow controller doesn't make them
+    lapse.)
+    
     Note: this function loops forever.  Ctrl-C is how we expect the user to
     break out of it.
     '''
@@ -187,24 +491,47 @@ def main_loop( proc_list, wake_time, update_time):
     logger = logging.getLogger( "DDNTool")
     
     try:
+        (wake_time, stagger_fraction) = loop_settings
         last_wake = time.time()
 
         while True:
             while (time.time() < last_wake + wake_time):
                 time.sleep( 0.01)  # 10 millisec sleep
         
+            # Handle a SIGHUP.  Safe to do here because all the processes
+            # are waiting on their events.
+            if reload_requested:
+                loop_settings = reload_config( conf_file, proc_list,
+                                               loop_settings, update_time)
+                (wake_time, stagger_fraction) = loop_settings
+            
+            # Pick up (or give up) hosts as other nodes come and go
+            if lease_manager is not None:
+                sync_processes( proc_list, conf_file, update_time)
+        
             # Make sure all the sub processes are still alive
+            now = time.time()
             for p in proc_list:
-                if not p.is_alive():
-                    logger.error( "Process %s has crashed!  Restarting!"%p.p.name)
-                    p.restart()
+                p.check_process( now)
                     
             # Wake up all the sub processes
             last_wake = time.time()
             update_time.value = int(last_wake)
-            logger.debug( "Waking all sub-processes")
-            for p in proc_list:
-                p.e.set()  # set the event that each process is waiting on
+            if stagger_fraction > 0.0 and len(proc_list) > 1:
+                logger.debug( "Waking all sub-processes (staggered)")
+                spacing = wake_time * stagger_fraction / len(proc_list)
+                for (i, p) in enumerate(proc_list):
+                    # Note: the processes are always woken in the same order,
+                    # so each controller is polled at a constant offset from
+                    # the start of the interval
+                    delay = last_wake + (i * spacing) - time.time()
+                    if delay > 0:
+                        time.sleep( delay)
+                    p.e.set()
+            else:
+                logger.debug( "Waking all sub-processes")
+                for p in proc_list:
+                    p.e.set()  # set the event that each process is waiting on
                 
             # When the processes have finished one iteration of their loops,
             # they will clear their events.  We wait for this so that we're
@@ -285,10 +612,10 @@ def main_func():
     global logger
     logger = logging.getLogger( "DDNTool")
 
-    # Check to see if we need but don't actually have the influx module
-    if config.has_section('TSDb') and \
-       not ("DDNToolSupport.SFAClientUtils.SFAInfluxDb" in sys.modules):
-        raise RuntimeError( "InfluxDB support not available.  Install the InfluxDB modules or comment out that section of the config file")
+    # Import the backends the config file asks for (and only those).  This
+    # raises a RuntimeError if one of them isn't installed.  The controller
+    # processes are forked from this one, so they inherit the imports.
+    load_configured_backends( config)
     
     
     # Initialize the list of controller hosts
@@ -297,9 +624,7 @@ def main_func():
     # The 'real' use of this list occurs further down where we create the
     # ProcessData objects.
     sfa_processes = [] # holds the ProcessData objects, not SFAClient objects!
-    sfa_hosts = [ host.strip() for host in
-            bracket_aware_split(config.get('ddn_hardware', 'sfa_hosts')) ]
-    bracket_expand( sfa_hosts)
+    sfa_hosts = read_host_list( config)
     
     # Initialize the database(s) if requested
     if  main_args.init_db:
@@ -334,10 +659,14 @@ def main_func():
         if sqldb_configured:
             # don't actually need the db connection, but this is how we force
             # the db init code to run
+            SFAMySqlDb = load_backend( 'sqldb')
             db = SFAMySqlDb.SFAMySqlDb(sqldb_user, sqldb_password,   # @UnusedVariable
                                        sqldb_host, sqldb_name,
                                        main_args.init_db,
-                                       new_style_latency_tables)
+                                       new_style_latency_tables,
+                                       parse_rate_windows( config),
+                                       SFAMySqlDb.compact_keys_enabled( config),
+                                       **SFAMySqlDb.history_options( config))
             db = None  # @UnusedVariable
         
         if config.has_section('TSDb'):
@@ -347,7 +676,7 @@ def main_func():
             tsdb_name = config.get('TSDb', 'name')
             # Again, we don't actually need the db connection here, but it's how we
             # force the init code to run
-            db = SFAInfluxDb.SFAInfluxDb( tsdb_user, tsdb_password, # @UnusedVariable
+            db = load_backend( 'tsdb').SFAInfluxDb( tsdb_user, tsdb_password, # @UnusedVariable
                                           tsdb_host, tsdb_name,
                                           new_style_latency_tables,
                                           main_args.init_db)
@@ -358,14 +687,66 @@ def main_func():
     # for their LastUpdate fields
     update_time = multiprocessing.Value( 'L', 0)
     
-    # Fork a process for each controller in the config file
-    for host in sfa_hosts:
-        sfa_processes.append( ProcessData( host, main_args.conf_file, update_time))       
+    # Start the (optional) HTTP servers for the JSON status API and the
+    # Prometheus metrics.  They run in this process and get their data from
+    # what the sub-processes put on snapshot_queue.
+    global snapshot_queue
+    http_servers = [ ]
+    snapshot_reader = None
+    # The controller-wide rate history (if rollup_history is on) is kept
+    # here and served with the JSON API
+    history_cache = None
+    if config.has_option('polling', 'rollup_history') and \
+       config.getboolean('polling', 'rollup_history'):
+        history_cache = HistoryCache()
+    for (section, cache) in (('http_api', StatusCache( history_cache)),
+                             ('prometheus', MetricsCache())):
+        if not config.has_section( section):
+            continue
+        if snapshot_queue is None:
+            snapshot_queue = multiprocessing.Queue( SNAPSHOT_QUEUE_SIZE)
+            snapshot_reader = SnapshotReader( snapshot_queue)
+        if section == 'http_api':
+            snapshot_reader.register( 'status', cache)
+            if history_cache is not None:
+                snapshot_reader.register( 'history', history_cache)
+        else:
+            snapshot_reader.register( 'metrics', cache)
+        
+        bind_address = '127.0.0.1'
+        if config.has_option( section, 'bind_address'):
+            bind_address = config.get( section, 'bind_address')
+        port = config.getint( section, 'port')
+        server = StatusServer( bind_address, port, cache)
+        server.start()
+        http_servers.append( server)
+        logger.info( "Serving %s on %s:%d"%(section, bind_address, port))
+        
+    if snapshot_reader is not None:
+        snapshot_reader.start()
+    
+    # SIGHUP re-reads the host list and the polling settings.  (The
+    # sub-processes reset this to SIG_IGN.  See one_controller().)
+    signal.signal(signal.SIGHUP, sighup_handler)
+    
+    # If other DDNTool instances share the host list with us, we only poll
+    # the hosts we hold the leases for.  (See DDNToolSupport.sharding.)
+    global lease_manager
+    lease_manager = read_lease_manager( config)
+    if lease_manager is not None:
+        logger.info( "Sharding enabled.  Node name is %s",
+                     lease_manager.node_name)
+        lease_manager.start()
+    
+    # Fork a process for each controller (or couplet) in the config file
+    global host_groups
+    host_groups = read_host_groups( config)
+    sync_processes( sfa_processes, main_args.conf_file, update_time)
         
     # All processes are started (and are waiting on their events). Have
     # the main loop take over...
-    wake_time = config.getfloat('polling', 'fast_poll_interval')
-    main_loop( sfa_processes, wake_time, update_time)
+    loop_settings = read_loop_settings( config)
+    main_loop( sfa_processes, loop_settings, update_time, main_args.conf_file)
     # if we've returned from main_loop(), it's because someone hit CTRL-C
     
     # Make sure all the events have been cleared by the sub processes
@@ -391,7 +772,15 @@ def main_func():
     for p in sfa_processes:
         if p.is_alive():
             p.p.join()
-
+    
+    # Let the other nodes take over our hosts right away
+    if lease_manager is not None:
+        lease_manager.release_all()
+    
+    for server in http_servers:
+        server.stop()
+    if snapshot_reader is not None:
+        snapshot_reader.stop()
     
     logger.info( "DDNTool exiting")
     print "DDNTool exiting"
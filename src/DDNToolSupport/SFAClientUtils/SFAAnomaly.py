@@ -0,0 +1,262 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Streaming anomaly detection for the per-LUN rates and latencies.
+
+For every LUN, we keep an exponentially weighted moving average (EWMA) of
+each metric and of its variance.  A new value is compared to them before
+they're updated:  if it's more than threshold standard deviations away
+from the mean, the metric becomes anomalous and an AnomalyEvent (see
+SFASinks) is sent.  Another one is sent when it comes back (to within half
+the threshold).  That's a few numbers per metric per LUN no matter how long
+we run, and each update is a few NumPy operations on a 2D array (one row
+per LUN), so the cost hardly depends on the number of LUNs.
+
+Changes in a LUN's pool state are sent as PoolStateEvents, so the outputs
+don't have to compare every iteration's pool state to the previous one.
+
+This module requires NumPy.  (The rest of DDNTool doesn't:  SFAClient only
+imports this module, via SFABackends, if the anomaly_detection section is
+in the config file.)
+'''
+
+import threading
+
+import numpy as np
+
+from SFASinks import SFASink, FAST, MEDIUM, SNAPSHOT_RATE_NAMES, \
+                     AnomalyEvent, PoolStateEvent
+
+# Defaults for the options in the anomaly_detection section
+DEFAULT_ALPHA = 0.05    # weight of each new value in the moving averages
+DEFAULT_THRESHOLD = 4.0 # z-score (in standard deviations)
+DEFAULT_WARMUP = 30     # values per LUN before we start sending events
+
+# The standard deviation that the z-scores are computed with is never less
+# than this fraction of the mean.  Otherwise, a LUN that has been doing
+# exactly the same thing for a while would trigger on the smallest change.
+MIN_RELATIVE_STDDEV = 0.05
+
+# Once a metric is anomalous, it has to drop back under this fraction of the
+# threshold before it's back to normal.  (Keeps a value that's hovering
+# around the threshold from sending an event every iteration.)
+CLEAR_FRACTION = 0.5
+
+# Names of the latency metrics (the first 6 values of the request summaries.
+# See SFAHistogram.SFARequestSummary.update().)
+LATENCY_NAMES = [ 'read_p50_ms', 'read_p90_ms', 'read_p99_ms',
+                  'write_p50_ms', 'write_p90_ms', 'write_p99_ms' ]
+
+
+class SFAEwmaDetector(object):
+    '''
+    The moving averages and anomaly flags for several metrics of every LUN
+    '''
+
+    def __init__(self, metric_names, alpha = DEFAULT_ALPHA,
+                 threshold = DEFAULT_THRESHOLD, warmup = DEFAULT_WARMUP):
+        if not (0.0 < alpha < 1.0):
+            raise ValueError( "alpha must be between 0 and 1 (got %s)"%alpha)
+        if threshold <= 0:
+            raise ValueError( "threshold must be positive (got %s)"%threshold)
+        self.metric_names = tuple( metric_names)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+
+        self._luns = ( )
+        self._resize( ( ))
+
+    def _resize(self, luns):
+        '''
+        Lines the arrays up with a new tuple of LUN numbers.  LUNs we already
+        had keep their averages and new ones start from scratch.  (Only
+        happens when LUNs are added or removed, so we don't care that it's
+        slow.)
+        '''
+        shape = (len(luns), len(self.metric_names))
+        mean = np.zeros( shape)
+        var = np.zeros( shape)
+        count = np.zeros( shape, dtype=np.int64)
+        active = np.zeros( shape, dtype=bool)
+        if self._luns:
+            old_rows = dict( (lun, i) for (i, lun) in enumerate( self._luns))
+            for (i, lun) in enumerate( luns):
+                if lun in old_rows:
+                    j = old_rows[lun]
+                    mean[i] = self._mean[j]
+                    var[i] = self._var[j]
+                    count[i] = self._count[j]
+                    active[i] = self._active[j]
+        self._luns = luns
+        self._mean = mean
+        self._var = var
+        self._count = count
+        self._active = active
+
+    def update(self, luns, values):
+        '''
+        luns is a tuple of LUN numbers and values is a 2D array (or list of
+        lists) with one row per LUN in the same order and one column per
+        metric.  None (or NaN) means there's no value this time:  the
+        averages and anomaly flag for that metric are left alone.
+
+        Returns a list of AnomalyEvents for the metrics that crossed the
+        threshold (in either direction).
+        '''
+        if luns != self._luns:
+            self._resize( luns)
+        if not luns:
+            return [ ]
+
+        values = np.array( values, dtype=np.float64)    # (None becomes NaN)
+        valid = ~np.isnan( values)
+        diff = np.where( valid, values - self._mean, 0.0)
+
+        # Compare to the averages *before* updating them
+        stddev = np.maximum( np.sqrt( self._var),
+                             MIN_RELATIVE_STDDEV * np.abs( self._mean))
+        with np.errstate( divide='ignore', invalid='ignore'):
+            zscore = np.where( stddev > 0, diff / stddev, 0.0)
+        zscore[~valid | (self._count < self.warmup)] = 0.0
+        limit = np.where( self._active, CLEAR_FRACTION * self.threshold,
+                          self.threshold)
+        active = np.where( valid, np.abs( zscore) > limit, self._active)
+
+        events = [ ]
+        for (i, j) in zip( *np.nonzero( active != self._active)):
+            events.append( AnomalyEvent( self._luns[i], self.metric_names[j],
+                                         bool( active[i, j]),
+                                         float( values[i, j]),
+                                         float( self._mean[i, j]),
+                                         float( stddev[i, j]),
+                                         float( zscore[i, j])))
+        self._active = active
+
+        # Now fold the new values in.  (This is the incremental form of the
+        # exponentially weighted variance, so no old values are needed.)
+        increment = self.alpha * diff
+        self._var = np.where( valid, (1.0 - self.alpha) * (self._var + diff * increment),
+                              self._var)
+        self._mean = self._mean + increment
+        first = valid & (self._count == 0)
+        self._mean[first] = values[first]
+        self._var[first] = 0.0
+        self._count += valid
+        return events
+
+    def size(self):
+        '''
+        Returns the number of LUNs being tracked
+        '''
+        return len(self._luns)
+
+
+class _DetectorState( threading.local):
+    '''
+    The detectors and last pool states.  Each thread that writes records
+    to an SFALunAnalysis gets its own.
+    '''
+
+    def __init__(self, alpha, threshold, warmup):
+        self.rates = SFAEwmaDetector( SNAPSHOT_RATE_NAMES, alpha, threshold, warmup)
+        self.latencies = SFAEwmaDetector( LATENCY_NAMES, alpha, threshold, warmup)
+        self.pool_states = { }  # LUN number -> pool state from the last fast record
+
+
+class SFALunAnalysis(SFASink):
+    '''
+    The analysis stage.  It's a sink, so it's fed the same records as the
+    outputs:  the 60 second rates and pool states from the fast tier and
+    the latency percentiles from the medium tier (if request_summary is
+    turned on).  Events are logged as soon as they're found and queued up
+    until SFAClient collects them with take_events() and sends them to the
+    outputs that want the events tier.
+
+    With background_tiers, the same object gets the fast records from the
+    main thread and the medium records from the background thread.  The
+    detectors aren't thread safe, so each thread gets its own (see
+    _DetectorState), and the event queue is protected by a lock.
+    '''
+
+    tiers = (FAST, MEDIUM)
+
+    def __init__(self, logger, alpha = DEFAULT_ALPHA,
+                 threshold = DEFAULT_THRESHOLD, warmup = DEFAULT_WARMUP):
+        self.logger = logger
+        self._state = _DetectorState( alpha, threshold, warmup)
+        self._events = [ ]
+        self._lock = threading.Lock()
+
+    def fast(self, record):
+        state = self._state
+        events = [ ]
+        pool_states = { }
+        for lun in record.luns:
+            old_state = state.pool_states.get( lun.lun_num)
+            if old_state is not None and old_state != lun.pool_state:
+                events.append( PoolStateEvent( lun.lun_num, old_state, lun.pool_state))
+            pool_states[lun.lun_num] = lun.pool_state
+        state.pool_states = pool_states
+
+        # LUNs without rates (not enough data yet, or a counter reset) stay
+        # in with a row of Nones.  Leaving them out would make the detector
+        # drop their averages and start the warmup over.
+        no_rates = (None, ) * len(SNAPSHOT_RATE_NAMES)
+        events.extend( state.rates.update(
+                tuple( [ lun.lun_num for lun in record.luns ]),
+                [ lun.rates if lun.rates is not None else no_rates
+                  for lun in record.luns ]))
+        self._add_events( events)
+
+    def medium(self, record):
+        if not [ lun for lun in record.luns if lun.summary is not None ]:
+            return  # request summaries are turned off
+        # (Same as the rates:  a LUN without a summary keeps its averages.)
+        no_summary = (None, ) * len(LATENCY_NAMES)
+        events = self._state.latencies.update(
+                tuple( [ lun.lun_num for lun in record.luns ]),
+                [ lun.summary[:len(LATENCY_NAMES)] if lun.summary is not None
+                  else no_summary for lun in record.luns ])
+        self._add_events( events)
+
+    def _add_events(self, events):
+        for event in events:
+            if isinstance( event, PoolStateEvent):
+                self.logger.warning( "LUN %d: pool state changed from %d to %d"%
+                                     (event.lun_num, event.old_state,
+                                      event.new_state))
+            elif event.active:
+                self.logger.warning( "LUN %d: %s is %.4g (average %.4g, "
+                                     "z-score %.1f)"%
+                                     (event.lun_num, event.metric,
+                                      event.value, event.mean, event.zscore))
+            else:
+                self.logger.info( "LUN %d: %s is back to normal (%.4g)"%
+                                  (event.lun_num, event.metric, event.value))
+        if events:
+            with self._lock:
+                self._events.extend( events)
+
+    def take_events(self):
+        '''
+        Returns (and forgets) the events found since the last call
+        '''
+        with self._lock:
+            events = self._events
+            self._events = [ ]
+        return events
@@ -0,0 +1,449 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+A compact, append-only archive of the raw LUN counters.
+
+The SQL tables only hold the latest values, so without InfluxDB there's no
+history at all.  The archive keeps it in local files instead: one file per
+host per (UTC) day, at <directory>/<host>/<YYYYMMDD>.ddna
+
+File layout (all values little endian):
+
+    file header:    'DDNA', version (H), length of column names (H),
+                    comma separated column names
+    blocks:         one after the other (see below)
+    index:          one entry per block: offset (Q), first time (q),
+                    last time (q), number of ticks (I)
+    trailer:        index offset (Q), number of index entries (I), 'DDNI'
+
+Each block holds several consecutive ticks for a fixed set of LUNs:
+
+    header:         'DDNB', block length (I), ticks (I), LUNs (I),
+                    columns (H)
+    times:          one update time (q) per tick
+    LUN numbers:    one (H) per LUN, sorted
+    LUN offsets:    one (I) per LUN - where its data starts, relative to
+                    the start of the block
+    LUN data:       for each LUN, for each column: width (B), first value
+                    (q), then (ticks - 1) deltas, each 'width' bytes
+
+The counters change slowly compared to their size, so most deltas fit in 1
+or 2 bytes.  All the data for one LUN in a block is contiguous, so reading
+one LUN only touches a few hundred bytes per block.
+
+New blocks are written over the old index, which is then written again
+after the new block.  The blocks themselves are never modified.  If the
+index is damaged (we crashed while writing it), readers and writers fall
+back to walking the blocks from the start of the file.
+'''
+
+import mmap
+import os
+import struct
+import time
+
+try:
+    import numpy
+except ImportError:
+    # NumPy just makes decoding faster.  (See _decode_column().)
+    numpy = None
+
+FILE_MAGIC = 'DDNA'
+FILE_VERSION = 1
+BLOCK_MAGIC = 'DDNB'
+INDEX_MAGIC = 'DDNI'
+FILE_SUFFIX = '.ddna'
+
+# Default number of ticks per block.  (10 minutes at the usual 2 second
+# fast poll interval.)  Ticks that haven't been written out yet are lost if
+# the process dies.
+DEFAULT_BLOCK_TICKS = 300
+
+_FILE_HEADER = struct.Struct( '<4sHH')
+_BLOCK_HEADER = struct.Struct( '<4sIIIH')
+_INDEX_ENTRY = struct.Struct( '<QqqI')
+_TRAILER = struct.Struct( '<QI4s')
+_COLUMN_HEADER = struct.Struct( '<Bq')
+
+# Delta width (in bytes) -> (struct code, smallest value, largest value)
+_WIDTHS = { 1 : ('b', -2**7, 2**7 - 1),
+            2 : ('h', -2**15, 2**15 - 1),
+            4 : ('i', -2**31, 2**31 - 1),
+            8 : ('q', -2**63, 2**63 - 1) }
+
+
+class ArchiveFormatError(Exception):
+    '''
+    Raised when a file isn't an archive file or doesn't match what we
+    expected
+    '''
+    pass
+
+
+def day_of( timestamp):
+    '''
+    Returns the 'YYYYMMDD' string for the UTC day the timestamp falls in
+    '''
+    return time.strftime( '%Y%m%d', time.gmtime( timestamp))
+
+
+def archive_path( directory, host, day):
+    return os.path.join( directory, host, day + FILE_SUFFIX)
+
+
+def _encode_block( times, luns, rows, num_columns):
+    '''
+    Builds one block.  times is a list of update times, luns is a sorted
+    tuple of LUN numbers and rows has one entry per tick, each of which is a
+    list (in the same order as luns) of tuples of num_columns integers.
+    '''
+    num_ticks = len(times)
+    parts = [ struct.pack( '<%dq'%num_ticks, *times),
+              struct.pack( '<%dH'%len(luns), *luns) ]
+    offset = (_BLOCK_HEADER.size + 8 * num_ticks + 2 * len(luns) +
+              4 * len(luns))
+    offsets = [ ]
+    lun_parts = [ ]
+    for lun_index in range( len(luns)):
+        offsets.append( offset)
+        for column in range( num_columns):
+            series = [ row[lun_index][column] for row in rows ]
+            deltas = [ b - a for (a, b) in zip( series, series[1:]) ]
+            low = min( deltas or [0])
+            high = max( deltas or [0])
+            for width in (1, 2, 4, 8):
+                (code, smallest, largest) = _WIDTHS[width]
+                if smallest <= low and high <= largest:
+                    break
+            else:
+                raise ValueError( "Counter delta too large to archive")
+            data = _COLUMN_HEADER.pack( width, series[0]) + \
+                   struct.pack( '<%d%s'%(len(deltas), code), *deltas)
+            lun_parts.append( data)
+            offset += len(data)
+    parts.append( struct.pack( '<%dI'%len(luns), *offsets))
+    parts.extend( lun_parts)
+
+    body = ''.join( parts)
+    header = _BLOCK_HEADER.pack( BLOCK_MAGIC, _BLOCK_HEADER.size + len(body),
+                                 num_ticks, len(luns), num_columns)
+    return header + body
+
+
+def _read_file_header( buf):
+    '''
+    Returns the list of column names and the offset of the first block
+    '''
+    if len(buf) < _FILE_HEADER.size:
+        raise ArchiveFormatError( "File is too short")
+    (magic, version, names_len) = _FILE_HEADER.unpack_from( buf, 0)
+    if magic != FILE_MAGIC:
+        raise ArchiveFormatError( "Not an archive file")
+    if version != FILE_VERSION:
+        raise ArchiveFormatError( "Unsupported archive version %d"%version)
+    names = buf[_FILE_HEADER.size:_FILE_HEADER.size + names_len]
+    return (names.split( ','), _FILE_HEADER.size + names_len)
+
+
+def _scan_blocks( buf, start, end):
+    '''
+    Walks the blocks from start and returns the index entries for all the
+    complete ones, plus the offset just past the last good block.
+    '''
+    entries = [ ]
+    offset = start
+    while offset + _BLOCK_HEADER.size <= end:
+        (magic, length, num_ticks, unused_luns, unused_cols) = \
+                _BLOCK_HEADER.unpack_from( buf, offset)
+        if magic != BLOCK_MAGIC or length < _BLOCK_HEADER.size or \
+           offset + length > end or num_ticks == 0:
+            break
+        times_at = offset + _BLOCK_HEADER.size
+        first = struct.unpack_from( '<q', buf, times_at)[0]
+        last = struct.unpack_from( '<q', buf, times_at + 8 * (num_ticks - 1))[0]
+        entries.append( (offset, first, last, num_ticks))
+        offset += length
+    return (entries, offset)
+
+
+def _read_index( buf, data_start):
+    '''
+    Returns the list of index entries and the offset where the next block
+    should go.  Uses the index at the end of the file if it's intact and
+    scans the blocks if it isn't.
+    '''
+    size = len(buf)
+    if size >= data_start + _TRAILER.size:
+        (index_offset, count, magic) = _TRAILER.unpack_from( buf, size - _TRAILER.size)
+        if magic == INDEX_MAGIC and \
+           index_offset + count * _INDEX_ENTRY.size + _TRAILER.size == size and \
+           index_offset >= data_start:
+            entries = [ _INDEX_ENTRY.unpack_from( buf, index_offset + i * _INDEX_ENTRY.size)
+                        for i in range( count) ]
+            return (entries, index_offset)
+    return _scan_blocks( buf, data_start, size)
+
+
+class SFAArchiveWriter(object):
+    '''
+    Buffers ticks for one host and writes them to the day's file a block at
+    a time.  A block is written when it has block_ticks ticks, when the set
+    of LUNs changes, when the day changes or when flush() is called.
+
+    If a block can't be written (IOError, etc.), its ticks are dropped and
+    the error is passed on.  If the day's file has different columns (we
+    were upgraded), ArchiveFormatError is raised once and the rest of that
+    day is skipped.
+    '''
+
+    def __init__(self, directory, host, columns, block_ticks = DEFAULT_BLOCK_TICKS):
+        '''
+        columns is the list of column names.  Every row passed to append()
+        must have one integer for each.
+        '''
+        self._directory = directory
+        self._host = host
+        self._columns = list( columns)
+        self._block_ticks = block_ticks
+
+        self._day = None
+        self._luns = None
+        self._times = [ ]
+        self._rows = [ ]
+        self._bad_day = None    # day whose file has the wrong columns
+
+        # (path, offset of the index, index entries) for the file we last
+        # wrote to, so we don't have to re-read the index every time
+        self._current_file = None
+
+    def append(self, update_time, rows):
+        '''
+        Adds one tick.  rows is a dictionary of LUN number -> tuple of
+        integers (one per column).
+        '''
+        day = day_of( update_time)
+        if day == self._bad_day:
+            return
+        luns = tuple( sorted( rows.keys()))
+        if self._times and (day != self._day or luns != self._luns):
+            self.flush()
+
+        self._day = day
+        self._luns = luns
+        self._times.append( int(update_time))
+        self._rows.append( [ rows[lun] for lun in luns ])
+        if len(self._times) >= self._block_ticks:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes out whatever ticks are buffered
+        '''
+        if not self._times:
+            return
+        try:
+            if self._luns:
+                block = _encode_block( self._times, self._luns, self._rows,
+                                       len(self._columns))
+                self._write_block( block, self._times[0], self._times[-1],
+                                   len(self._times))
+        finally:
+            self._times = [ ]
+            self._rows = [ ]
+
+    def close(self):
+        self.flush()
+
+    def _write_block(self, block, first_time, last_time, num_ticks):
+        path = archive_path( self._directory, self._host, self._day)
+        if self._current_file is not None and self._current_file[0] == path:
+            (unused, index_offset, entries) = self._current_file
+            f = open( path, 'r+b')
+        elif os.path.exists( path):
+            f = open( path, 'r+b')
+            buf = f.read()
+            (columns, data_start) = _read_file_header( buf)
+            if columns != self._columns:
+                f.close()
+                self._bad_day = self._day
+                raise ArchiveFormatError( "%s has different columns"%path)
+            (entries, index_offset) = _read_index( buf, data_start)
+            buf = None
+        else:
+            host_dir = os.path.dirname( path)
+            if not os.path.isdir( host_dir):
+                os.makedirs( host_dir)
+            f = open( path, 'w+b')
+            names = ','.join( self._columns)
+            f.write( _FILE_HEADER.pack( FILE_MAGIC, FILE_VERSION, len(names)) + names)
+            index_offset = f.tell()
+            entries = [ ]
+
+        try:
+            entries = entries + [ (index_offset, first_time, last_time, num_ticks) ]
+            f.seek( index_offset)
+            f.write( block)
+            new_index_offset = f.tell()
+            f.write( ''.join( [ _INDEX_ENTRY.pack( *entry) for entry in entries ]))
+            f.write( _TRAILER.pack( new_index_offset, len(entries), INDEX_MAGIC))
+            f.truncate()
+        finally:
+            f.close()
+        self._current_file = (path, new_index_offset, entries)
+
+
+class SFAArchiveReader(object):
+    '''
+    Reads one archive file through a memory map
+    '''
+
+    def __init__(self, path):
+        self._file = open( path, 'rb')
+        size = os.fstat( self._file.fileno()).st_size
+        if size == 0:
+            self._file.close()
+            raise ArchiveFormatError( "%s is empty"%path)
+        self._map = mmap.mmap( self._file.fileno(), size, access = mmap.ACCESS_READ)
+        (self.columns, data_start) = _read_file_header( self._map)
+        (self.index, unused) = _read_index( self._map, data_start)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def luns(self):
+        '''
+        Returns the set of all the LUN numbers in the file
+        '''
+        luns = set()
+        for (offset, unused_first, unused_last, unused_ticks) in self.index:
+            num_luns = _BLOCK_HEADER.unpack_from( self._map, offset)[3]
+            luns.update( self._block_luns( offset, num_luns))
+        return luns
+
+    def _block_luns(self, offset, num_luns):
+        num_ticks = _BLOCK_HEADER.unpack_from( self._map, offset)[2]
+        return struct.unpack_from( '<%dH'%num_luns, self._map,
+                                   offset + _BLOCK_HEADER.size + 8 * num_ticks)
+
+    def read_lun(self, lun, start = None, end = None, columns = None):
+        '''
+        Returns a tuple of (list of times, dictionary of column name -> list
+        of values) for one LUN.  start and end (inclusive) limit the time
+        range and columns limits which columns are decoded (default is all
+        of them).  Blocks that don't have the LUN are skipped.
+        '''
+        if columns is None:
+            columns = self.columns
+        for name in columns:
+            if name not in self.columns:
+                raise ValueError( "Unknown column '%s'"%name)
+        wanted = [ self.columns.index( name) for name in columns ]
+
+        times = [ ]
+        values = dict( [ (name, [ ]) for name in columns ])
+        buf = self._map
+        for (offset, first, last, unused) in self.index:
+            if (start is not None and last < start) or \
+               (end is not None and first > end):
+                continue
+
+            (unused_magic, unused_len, num_ticks, num_luns, num_columns) = \
+                    _BLOCK_HEADER.unpack_from( buf, offset)
+            luns = self._block_luns( offset, num_luns)
+            try:
+                lun_index = luns.index( lun)
+            except ValueError:
+                continue
+
+            times_at = offset + _BLOCK_HEADER.size
+            block_times = struct.unpack_from( '<%dq'%num_ticks, buf, times_at)
+            offsets_at = times_at + 8 * num_ticks + 2 * num_luns
+            pos = offset + struct.unpack_from( '<I', buf, offsets_at + 4 * lun_index)[0]
+
+            # which ticks in this block fall in the requested range
+            lo = 0
+            hi = num_ticks
+            if start is not None:
+                while lo < hi and block_times[lo] < start:
+                    lo += 1
+            if end is not None:
+                while hi > lo and block_times[hi - 1] > end:
+                    hi -= 1
+            times.extend( block_times[lo:hi])
+
+            for column in range( num_columns):
+                (width, first_value) = _COLUMN_HEADER.unpack_from( buf, pos)
+                data_at = pos + _COLUMN_HEADER.size
+                if column in wanted:
+                    decoded = _decode_column( buf, data_at, width, first_value,
+                                              num_ticks - 1)
+                    values[self.columns[column]].extend( decoded[lo:hi])
+                pos = data_at + width * (num_ticks - 1)
+
+        return (times, values)
+
+
+def _decode_column( buf, offset, width, first_value, num_deltas):
+    '''
+    Turns the first value and the deltas back into a list of values
+    '''
+    code = _WIDTHS[width][0]
+    if numpy is not None and num_deltas > 0:
+        deltas = numpy.frombuffer( buf, dtype = '<' + code, count = num_deltas,
+                                   offset = offset).astype( numpy.int64)
+        result = numpy.empty( num_deltas + 1, dtype = numpy.int64)
+        result[0] = first_value
+        numpy.cumsum( deltas, out = result[1:])
+        result[1:] += first_value
+        return result.tolist()
+
+    result = [ first_value ]
+    value = first_value
+    for delta in struct.unpack_from( '<%d%s'%(num_deltas, code), buf, offset):
+        value += delta
+        result.append( value)
+    return result
+
+
+def read_lun_history( directory, host, lun, start, end, columns = None):
+    '''
+    Reads one LUN's history from all the day files between start and end
+    (Unix times, inclusive).  Returns the same thing as
+    SFAArchiveReader.read_lun().  Days with no file are skipped.
+    '''
+    all_times = [ ]
+    all_values = None
+    day_start = int( start) - int( start) % 86400
+    for t in range( day_start, int(end) + 1, 86400):
+        path = archive_path( directory, host, day_of( t))
+        if not os.path.exists( path):
+            continue
+        reader = SFAArchiveReader( path)
+        try:
+            (times, values) = reader.read_lun( lun, start, end, columns)
+        finally:
+            reader.close()
+        all_times.extend( times)
+        if all_values is None:
+            all_values = values
+        else:
+            for (name, column) in values.items():
+                all_values[name].extend( column)
+    if all_values is None:
+        all_values = dict( [ (name, [ ]) for name in (columns or [ ]) ])
+    return (all_times, all_values)
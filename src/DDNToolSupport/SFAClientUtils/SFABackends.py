@@ -0,0 +1,142 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Registry of the optional output backends (and other modules with heavy
+optional dependencies).  Nothing here imports them up front:  a backend's
+module is only imported when load_backend() asks for it, and DDNTool only
+asks for the ones the config file turns on.  The controller processes are
+forked from the main process, so they inherit exactly that set.  A worker
+that only writes to InfluxDB never loads the MySQL connector, and vice
+versa.
+
+Running this module directly prints the import time and memory cost of
+each backend (each one measured in a fresh interpreter):
+
+    python -m DDNToolSupport.SFAClientUtils.SFABackends
+'''
+
+import importlib
+import subprocess
+import sys
+
+# Backend name -> (module in this package, what to install).  The config
+# sections that turn each one on are in configured_backends().
+BACKENDS = {
+    'sqldb' : ('SFAMySqlDb', "the MySQL connector (mysql-connector-python)"),
+    'tsdb' : ('SFAInfluxDb', "the InfluxDB modules"),
+    'request_summary' : ('SFAHistogram', "NumPy"),
+    'anomaly_detection' : ('SFAAnomaly', "NumPy")
+}
+
+_PACKAGE = __name__.rpartition('.')[0]
+
+
+def configured_backends( config):
+    '''
+    Returns the names of the backends that the config file needs
+    '''
+    names = [ ]
+    if config.has_section('SqlDb') or config.has_section('database'):
+        names.append( 'sqldb')
+    if config.has_section('TSDb'):
+        names.append( 'tsdb')
+    if config.has_option('polling', 'request_summary') and \
+       config.getboolean('polling', 'request_summary'):
+        names.append( 'request_summary')
+    if config.has_section('anomaly_detection'):
+        names.append( 'anomaly_detection')
+    return names
+
+
+def load_backend( name):
+    '''
+    Imports (if it hasn't been already) and returns the module for the named
+    backend.  Raises a RuntimeError if its dependencies aren't installed.
+    '''
+    (module_name, requirement) = BACKENDS[name]
+    try:
+        return importlib.import_module( '%s.%s'%(_PACKAGE, module_name))
+    except ImportError, e:
+        raise RuntimeError( "%s support not available (%s).  Install %s or "
+                            "remove it from the config file"%
+                            (module_name, e, requirement))
+
+
+def load_configured_backends( config):
+    '''
+    Loads every backend the config file needs.  DDNTool calls this before it
+    forks the controller processes so that missing dependencies are
+    reported right away and the processes don't each import them again.
+    '''
+    for name in configured_backends( config):
+        load_backend( name)
+
+
+# Run in a fresh interpreter by benchmark().  Prints the import time (in
+# seconds) and the increase in max RSS (in KiB) as the last line.
+_BENCHMARK_SCRIPT = '''
+import resource, time
+before = resource.getrusage( resource.RUSAGE_SELF).ru_maxrss
+start = time.time()
+from DDNToolSupport.SFAClientUtils.SFABackends import load_backend
+%s
+elapsed = time.time() - start
+print elapsed, resource.getrusage( resource.RUSAGE_SELF).ru_maxrss - before
+'''
+
+
+def benchmark( names = None, repeat = 5):
+    '''
+    Measures the cost of loading each backend (best of repeat runs, each in
+    a new interpreter so nothing is cached).  Returns a list of
+    (name, seconds, KiB of RSS) tuples.  seconds is None if the backend's
+    dependencies aren't installed.
+    '''
+    if names is None:
+        names = [ None ] + sorted( BACKENDS.keys())
+    results = [ ]
+    for name in names:
+        statement = 'pass'
+        if name is not None:
+            statement = 'load_backend( %r)'%name
+        best = None
+        for i in range( repeat):   # @UnusedVariable
+            proc = subprocess.Popen( [ sys.executable, '-c',
+                                       _BENCHMARK_SCRIPT%statement ],
+                                     stdout = subprocess.PIPE,
+                                     stderr = subprocess.PIPE)
+            (out, err) = proc.communicate()  # @UnusedVariable
+            if proc.returncode != 0:
+                best = None
+                break
+            (seconds, rss) = out.split()[-2:]
+            if best is None or float( seconds) < best[0]:
+                best = (float( seconds), int( rss))
+        if best is None:
+            results.append( (name or 'none', None, None))
+        else:
+            results.append( (name or 'none', best[0], best[1]))
+    return results
+
+
+if __name__ == '__main__':
+    print "%-16s %10s %10s"%('backend', 'ms', 'RSS KiB')
+    for (name, seconds, rss) in benchmark():
+        if seconds is None:
+            print "%-16s %10s"%(name, 'not installed')
+        else:
+            print "%-16s %10.1f %10d"%(name, seconds * 1000, rss)
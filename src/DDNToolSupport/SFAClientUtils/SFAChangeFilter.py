@@ -0,0 +1,86 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import threading
+
+
+class SFAChangeFilter(object):
+    '''
+    Remembers the last values written for each table and LUN so that rows
+    that haven't changed don't have to be written again.
+
+    A large fraction of the LUNs are idle at any given moment and idle LUNs
+    produce exactly the same values every iteration.  Skipping those rows
+    cuts the database load roughly in proportion to the number of idle LUNs.
+    To keep the LastUpdate columns (and time series graphs) from going
+    stale, an unchanged row is still written once every heartbeat seconds.
+
+    Each SFAClient has its own filter, so the host name is implied.  With
+    background_tiers, the main thread and the background tier thread both
+    use it (for different tables, but forget_lun() and the suppressed count
+    cover all of them), so everything is protected by a lock.
+    '''
+
+    def __init__(self, heartbeat):
+        '''
+        heartbeat is the max time (in seconds) between writes of an
+        unchanged row
+        '''
+        self.heartbeat = heartbeat
+
+        # Dictionary of dictionaries: table name -> LUN number -> (values,
+        # time of the last write)
+        self._last_written = { }
+        self._suppressed = 0
+        self._lock = threading.Lock()   # protects everything above
+
+    def should_write(self, table, lun_num, values, now):
+        '''
+        Returns True if the row for this table and LUN should be written.
+        values must be something that can be compared with == (a tuple or a
+        list, normally).  now is the update time for this iteration.
+
+        If this returns True, the caller is expected to actually write the
+        row: the values are recorded as the last ones written.
+        '''
+        with self._lock:
+            table_d = self._last_written.setdefault( table, { })
+            last = table_d.get( lun_num)
+            if last is not None and last[0] == values and \
+               (now - last[1]) < self.heartbeat:
+                self._suppressed += 1
+                return False
+
+            table_d[lun_num] = (values, now)
+            return True
+
+    def forget_lun(self, lun_num):
+        '''
+        Throws away everything we know about a LUN.  (Used when a LUN is
+        removed.)
+        '''
+        with self._lock:
+            for table_d in self._last_written.values():
+                table_d.pop( lun_num, None)
+
+    def take_suppressed_count(self):
+        '''
+        Returns the number of rows suppressed since the last call
+        '''
+        with self._lock:
+            count = self._suppressed
+            self._suppressed = 0
+        return count
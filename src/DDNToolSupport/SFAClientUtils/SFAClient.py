@@ -21,19 +21,28 @@
 
 import ConfigParser
 import logging
-import SFAMySqlDb
+import threading
+import time
+from SFABackends import load_backend
+from SFAOverloadPolicy import SFAOverloadPolicy
+from SFATopology import SFATopology, make_fingerprint, presentation_map
+from SFADriveSampler import SFADriveSampler
+from SFAChangeFilter import SFAChangeFilter
+from SFARateWindows import SFARateWindows, parse_rate_windows
+from SFAPrometheus import SFAPrometheus
+from SFAArchive import SFAArchiveWriter, DEFAULT_BLOCK_TICKS
+from SFASinks import FAST, MEDIUM, SLOW, EVENTS, DRIVES, SINK_SECTION_PREFIX, \
+                     SNAPSHOT_RAW_NAMES, FastRecord, MediumRecord, SlowRecord, \
+                     EventRecord, DriveRecord, DriveStatsRecord, \
+                     LunRecord, MediumLunRecord, CollectorStats, lun_histograms, \
+                     load_sink_class, SqlDbSink, TsDbSink, PrometheusSink, \
+                     ArchiveSink, StatusSink, HistorySink
 from SFATimeSeries import SFATimeSeries
 from SFATimeSeries import EmptyTimeSeriesException
 
-try:
-    import SFAInfluxDb    
-except ImportError:
-    # InfluxDb support is optional.  The main function specifically checks
-    # for the case where the user configured the tool to output to InfluxDb
-    # and and will raise a RuntimeError if the import failed.  So, it's safe
-    # to silently ignore such an error here.
-    pass
-
+# Note: the database modules (and SFAHistogram) aren't imported here.  They
+# pull in optional dependencies, so they're only loaded (via load_backend())
+# when the config file asks for them.  (See SFABackends.)
 
 from ddn.sfa.api import *
 from pywbem.cim_operations import CIMError
@@ -43,11 +52,73 @@ from pywbem.cim_operations import CIMError
 # SFADiskDriveStatistics class.  This code has all be commented out because
 # processing those objects is so slow.  I'm keeping the code around though
 # in case we change our minds about this.
+# The per-drive request size & latency tables *can* be filled in by the
+# (optional) round-robin drive sampler instead.  See _drive_stats_tasks().
 #
 
 MINIMUM_FW_VER = '2.3.0'
 # 2.3.0 is needed for the read & write bandwidth numbers
 
+# Names of the per-LUN time series (keys for SFAClient._time_series)
+LUN_SERIES_NAMES = [ 'lun_read_iops', 'lun_write_iops', 'lun_transfer_bytes',
+                     'lun_read_bytes', 'lun_write_bytes', 'lun_forwarded_bytes',
+                     'lun_forwarded_iops' ]
+
+# The same series, in the order the rates are written to the LunInfo table
+LUN_RATE_SERIES_NAMES = [ 'lun_transfer_bytes', 'lun_read_bytes',
+                          'lun_write_bytes', 'lun_read_iops', 'lun_write_iops',
+                          'lun_forwarded_bytes', 'lun_forwarded_iops' ]
+
+# Note: the key names for the rates and raw counters in the status snapshots
+# (SNAPSHOT_RATE_NAMES and SNAPSHOT_RAW_NAMES) are in SFASinks.  They're in
+# the same order as LUN_RATE_SERIES_NAMES and _get_raw_lun_values().
+
+# Columns in the local archive files (see SFAArchive)
+ARCHIVE_COLUMNS = SNAPSHOT_RAW_NAMES + [ 'pool_state' ]
+
+# Default for topology_refresh_interval (in seconds).  See _parse_polling_config()
+DEFAULT_TOPOLOGY_REFRESH_INTERVAL = 600
+
+# Defaults for the drive_stats section of the config file
+DEFAULT_DD_TIME_BUDGET = 0.25       # seconds per fast iteration
+DEFAULT_DD_COVERAGE_PERIOD = 300    # seconds to visit every drive
+DEFAULT_DD_BATCH_SIZE = 50          # drives per database update
+
+# The request size and latency labels we expect from the controller (and
+# have hard coded into the database column headings).  See _check_labels().
+EXPECTED_SIZE_LABELS = ['<=4KiB', '<=8KiB', '<=16KiB', '<=32KiB',
+    '<=64KiB', '<=128KiB', '<=256KiB', '<=512KiB', '<=1MiB',
+    '<=2MiB', '<=4MiB', '>4MiB']
+
+# We're assuming the labels changed with the 3.0.0.0 firmware.  We
+# *know* that the 3.0.1.5 firmware has the new labels, though.
+# TODO! We should find out exactly which firmware version switched to
+# the new labels!
+EXPECTED_LUN_LATENCY_LABELS = { } # use the firmware major version for the key
+EXPECTED_LUN_LATENCY_LABELS[2] = \
+    ['<=16ms', '<=32ms', '<=64ms', '<=128ms', '<=256ms', '<=512ms',
+     '<=1s', '<=2s', '<=4s', '<=8s', '<=16s','>16s']
+
+EXPECTED_LUN_LATENCY_LABELS[3] = \
+    ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
+     '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
+
+EXPECTED_LUN_LATENCY_LABELS[11] = \
+    ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
+     '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
+
+# The disk drives report "Latency Counts <=4ms", etc...  (We compare
+# against the last word of each label, just like the LUN labels.)
+EXPECTED_DD_LATENCY_LABELS = \
+    ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
+     '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
+
+# Values for the (optional) control object passed to the constructor.  The
+# main process uses them to send commands to one specific client process.
+CONTROL_NONE = 0    # nothing to do
+CONTROL_RELOAD = 1  # re-read the polling section of the config file
+CONTROL_EXIT = 2    # shut down (host was removed from the config file)
+
 class UnexpectedClientDataException( Exception):
     '''
     Used when the DDN API sent back data that we weren't expecting
@@ -76,9 +147,21 @@ class SFAClient():
     only "public" function it has is run().
     '''
 
-    def __init__(self, address, conf_file, event, update_time):
+    def __init__(self, address, conf_file, event, update_time, control = None,
+                 snapshot_queue = None, host_name = None):
         '''
         Constructor
+        
+        control is an optional multiprocessing.Value object that the main
+        process uses to send us one of the CONTROL_* commands.
+        
+        snapshot_queue is an optional multiprocessing.Queue.  If it's set, we
+        put a snapshot of the current LUN stats on it after every fast
+        iteration.  (See SFASinks.StatusSink.)
+        
+        host_name is the name our data is reported under.  It defaults to
+        address, but for a couplet it's the couplet's name, so the data
+        doesn't move when DDNTool fails over to the other controller.
         '''
 
         # Get the logger object
@@ -88,6 +171,9 @@ class SFAClient():
         # parameters for accessing the SFA hardware       
         self._address = address 
         self._uri = "https://" + address
+        self._host_name = host_name
+        if host_name is None:
+            self._host_name = address
         # user and password are in the config file.  (So's the address, but
         # *all* the addresses are in there and we wouldn't know which one to
         # connect to.)        
@@ -102,6 +188,13 @@ class SFAClient():
         # open up the config file and grab settings for the database and
         # polling intervals
         self.logger.debug( 'Parsing config file')
+        self._conf_file = conf_file
+        self._snapshot_queue = snapshot_queue
+        self._overload_policy = None    # created by _parse_polling_config()
+        self._drive_sampler = None      # created by _parse_config_file()
+        self._change_filter = None      # created by _parse_polling_config()
+        self._request_summary = None    # created by _get_request_summaries()
+        self._sample_time = None        # time stamp of the latest fast poll values
         self._parse_config_file( conf_file)
         
         # Time series data
@@ -111,15 +204,26 @@ class SFAClient():
         # (We use an inner dictionary instead of a list so the device
         # numbers don't have to be sequential.)
         self._time_series = {}
+        self._window_rates = {} # same layout as _time_series, but holds
+                                # SFARateWindows objects (if rate_windows is
+                                # set in the config file)
   
-        # Statistics objects
-        # We keep copies of each SFAVirtualDiskStatistics and 
-        # SFADiskDriveStatistics object (mainly for the I/O latency and
-        # request size arrays).
+        # Statistics
+        # We keep a LunStats object (the raw counters and the I/O latency and
+        # request size arrays) for each SFAVirtualDiskStatistics object.
+        # (Not the objects themselves - they're much bigger.)
         # Note: _vd_stats is indexed by the LUN number.  _dd_stats is
         # indexed by the disk drive number
         self._vd_stats = {}
 #        self._dd_stats = {}
+
+        # Disk drive statistics from the round-robin sampler (if it's enabled)
+        # _dd_samples holds DriveSample objects waiting to be sent to the
+        # sinks.  _dd_last_sample holds the most recent sample for each
+        # drive (indexed by drive number) so we can compute rates.
+        self._dd_samples = [ ]
+        self._dd_last_sample = { }
+        self._dd_labels_checked = False
         
         # Storage pool state
         # We currently keep only one field from the SFAStoragePool classes: PoolState
@@ -129,8 +233,14 @@ class SFAClient():
         # LUN to virtual disk map
         # The statistics objects deal with virtual disks, but we want to display
         # everything as LUN's.  This maps one to the other.  (VD index is the key,
-        # LUN number is the value.) It's updated at the medium frequency.
+        # LUN number is the value.)  It comes from the current topology (see
+        # _set_topology()) which is checked at the medium frequency.
         self._vd_to_lun = { }
+        self._topology = SFATopology.empty()
+        
+        # The virtual disk indexes seen by the most recent fast poll.  Used
+        # to check whether the topology has changed.
+        self._seen_vd_indexes = frozenset()
     
         # connect to the SFA controller
         self.logger.debug( 'Connecting to DDN hardware')
@@ -160,32 +270,39 @@ class SFAClient():
         
         # open a connection to the database(s)
         if self._have_sqldb:
-            self.logger.debug( 'Opening SQL DB connection')
-            self._sqldb = SFAMySqlDb.SFAMySqlDb(self._sqldb_user, self._sqldb_password,
-                                                self._sqldb_host, self._sqldb_name, False)
+            self._sqldb = self._open_sqldb()
             
         if self._have_tsdb:
-            self.logger.debug( 'Opening time series DB connection')
-            self._tsdb = SFAInfluxDb.SFAInfluxDb(self._tsdb_user, self._tsdb_password,
-                                                 self._tsdb_host, self._tsdb_name,
-                                                 (self._fw_major >= 3), False)
-            # Firmware version 3 is where we switch to the new latency table labels
+            self._tsdb = self._open_tsdb()
 
         self.logger.debug( 'Calling _time_series_init()')
         self._time_series_init()
         self.logger.debug( '_time_series_init() completed.  Calling _check_labels()')
         self._check_labels()    # verify the labels for the request sizes and latencies
                                 # match what we've hard-coded into the database
+        
+        # The outputs:  databases, Prometheus, status snapshots, the local
+        # archive and any plugins.  (See SFASinks.)
+        self._sinks = self._make_sinks()
                                 
         # Save the event and update time object
         # event is a multiprocessing.Event object and update_time is a
         # multiprocessing.Value object
         self._event = event
         self._update_time = update_time
+        self._control = control
         # keep a local copy of the time value that we're sure won't change in
         # the middle of the main loop
         self._non_shared_update_time = 0  
         
+        # Thread that runs the medium and slow tiers (if background_tiers
+        # is enabled in the config file).  Started by run().
+        self._tier_thread = None
+        
+        # A few stats about ourselves (for the Prometheus output)
+        self._iterations_completed = 0
+        self._last_iteration_seconds = 0.0
+        
         self.logger.debug( '__init__ completed')
         
     # This function mostly exists for the case where the main process is
@@ -233,6 +350,14 @@ class SFAClient():
         # time series should be able to return a value for their average and we shouldn't
         # get any EmptyTimeSeries exceptions.
         self._fast_poll_tasks()
+        
+        if self._background_tiers:
+            # Run the medium poll tasks once right away for the same reason:
+            # the fast DB tasks need the pool states.  After this, the
+            # background thread takes over the medium and slow tiers.
+            self._medium_poll_tasks()
+            self._tier_thread = TierThread( self)
+            self._tier_thread.start()
 
         fast_iteration = -1 # This is initialized to -1 in order to force us to execute
                             # the medium and slow poll stuff the first time we pass
@@ -243,9 +368,8 @@ class SFAClient():
             self.logger.debug( "Waiting on event")
             self._event.wait()  # wait until we're told to poll
             self.logger.info( "Waking up")
+            tick_start = time.time()
                       
-            fast_iteration += 1
-            
             # Grab a copy of the update time and check if we're
             # supposed to exit
             # Note: this should be the only place in this module where
@@ -255,89 +379,213 @@ class SFAClient():
                 self._exit_requested = True
                 break
             
+            # Check for commands from the main process
+            if self._control is not None:
+                if self._control.value == CONTROL_EXIT:
+                    self.logger.info( 'Exit requested by the main process')
+                    self._exit_requested = True
+                    break
+                elif self._control.value == CONTROL_RELOAD:
+                    self._reload_config_file()
+                    self._control.value = CONTROL_NONE
+            
+            # If we're badly overloaded, we only run some of the iterations
+            if self._overload_policy is not None and \
+               self._overload_policy.skip_tick():
+                self.logger.debug( "Overloaded.  Skipping this iteration.")
+                self._event.clear()
+                continue
+            
+            fast_iteration += 1
+            
+            # Figure out which tiers are due this iteration (and whether
+            # we need to shed any of them)
+            medium_due = (fast_iteration % self._med_poll_multiple == 0)
+            slow_due = (fast_iteration % self._slow_poll_multiple == 0)
+            histograms_due = medium_due
+            if self._overload_policy is not None:
+                if slow_due and self._overload_policy.defer_slow_tier():
+                    self.logger.debug( "Overloaded.  Deferring slow tier.")
+                    slow_due = False
+                if histograms_due and self._overload_policy.defer_histograms():
+                    self.logger.debug( "Overloaded.  Deferring request size "
+                                       "and latency updates.")
+                    histograms_due = False
                 
             ############# Fast Interval Stuff #######################
             self._fast_poll_tasks()           
             
-            ############# Medium Interval Stuff #####################
-            if (fast_iteration % self._med_poll_multiple == 0):
-                self._medium_poll_tasks()
+            # The disk drive sampler is the lowest priority thing we do, so
+            # it's the first thing to go if we're overloaded
+            if self._drive_sampler is not None and \
+               (self._overload_policy is None or
+                not self._overload_policy.defer_slow_tier()):
+                self._drive_stats_tasks()
             
-            ############# Slow Interval Stuff #######################
-            if (fast_iteration % self._slow_poll_multiple == 0):
-                self._slow_poll_tasks()
+            if self._tier_thread is not None:
+                # Pick up whatever the background thread finished since the
+                # last iteration and then hand it the next batch of work
+                results = self._tier_thread.take_results()
+                if results is not None:
+                    self._apply_medium_poll_results( results)
+                self._submit_tier_work( medium_due, slow_due, histograms_due)
+            else:
+                ############# Medium Interval Stuff #####################
+                if medium_due:
+                    self._medium_poll_tasks()
+                
+                ############# Slow Interval Stuff #######################
+                if slow_due:
+                    self._slow_poll_tasks()
 
-            ##=====================Database Stuff====================
-            # Note: the database operations are down here after the polling operations
+            ##=====================Output Stuff======================
+            # Note: the outputs are down here after the polling operations
             # to ensure that everything is polled at least once before we try to push
             # anything to the database
-            ############# Fast Interval Stuff #######################
-            if self._have_sqldb:
-                self._fast_sqldb_tasks()
-                           
-            if self._have_tsdb:
-                self._fast_tsdb_tasks()
-                        
-            ############# Medium Interval Stuff #####################
-            if (fast_iteration % self._med_poll_multiple == 0):
-                self.logger.debug( 'Executing medium rate DB tasks')
-                if self._have_sqldb:
-                    self._medium_sqldb_tasks()
-                if self._have_tsdb:
-                    self._medium_tsdb_tasks()
+            # (Everything this iteration writes to the SQL db's InnoDB tables
+            # is one transaction.  The HEAP tables don't have transactions.)
+            for sink in self._sinks:
+                sink.begin_tick()
+            
+            records = [ (FAST, self._fast_record) ]
+            if self._tier_thread is None:
+                records += self._tier_records( histograms_due, slow_due,
+                                               self._vd_stats,
+                                               self._non_shared_update_time)
+            self._write_records( self._sinks, records)
+            if self._analysis is not None:
+                self._write_events()
             
-            ############# Slow Interval Stuff #######################
-            if (fast_iteration % self._slow_poll_multiple == 0):
-                self.logger.debug( 'Executing slow rate DB tasks')
-                if self._have_sqldb:
-                    self._slow_sqldb_tasks()
-                if self._have_tsdb:
-                    self._slow_tsdb_tasks()
+            if self._drive_sampler is not None and \
+               len(self._dd_samples) >= self._dd_batch_size:
+                self._write_records( self._sinks,
+                                     [ (DRIVES, self._drive_record) ])
+                self._dd_samples = [ ]
+            
+            for sink in self._sinks:
+                sink.end_tick()
+            self._log_suppressed_writes()
+            
+            self._last_iteration_seconds = time.time() - tick_start
+            self._iterations_completed += 1
+            if self._overload_policy is not None:
+                self._overload_policy.tick_completed( self._last_iteration_seconds,
+                        self._overload_threshold * self._fast_poll_interval)
                         
             self._event.clear();    # Clear the event to signal that we're done
                                     # processing this iteration
         # end of main while loop
+        
+        if self._tier_thread is not None:
+            self._tier_thread.stop()
+        
+        for sink in self._sinks:
+            sink.close()
     # end of run() 
 
 
+    def _submit_tier_work(self, medium, slow, histograms):
+        '''
+        Hands the medium and/or slow tier work for this iteration (if there
+        is any) to the background thread.  medium, slow and histograms are
+        booleans that say which parts are due.  (histograms is the medium
+        tier request size & latency updates.)
+        
+        If the thread is still busy with the previous batch, this batch is
+        skipped.  That's the whole point: heavy medium tier work delays the
+        next medium update instead of the fast tier.
+        '''
+        if not (medium or slow):
+            return
+        
+        if not self._tier_thread.is_alive():
+            # The thread couldn't connect to the controller (or died some
+            # other way).  Fall back to doing the work ourselves.
+            self.logger.error( 'Background tier thread is not running.  '
+                               'Running the medium and slow tiers inline.')
+            self._tier_thread = None
+            if medium:
+                self._medium_poll_tasks()
+            if slow:
+                self._slow_poll_tasks()
+            return
+            # Note: run() takes care of the DB tasks once _tier_thread is None
+        
+        # Note: _fast_poll_tasks() builds a brand new _vd_stats dictionary
+        # (and _seen_vd_indexes set) each iteration, so handing the thread
+        # references to the current ones is safe.
+        job = TierJob( medium, slow, histograms, self._vd_stats,
+                       self._seen_vd_indexes, self._non_shared_update_time)
+        if not self._tier_thread.submit( job):
+            self.logger.warning( 'Background tier thread is still busy.  '
+                                 'Skipping this round of medium/slow tier work.')
+
+
     def _fast_poll_tasks(self):
         '''
         Retrieves all the values we need to get from the controller at the fast interval.
         '''
         ##Virtual Disk Statistics 
+        # All the values from one getAll() call share a single time stamp:
+        # the midpoint of the request.  (We don't know exactly when the
+        # controller read its counters, but that's the best guess and it
+        # keeps our own processing time out of the rates.)
+        request_time = time.time()
         vd_stats = SFAVirtualDiskStatistics.getAll()
+        sample_time = (request_time + time.time()) / 2
+        self._sample_time = sample_time
         
+        previous_stats = self._vd_stats
+        reset_luns = [ ]
         self._vd_stats = { } # erase the old _vd_stats dictionary
+        seen_vd_indexes = [ ]
         for stats in vd_stats:
             index = stats.Index
-
-            # Save the entire object (mainly for its I/O latency and request
-            # size arrays
-            self._vd_stats[self._vd_to_lun[index]] = stats
-            
-            # Note: we actually get back 2 element lists - one element
-            # for each controller in the couplet.  In theory, one of those
-            # elements should always be 0.
-            self._time_series['lun_read_iops'][self._vd_to_lun[index]].append(stats.ReadIOs[0] + stats.ReadIOs[1])
-            self._time_series['lun_write_iops'][self._vd_to_lun[index]].append(stats.WriteIOs[0] + stats.WriteIOs[1])
-            self._time_series['lun_transfer_bytes'][self._vd_to_lun[index]].append(
-                    (stats.KBytesTransferred[0] + stats.KBytesTransferred[1]) * 1024)
-            # Note: converted to bytes
+            seen_vd_indexes.append( index)
             
-            self._time_series['lun_read_bytes'][self._vd_to_lun[index]].append(
-                    (stats.KBytesRead[0] + stats.KBytesRead[1]) * 1024)
-            # Note: converted to bytes
+            try:
+                lun_num = self._vd_to_lun[index]
+            except KeyError:
+                # Either a new virtual disk that the topology doesn't know
+                # about yet (the changed fingerprint will trigger a rebuild at
+                # the next medium interval) or one that isn't presented as a LUN.
+                continue
             
-            self._time_series['lun_write_bytes'][self._vd_to_lun[index]].append(
-                    (stats.KBytesWritten[0] + stats.KBytesWritten[1]) * 1024)
-            # Note: converted to bytes
+            if lun_num not in self._time_series['lun_read_iops']:
+                self._add_lun_time_series( lun_num)
 
-            self._time_series['lun_forwarded_bytes'][self._vd_to_lun[index]].append(
-                    (stats.KBytesForwarded[0] + stats.KBytesForwarded[1]) * 1024)
-            # Note: converted to bytes 
-
-            self._time_series['lun_forwarded_iops'][self._vd_to_lun[index]].append(
-                    stats.ForwardedIOs[0] + stats.ForwardedIOs[1])
+            # Keep just the values we need.  The CIM object itself is
+            # dropped at the end of this loop.
+            lun_stats = LunStats( stats)
+            self._vd_stats[lun_num] = lun_stats
+            
+            # The rates skip over counter resets on their own (see
+            # SFATimeSeries.average()), but it's worth a note in the log
+            previous = previous_stats.get( lun_num)
+            if previous is not None and \
+               any( new < old for (new, old) in zip( lun_stats.raw, previous.raw)):
+                reset_luns.append( lun_num)
+            
+            (transfer_bytes, read_bytes, write_bytes, forwarded_bytes,
+             total_ios, read_ios, write_ios, forwarded_ios) = lun_stats.raw  # @UnusedVariable
+            # (In the same order as LUN_SERIES_NAMES)
+            values = ( read_ios, write_ios, transfer_bytes, read_bytes,
+                       write_bytes, forwarded_bytes, forwarded_ios )
+            for (name, value) in zip( LUN_SERIES_NAMES, values):
+                self._time_series[name][lun_num].append( value, sample_time)
+                # Feed the same values (and time stamp) to the long window rates
+                if self._rate_windows:
+                    self._window_rates[name][lun_num].append( value, sample_time)
+                    
+        self._seen_vd_indexes = frozenset( seen_vd_indexes)
+        
+        if reset_luns:
+            lun_list = ', '.join( [ str(l) for l in reset_luns[:10] ])
+            if len(reset_luns) > 10:
+                lun_list += ', ...'
+            self.logger.warning( "Counters went backwards for %d LUN(s) (%s).  "
+                                 "Controller reboot or failover?"%
+                                 (len(reset_luns), lun_list))
 
         ##Disk Statistics
 # Disabling this code because we don't need it at the fast rate.
@@ -359,222 +607,377 @@ class SFAClient():
         '''
         Retrieves all the values we need to get from the controller at the medium interval.
         ''' 
-        # Update the LUN to virtual disk map.  (We probably don't
-        # need to do this very often, but it's not a lot of work
-        # and this way if an admin ever makes any changes, they'll
-        # show up fairly quickly
-        self._update_lun_map()
+        self._apply_medium_poll_results(
+                self._collect_medium_poll_results( self._seen_vd_indexes))
+
+
+    def _collect_medium_poll_results(self, vd_indexes):
+        '''
+        Queries the controller for the medium interval values and returns
+        them (as a MediumPollResults object) without modifying any of our
+        state.  That makes it safe to call from the background tier thread.
         
+        vd_indexes is the set of virtual disk indexes from the most recent
+        fast poll.  Along with the pool indexes and the presentations, it's
+        used to decide whether the topology needs to be rebuilt.
+        '''
         # Grab the storage pool data (so we can find out if the pool is in a degraded state)
-        # Store it in a temporary dictionary, indexed by the pool's Index member
+        # We need this every time because pool states change.  We only keep the state,
+        # indexed by the pool's Index member.
+        # The SFA API transitioned from `PoolState` to `HealthState` a while back but
+        # kept `PoolState` for legacy purposes. That support has now been dropped entirely
         storage_pools = SFAStoragePool.getAll()  
-        pools_d = { }
+        pool_states = { }
         for pool in storage_pools:
-            pools_d[pool.Index] = pool
+            pool_states[pool.Index] = pool.HealthState
         
-        self._storage_pool_states = { } # erase the old _storage_pool_states dictionary    
+        # The LUN layout hardly ever changes, so we only re-enumerate the
+        # virtual disks when the indexes we've seen or the presentations
+        # change (or the topology gets old enough that we want to double
+        # check it).  The presentations are read every time:  a virtual disk
+        # can be re-mapped to a different LUN without any index changing.
+        # Note: self._topology is only ever replaced (never modified), so
+        # grabbing a reference to it here is safe even from the background
+        # thread.
+        topology = self._topology
+        presentations = SFAPresentation.getAll()
+        fingerprint = make_fingerprint( vd_indexes, pool_states.keys(),
+                                        presentation_map( presentations))
+        if not topology.is_current( fingerprint, self._topology_refresh_interval):
+            topology = SFATopology.build( presentations,
+                                          SFAVirtualDisk.getAll(),
+                                          pool_states.keys(),
+                                          topology.generation + 1)
+            if topology.same_layout( self._topology):
+                # Nothing actually changed, so it's not a new generation
+                topology.generation = self._topology.generation
+
+        return MediumPollResults( topology, topology.lun_pool_states( pool_states))
+
 
-        # Now, get all the virtual disks and map them back to the pool they're created
-        # from.  (For now, we just want the pool state, not the whole SFAStoragePool object)
-        virt_disks = SFAVirtualDisk.getAll()  
-        for disk in virt_disks:
-            # Save the PoolState field in the dictionary
-            # The SFA API transitioned from `PoolState` to `HealthState` a while back but
-            # kept `PoolState` for legacy purposes. That support has now been dropped entirely
-            self._storage_pool_states[self._vd_to_lun[disk.Index]] = pools_d[disk.PoolIndex].HealthState
+    def _apply_medium_poll_results(self, results):
+        '''
+        Copies the results of _collect_medium_poll_results() (and the drive
+        list, if the background thread ran the slow tier) into our state.
+        Only called from the main (fast tier) thread.
+        '''
+        if results.topology is not None:
+            if results.topology is not self._topology:
+                self._set_topology( results.topology)
+            self._storage_pool_states = results.storage_pool_states
+        self._apply_drive_list( results.drive_indexes)
 
 
+    def _set_topology(self, topology):
+        '''
+        Switches to a new topology.  Time series for LUNs that no longer
+        exist are thrown away.  (Time series for new LUNs are created the
+        first time the fast poll sees them.)
+        '''
+        old_luns = self._topology.luns()
+        new_luns = topology.luns()
+        
+        for lun_num in old_luns - new_luns:
+            self.logger.info( "LUN %d no longer exists.  Removing it."%lun_num)
+            for series in self._time_series.values():
+                series.pop( lun_num, None)
+            for rates in self._window_rates.values():
+                rates.pop( lun_num, None)
+            self._vd_stats.pop( lun_num, None)
+            if self._change_filter is not None:
+                self._change_filter.forget_lun( lun_num)
+        
+        if self._topology.generation > 0:
+            # (Don't bother logging the initial list of LUNs.  Note that if
+            # the topology was just refreshed without any changes, both
+            # of these loops are empty.)
+            for lun_num in new_luns - old_luns:
+                self.logger.info( "Found new LUN %d"%lun_num)
+            
+        self._topology = topology
+        self._vd_to_lun = topology.vd_to_lun
+        self.logger.debug( "Topology generation %d: mapped %d virtual disks to LUNs"%
+                           (topology.generation, len(self._vd_to_lun)))
+
 
     def _slow_poll_tasks(self):
         '''
-        Retrieves all the values we need to get from the controller at the fast interval.
+        Retrieves all the values we need to get from the controller at the slow interval.
+        
+        (If background_tiers is enabled, the background tier thread calls
+        _collect_drive_list() instead and hands the list back in its
+        MediumPollResults.)
         '''
-        pass # no slow poll tasks yet
+        self._apply_drive_list( self._collect_drive_list())
 
-    
-    def _fast_sqldb_tasks(self):
+
+    def _collect_drive_list(self):
         '''
-        Update all the values in the SQL database that need to be updated at the fast rate.
+        Returns the indexes of the disk drives, or None if the drive sampler
+        is off.  (Drives don't come and go very often, so this happens at
+        the slow interval.)  Doesn't modify any of our state, so it's safe
+        to call from the background tier thread.
         '''
+        if self._drive_sampler is None:
+            return None
+        return [ dd.Index for dd in SFADiskDrive.getAll() ]
 
-        for lun_num in self._vd_to_lun.values():
-            try:
-                read_iops = self._get_time_series_average( 'lun_read_iops', lun_num, 60)
-                write_iops = self._get_time_series_average( 'lun_write_iops', lun_num, 60)
-                transfer_bandwidth = self._get_time_series_average( 'lun_transfer_bytes', lun_num, 60)
-                read_bandwidth = self._get_time_series_average( 'lun_read_bytes', lun_num, 60)
-                write_bandwidth = self._get_time_series_average( 'lun_write_bytes', lun_num, 60)
-                fw_bandwidth = self._get_time_series_average( 'lun_forwarded_bytes', lun_num, 60)
-                fw_iops = self._get_time_series_average( 'lun_forwarded_iops', lun_num, 60)
-                
-                # Get the pool state we copied out of the associated SFAStoragePool object
-                # Note: this object is only updated at the medium rate
-                try:
-                    pool_state = self._storage_pool_states[lun_num]
-                except KeyError:
-                    self.logger.error( "No storage pool states mapped to LUN number %d!!"%lun_num)
-                    self.logger.error( "Setting pool state to UNKNOWN!")
-                    pool_state = 255
-                
-                self._sqldb.update_lun_table(self._get_host_name(), self._non_shared_update_time, 
-                                          lun_num, transfer_bandwidth[0],
-                                          read_bandwidth[0], write_bandwidth[0],
-                                          read_iops[0], write_iops[0],
-                                          fw_bandwidth[0], fw_iops[0], pool_state)
+
+    def _apply_drive_list(self, drive_indexes):
+        '''
+        Hands the list from _collect_drive_list() to the drive sampler.
+        Only called from the main (fast tier) thread, which is the only
+        thread that changes _drive_sampler.
+        '''
+        if drive_indexes is None or self._drive_sampler is None:
+            return
+        self._drive_sampler.set_drives( drive_indexes)
+        self.logger.debug( "Drive sampler has %d drives"%self._drive_sampler.num_drives())
+
+
+    def _drive_stats_tasks(self):
+        '''
+        Fetches the statistics for this iteration's share of the disk drives.
+        
+        Stops as soon as the time budget for this iteration is used up.  The
+        stats are reduced to DriveSample objects right away and queued up
+        for _drive_record().
+        '''
+        start_time = time.time()
+        count = 0
+        for index in self._drive_sampler.this_tick( self._fast_poll_interval):
+            stats = SFADiskDriveStatistics.get( Index=index)
+            if not self._dd_labels_checked:
+                if not self._check_dd_labels( stats):
+                    # Don't know how to interpret the data, so give up on it
+                    self._drive_sampler = None
+                    self._dd_samples = [ ]
+                    return
+                self._dd_labels_checked = True
+            self._dd_samples.append( DriveSample( stats, self._non_shared_update_time))
+            count += 1
+            if time.time() - start_time > self._dd_time_budget:
+                break
             
+        self.logger.debug( "Fetched statistics for %d disk drives in %.3f seconds"%
+                           (count, time.time() - start_time))
+
+
+    
+    def _fast_record(self):
+        '''
+        Builds the FastRecord (see SFASinks) for this iteration from the
+        stats we just polled.
+        '''
+        luns = [ ]
+        for lun_num in sorted( self._vd_stats.keys()):
+            try:
+                rates = tuple( [ self._get_time_series_average( name, lun_num, 60)[0]
+                                 for name in LUN_RATE_SERIES_NAMES ])
             except EmptyTimeSeriesException:
-                print "Skipping empty time series for host %s, virtual disk %d"% \
-                        (self._get_host_name(), lun_num)
-                   
-            # Work on the values for the raw lun table (grab the raw
-            # values out of the saved stats object)
-            tmp_stats = self._vd_stats[lun_num]
-            
-            read_bytes = (tmp_stats.KBytesRead[0] + tmp_stats.KBytesRead[1]) * 1024
-            write_bytes = (tmp_stats.KBytesWritten[0] + tmp_stats.KBytesWritten[1]) * 1024
-            transfer_bytes = (tmp_stats.KBytesTransferred[0] + tmp_stats.KBytesTransferred[1]) * 1024
-            forwarded_bytes = (tmp_stats.KBytesForwarded[0] + tmp_stats.KBytesForwarded[1]) * 1024
-            # Note: converted to bytes
-            
-            total_ios = (tmp_stats.TotalIOs[0] + tmp_stats.TotalIOs[1])
-            forwarded_ios = (tmp_stats.ForwardedIOs[0] + tmp_stats.ForwardedIOs[1])
-            read_ios = (tmp_stats.ReadIOs[0] + tmp_stats.ReadIOs[1])
-            write_ios = (tmp_stats.WriteIOs[0] + tmp_stats.WriteIOs[1])
-            
-            self._sqldb.update_raw_lun_table( self._get_host_name(), self._non_shared_update_time,
-                          lun_num, transfer_bytes,read_bytes, write_bytes,
-                          forwarded_bytes, total_ios, read_ios, write_ios,
-                          forwarded_ios, pool_state)
-                
+                self.logger.debug( "Not enough data for the rates for LUN %d yet"%lun_num)
+                rates = None
+            try:
+                window_rates = self._get_window_rates( lun_num)
+            except EmptyTimeSeriesException:
+                window_rates = None
+            luns.append( LunRecord( lun_num, self._get_raw_lun_values( lun_num),
+                                    self._get_pool_state( lun_num), rates,
+                                    window_rates,
+                                    self._vd_stats[lun_num].histograms))
+        
+        overload_level = 0
+        if self._overload_policy is not None:
+            overload_level = self._overload_policy.level
+        collector = CollectorStats( self._last_iteration_seconds,
+                                    self._iterations_completed, overload_level,
+                                    self._fast_poll_interval)
+        return FastRecord( FAST, self._get_host_name(),
+                           self._non_shared_update_time, tuple( luns), collector,
+                           self._sample_time)
 
 
+    def _medium_record(self, vd_stats, update_time):
+        '''
+        Builds the MediumRecord (see SFASinks) with the request size &
+        latency histograms (and summaries, if they're turned on) from
+        vd_stats.  Called from the background tier thread if there is one.
+        '''
+        summaries = self._get_request_summaries( vd_stats)
+        luns = [ MediumLunRecord( lun_num, vd_stats[lun_num].histograms,
+                                  summaries.get( lun_num))
+                 for lun_num in sorted( vd_stats.keys()) ]
+        return MediumRecord( MEDIUM, self._get_host_name(), update_time,
+                             tuple( luns))
 
-# It turns out that we don't care about the per-disk iops & bandwidth
-#        for dd_num in self._dd_stats.keys():
-#            try:
-#                read_iops = self._get_time_series_average( 'dd_read_iops', dd_num, 60)
-#                write_iops = self._get_time_series_average( 'dd_write_iops', dd_num, 60)
-#                bandwidth = self._get_time_series_average( 'dd_transfer_bytes', dd_num, 60)
-#                self._sqldb.update_dd_table(self._get_host_name(), self._non_shared_update_time,
-#                                   dd_num, bandwidth[0],
-#                                   read_iops[0], write_iops[0])
-#            except EmptyTimeSeriesException:
-#                print "Skipping empty time series for host %s, disk drive %d"% \
-#                      (self._get_host_name(), dd_num)
-
-
-    def _medium_sqldb_tasks(self):
-        '''
-        Update all the values in the SQL database that need to be updated at the medium rate.
-        '''
-        for lun_num in self._vd_to_lun.values():
-            request_values =  self._vd_stats[lun_num].ReadIOSizeBuckets
-            self._sqldb.update_lun_request_size_table( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, True, request_values)
-            request_values =  self._vd_stats[lun_num].WriteIOSizeBuckets
-            self._sqldb.update_lun_request_size_table( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, False, request_values)
-            request_values =  self._vd_stats[lun_num].ReadIOLatencyBuckets
-            self._sqldb.update_lun_request_latency_table( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, True, request_values)
-            request_values =  self._vd_stats[lun_num].WriteIOLatencyBuckets
-            self._sqldb.update_lun_request_latency_table( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, False, request_values)
-
-#        for dd_num in self._dd_stats.keys():
-#            request_values = self._dd_stats[dd_num].ReadIOSizeBuckets
-#            self._sqldb.update_dd_request_size_table( self._get_host_name(),
-#                    self._non_shared_update_time, dd_num, True, request_values)
-#            request_values = self._dd_stats[dd_num].WriteIOSizeBuckets
-#            self._sqldb.update_dd_request_size_table( self._get_host_name(),
-#                    self._non_shared_update_time, dd_num, False, request_values)
-#            request_values = self._dd_stats[dd_num].ReadIOLatencyBuckets
-#            self._sqldb.update_dd_request_latency_table( self._get_host_name(),
-#                    self._non_shared_update_time, dd_num, True, request_values)
-#            request_values = self._dd_stats[dd_num].WriteIOLatencyBuckets
-#            self._sqldb.update_dd_request_latency_table( self._get_host_name(),
-#                    self._non_shared_update_time, dd_num, False, request_values)
-
-        
-    def _slow_sqldb_tasks(self):
-        '''
-        Update all the values in the SQL database that need to be updated at the slow rate.
-        '''
-        pass  # no slow tasks yet
-    
-    def _fast_tsdb_tasks(self):
+
+    def _write_records(self, sinks, records):
         '''
-        Update all the values in the time-series database that need to be
-        updated at the fast rate.
+        Hands each record to the sinks that want its tier.  A record is
+        only built if at least one of the sinks wants it, so records is a
+        list of (tier, function that builds the record) tuples.
         '''
+        for (tier, build_record) in records:
+            wanted = [ sink for sink in sinks if tier in sink.tiers ]
+            if not wanted:
+                continue
+            record = build_record()
+            for sink in wanted:
+                sink.write( record)
+
+
+    def _write_events(self):
+        '''
+        Sends whatever the anomaly detection found since the last iteration
+        to the sinks that want the events tier.  (The events are taken even
+        if no sink wants them, since they've already been logged.)
+        '''
+        events = self._analysis.take_events()
+        if events:
+            self._write_records( self._sinks,
+                    [ (EVENTS, lambda: EventRecord( EVENTS, self._get_host_name(),
+                                                    self._non_shared_update_time,
+                                                    tuple( events))) ])
+
+
+    def _tier_records(self, medium, slow, vd_stats, update_time):
+        '''
+        Returns the (tier, build function) list for _write_records() for the
+        medium (histograms) and slow tiers
+        '''
+        records = [ ]
+        if medium:
+            records.append( (MEDIUM, lambda: self._medium_record( vd_stats, update_time)))
+        if slow:
+            records.append( (SLOW, lambda: SlowRecord( SLOW, self._get_host_name(),
+                                                       update_time)))
+        return records
+
+
+    def _get_request_summaries(self, vd_stats):
+        '''
+        Returns a dictionary of LUN number -> request summary tuple (see
+        SFAHistogram.SFARequestSummary.update()) for the request size &
+        latency histograms in vd_stats.  Returns an empty dictionary if
+        request summaries aren't turned on.
         
-        for lun_num in self._vd_to_lun.values():
-            # grab the raw values out of the saved stats object
-            tmp_stats = self._vd_stats[lun_num]
-            
-            read_bytes = (tmp_stats.KBytesRead[0] + tmp_stats.KBytesRead[1]) * 1024
-            write_bytes = (tmp_stats.KBytesWritten[0] + tmp_stats.KBytesWritten[1]) * 1024
-            transfer_bytes = (tmp_stats.KBytesTransferred[0] + tmp_stats.KBytesTransferred[1]) * 1024
-            forwarded_bytes = (tmp_stats.KBytesForwarded[0] + tmp_stats.KBytesForwarded[1]) * 1024
-            # Note: converted to bytes
-            
-            total_ios = (tmp_stats.TotalIOs[0] + tmp_stats.TotalIOs[1])
-            forwarded_ios = (tmp_stats.ForwardedIOs[0] + tmp_stats.ForwardedIOs[1])
-            read_ios = (tmp_stats.ReadIOs[0] + tmp_stats.ReadIOs[1])
-            write_ios = (tmp_stats.WriteIOs[0] + tmp_stats.WriteIOs[1])
-            
-            # Get the pool state we copied out of the associated SFAStoragePool object
-            # Note: this object is only updated at the medium rate
-            try:
-                pool_state = self._storage_pool_states[lun_num]
-            except KeyError:
-                self.logger.error( "No storage pool states mapped to LUN number %d!!"%lun_num)
-                self.logger.error( "Setting pool state to UNKNOWN!")
-                pool_state = 255
-                
-            # TODO everything above this comment is pretty much directly copied from 
-            # _fast_sqldb_tasks().  We should probably move the code to a single location
-            # (_fast_poll_tasks, maybe?)
+        Note: the summaries are based on the change since the last call, so
+        this must only be called once per medium tier iteration.
+        '''
+        if not self._request_summary_enabled:
+            return { }
+        
+        if self._request_summary is None:
+            # The bucket labels depend on the firmware version, which is why
+            # we don't create this up in __init__()
+            self._request_summary = load_backend( 'request_summary').SFARequestSummary(
+                    EXPECTED_LUN_LATENCY_LABELS[self._fw_major],
+                    EXPECTED_SIZE_LABELS)
+        # (LunHistograms have the same bucket attributes as the
+        # SFAVirtualDiskStatistics objects SFARequestSummary expects.)
+        return self._request_summary.update(
+                dict( [ (lun_num, lun_stats.histograms)
+                        for (lun_num, lun_stats) in vd_stats.items() ]))
             
-            self._tsdb.update_lun_series( self._get_host_name(), self._non_shared_update_time,
-                          lun_num, transfer_bytes,read_bytes, write_bytes,
-                          forwarded_bytes, total_ios, read_ios, write_ios,
-                          forwarded_ios, pool_state)
             
-        # Now flush all the queued data at one shot
-        self._tsdb.flush_to_db()
+    def _drive_record(self):
+        '''
+        Builds the DriveRecord (see SFASinks) from the queued disk drive
+        samples.  The caller empties the queue afterwards.
+        '''
+        drives = [ ]
+        for sample in self._dd_samples:
+            # If we've seen this drive before, we can compute its rates
+            # since the last visit
+            rates = None
+            last = self._dd_last_sample.get( sample.index)
+            if last is not None:
+                rates = sample.rates_since( last)
+            self._dd_last_sample[sample.index] = sample
+            drives.append( DriveStatsRecord( sample.index, sample.update_time,
+                                             sample.histograms, rates))
+        return DriveRecord( DRIVES, self._get_host_name(),
+                            self._non_shared_update_time, tuple( drives))
+
+
+    def _make_sinks(self, background = False):
+        '''
+        Creates the outputs (see SFASinks) for the main thread, or (if
+        background is True) for the background tier thread.  The background
+        thread only gets the sinks that want the medium or slow tiers, and
+        has its own database connections.
+        '''
+        def wanted( sink_class):
+            return not background or MEDIUM in sink_class.tiers or \
+                   SLOW in sink_class.tiers
         
-    
-    def _medium_tsdb_tasks(self):
-        '''
-        Update all the values in the time-series database that need to be
-        updated at the medium rate.
-        '''
-        
-        for lun_num in self._vd_to_lun.values():
-            request_values =  self._vd_stats[lun_num].ReadIOSizeBuckets
-            self._tsdb.update_lun_request_size_series( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, True, request_values)
-            request_values =  self._vd_stats[lun_num].WriteIOSizeBuckets
-            self._tsdb.update_lun_request_size_series( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, False, request_values)
-            request_values =  self._vd_stats[lun_num].ReadIOLatencyBuckets
-            self._tsdb.update_lun_request_latency_series( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, True, request_values)
-            request_values =  self._vd_stats[lun_num].WriteIOLatencyBuckets
-            self._tsdb.update_lun_request_latency_series( self._get_host_name(),
-                    self._non_shared_update_time, lun_num, False, request_values)
-            
-        # Now flush all the queued data at one shot
-        self._tsdb.flush_to_db()
+        sinks = [ ]
+        if self._analysis is not None:
+            # (The same object in both threads:  the fast records come from
+            # this thread and the medium ones from whichever thread runs the
+            # medium tier.  Each thread gets its own detectors, so this
+            # doesn't depend on which tier runs where.)
+            sinks.append( self._analysis)
+        if self._have_sqldb:
+            if background:
+                sinks.append( SqlDbSink( self._open_sqldb(), self._should_write))
+            else:
+                sinks.append( SqlDbSink( self._sqldb, self._should_write))
+        if self._have_tsdb:
+            if background:
+                sinks.append( TsDbSink( self._open_tsdb(), self._should_write))
+            else:
+                sinks.append( TsDbSink( self._tsdb, self._should_write))
+        
+        if not background:
+            # The Prometheus output and the status snapshots go to the main
+            # process over the snapshot queue.  (There's no queue when the
+            # main process is just using us to initialize the databases.)
+            if self._have_promdb and self._snapshot_queue is not None:
+                sinks.append( PrometheusSink( SFAPrometheus(
+                        self._get_host_name(), self._snapshot_queue,
+                        EXPECTED_LUN_LATENCY_LABELS[self._fw_major],
+                        EXPECTED_SIZE_LABELS)))
+            if self._have_status_api and self._snapshot_queue is not None:
+                sinks.append( StatusSink( self._snapshot_queue, self._rate_windows))
+                if self._rollup_history:
+                    sinks.append( HistorySink( self._snapshot_queue))
+            if self._archive_dir is not None:
+                sinks.append( ArchiveSink( SFAArchiveWriter(
+                        self._archive_dir, self._get_host_name(),
+                        ARCHIVE_COLUMNS, self._archive_block_ticks)))
+        
+        for (sink_class, options) in self._plugin_sinks:
+            if wanted( sink_class):
+                sinks.append( sink_class( self._get_host_name(), dict( options)))
+        return sinks
 
 
-    def _slow_tsdb_tasks(self):
+    def _open_sqldb(self):
         '''
-        Update all the values in the time-series database that need to be
-        updated at the slow rate.
+        Opens a new connection to the SQL database.  (Each thread that writes
+        to the database needs its own connection.)
         '''
-        pass  # no slow tasks yet
+        self.logger.debug( 'Opening SQL DB connection')
+        SFAMySqlDb = load_backend( 'sqldb')
+        return SFAMySqlDb.SFAMySqlDb(self._sqldb_user, self._sqldb_password,
+                                     self._sqldb_host, self._sqldb_name, False,
+                                     rate_windows = self._rate_windows,
+                                     compact_keys = self._sqldb_compact_keys,
+                                     **self._sqldb_history_options)
+
+
+    def _open_tsdb(self):
+        '''
+        Opens a new connection to the time series database.
+        '''
+        self.logger.debug( 'Opening time series DB connection')
+        SFAInfluxDb = load_backend( 'tsdb')
+        return SFAInfluxDb.SFAInfluxDb(self._tsdb_user, self._tsdb_password,
+                                       self._tsdb_host, self._tsdb_name,
+                                       (self._fw_major >= 3), False,
+                                       self._rate_windows)
+        # Firmware version 3 is where we switch to the new latency table labels
 
 
     def _parse_config_file(self, conf_file):
@@ -586,14 +989,41 @@ class SFAClient():
         config = ConfigParser.ConfigParser()
         config.read(conf_file)
     
-        # Get the polling intervals from the config file
-        self._fast_poll_interval = config.getfloat('polling', 'fast_poll_interval')
-        self._med_poll_multiple = config.getint('polling', 'med_poll_multiple')
-        self._slow_poll_multiple = config.getint('polling', 'slow_poll_multiple')
-        # fast_poll_interval is in seconds.  medium and slow are multiples of the
-        # fast interval.  For example, values of 2.0, 15 & 60 will result in
-        # polling every 2 seconds, 30 seconds and 2 minutes for fast, medium
-        # and slow, respectively
+        self._parse_polling_config( config)
+
+        # Whether to run the medium and slow tiers in a background thread.
+        # Not part of _parse_polling_config() because it can't be changed
+        # without a restart.
+        self._background_tiers = False
+        if config.has_option('polling', 'background_tiers'):
+            self._background_tiers = config.getboolean('polling', 'background_tiers')
+
+        # Extra windows (in seconds) for the LunInfo rates.  Since they
+        # change the database schema, they also require a restart.
+        self._rate_windows = parse_rate_windows( config)
+
+        # Whether to estimate latency percentiles and mean request sizes from
+        # the request size & latency histograms.  (Needs NumPy.)
+        self._request_summary_enabled = False
+        if config.has_option('polling', 'request_summary'):
+            self._request_summary_enabled = config.getboolean('polling', 'request_summary')
+
+        # Optional anomaly detection on the LUN rates (and latencies, if
+        # request_summary is on).  Also needs NumPy.  (Restart only.)
+        self._analysis = None
+        if config.has_section('anomaly_detection'):
+            SFAAnomaly = load_backend( 'anomaly_detection')
+            alpha = SFAAnomaly.DEFAULT_ALPHA
+            threshold = SFAAnomaly.DEFAULT_THRESHOLD
+            warmup = SFAAnomaly.DEFAULT_WARMUP
+            if config.has_option('anomaly_detection', 'alpha'):
+                alpha = config.getfloat('anomaly_detection', 'alpha')
+            if config.has_option('anomaly_detection', 'threshold'):
+                threshold = config.getfloat('anomaly_detection', 'threshold')
+            if config.has_option('anomaly_detection', 'warmup'):
+                warmup = config.getint('anomaly_detection', 'warmup')
+            self._analysis = SFAAnomaly.SFALunAnalysis( self.logger, alpha,
+                                                        threshold, warmup)
 
         # Parameters for connecting to the SFA hardware
         self._sfa_user = config.get('ddn_hardware', 'sfa_user')
@@ -623,6 +1053,11 @@ class SFAClient():
             self._sqldb_name = config.get('database', 'db_name')
             self._have_sqldb = True
             output_defined = True
+        
+        if self._have_sqldb:
+            SFAMySqlDb = load_backend( 'sqldb')
+            self._sqldb_compact_keys = SFAMySqlDb.compact_keys_enabled( config)
+            self._sqldb_history_options = SFAMySqlDb.history_options( config)
            
         if config.has_section('TSDb'):
             self._tsdb_user = config.get('TSDb', 'user')
@@ -632,6 +1067,68 @@ class SFAClient():
             self._have_tsdb = True
             output_defined = True
              
+        # The JSON status API and the Prometheus endpoint are both served by
+        # the main process.  (See DDNToolSupport.status_server)
+        self._have_status_api = config.has_section('http_api')
+        
+        # Long term (30 day) history of the controller-wide rates.  We just
+        # send the rates:  the history is kept (and served) by the main
+        # process, so it needs the JSON API.  (Restart only.)
+        self._rollup_history = False
+        if config.has_option('polling', 'rollup_history') and \
+           config.getboolean('polling', 'rollup_history'):
+            if self._have_status_api:
+                self._rollup_history = True
+            else:
+                self.logger.warn( "The rate history is served by the JSON "
+                                  "API.  Ignoring rollup_history since the "
+                                  "http_api section is missing.")
+        self._have_promdb = config.has_section('prometheus')
+        if self._have_promdb:
+            output_defined = True
+            
+        # Local archive files (see SFAArchive)
+        self._archive_dir = None
+        self._archive_block_ticks = DEFAULT_BLOCK_TICKS
+        if config.has_section('archive'):
+            self._archive_dir = config.get('archive', 'directory')
+            if config.has_option('archive', 'block_ticks'):
+                self._archive_block_ticks = config.getint('archive', 'block_ticks')
+            output_defined = True
+        
+        # Plugin outputs.  (See SFASinks.)  The classes are imported now so
+        # that a typo shows up right away.
+        self._plugin_sinks = [ ]
+        for section in config.sections():
+            if section.startswith( SINK_SECTION_PREFIX):
+                sink_class = load_sink_class( config.get( section, 'class'))
+                options = [ (name, value) for (name, value) in config.items( section)
+                            if name != 'class' ]
+                self._plugin_sinks.append( (sink_class, options))
+                output_defined = True
+        
+        # Disk drive statistics (optional).  They go to the sinks that want
+        # the drives tier:  the SQL database and any plugins that ask for
+        # them.  (Not the time series database.)
+        if config.has_section('drive_stats'):
+            if not self._have_sqldb and \
+               not [ sink_class for (sink_class, options) in self._plugin_sinks
+                     if DRIVES in sink_class.tiers ]:
+                self.logger.warn( "None of the outputs want the disk drive "
+                                  "statistics.  Ignoring the drive_stats "
+                                  "section of the config file.")
+            else:
+                self._dd_time_budget = DEFAULT_DD_TIME_BUDGET
+                if config.has_option('drive_stats', 'time_budget'):
+                    self._dd_time_budget = config.getfloat('drive_stats', 'time_budget')
+                coverage_period = DEFAULT_DD_COVERAGE_PERIOD
+                if config.has_option('drive_stats', 'coverage_period'):
+                    coverage_period = config.getfloat('drive_stats', 'coverage_period')
+                self._dd_batch_size = DEFAULT_DD_BATCH_SIZE
+                if config.has_option('drive_stats', 'batch_size'):
+                    self._dd_batch_size = config.getint('drive_stats', 'batch_size')
+                self._drive_sampler = SFADriveSampler( coverage_period, self.logger)
+             
         if output_defined == False:
             # The config file didn't define a database to write to.  There's
             # no point in starting up...
@@ -639,40 +1136,114 @@ class SFAClient():
                                 "There's no place to write the results.")
 
         
+    def _parse_polling_config(self, config):
+        '''
+        Reads the polling section of the config file.  (Split out from
+        _parse_config_file() because it's also called when the main process
+        asks us to reload our settings.)
+        '''
+        
+        # Get the polling intervals from the config file
+        # (Read everything before assigning anything so that a bad value
+        # doesn't leave us with half of the new settings.)
+        fast_poll_interval = config.getfloat('polling', 'fast_poll_interval')
+        med_poll_multiple = config.getint('polling', 'med_poll_multiple')
+        slow_poll_multiple = config.getint('polling', 'slow_poll_multiple')
+        
+        # Optional load shedding settings.  (If overload_threshold isn't
+        # set, we never shed anything.)
+        overload_threshold = None
+        overload_ticks = 3
+        recovery_ticks = 30
+        if config.has_option('polling', 'overload_threshold'):
+            overload_threshold = config.getfloat('polling', 'overload_threshold')
+        if config.has_option('polling', 'overload_ticks'):
+            overload_ticks = config.getint('polling', 'overload_ticks')
+        if config.has_option('polling', 'recovery_ticks'):
+            recovery_ticks = config.getint('polling', 'recovery_ticks')
+        
+        # Max age (in seconds) of the topology before we rebuild it even
+        # though nothing seems to have changed
+        topology_refresh_interval = DEFAULT_TOPOLOGY_REFRESH_INTERVAL
+        if config.has_option('polling', 'topology_refresh_interval'):
+            topology_refresh_interval = \
+                    config.getfloat('polling', 'topology_refresh_interval')
+        
+        # If heartbeat_interval is set, rows that haven't changed are only
+        # written to the database(s) once every heartbeat_interval seconds
+        heartbeat = None
+        if config.has_option('polling', 'heartbeat_interval'):
+            heartbeat = config.getfloat('polling', 'heartbeat_interval')
+        
+        self._fast_poll_interval = fast_poll_interval
+        self._med_poll_multiple = med_poll_multiple
+        self._slow_poll_multiple = slow_poll_multiple
+        self._topology_refresh_interval = topology_refresh_interval
+        
+        if heartbeat is not None:
+            if self._change_filter is None:
+                self._change_filter = SFAChangeFilter( heartbeat)
+            else:
+                self._change_filter.heartbeat = heartbeat
+        else:
+            self._change_filter = None
+        
+        self._overload_threshold = overload_threshold
+        if overload_threshold is None:
+            self._overload_policy = None
+        elif self._overload_policy is None:
+            self._overload_policy = SFAOverloadPolicy( self.logger,
+                                                       overload_ticks,
+                                                       recovery_ticks)
+        else:
+            # Reloading the config.  Keep the current overload level.
+            self._overload_policy.escalate_ticks = overload_ticks
+            self._overload_policy.recover_ticks = recovery_ticks
+        # fast_poll_interval is in seconds.  medium and slow are multiples of the
+        # fast interval.  For example, values of 2.0, 15 & 60 will result in
+        # polling every 2 seconds, 30 seconds and 2 minutes for fast, medium
+        # and slow, respectively
+
+
+    def _reload_config_file(self):
+        '''
+        Re-reads the polling settings after the main process received a
+        SIGHUP.  The database and controller settings are *not* re-read:
+        changing those requires a restart.  If the file can't be parsed, we
+        log an error and keep the current settings.
+        '''
+        self.logger.info( 'Reloading polling settings from %s', self._conf_file)
+        config = ConfigParser.ConfigParser()
+        try:
+            if not config.read( self._conf_file):
+                self.logger.error( 'Could not read config file %s', self._conf_file)
+                return
+            self._parse_polling_config( config)
+        except (ConfigParser.Error, ValueError), err:
+            self.logger.error( 'Error reloading polling settings: %s', err)
+        
+
     def _time_series_init(self):
         '''
         Various initialization stats for all the time series data.  Must be called after the
         connection to the controller is established.
         '''
         
-        # update the lun-to-vd mapping
+        # Build the initial topology (ie: the lun-to-vd mapping)
         # This normally happens at the medium interval, but I need to do it here
         # so that I can store time series data by LUN instead of by virtual disk
-        self._update_lun_map()
-
-        # initialize the time series arrays
-        vd_stats = SFAVirtualDiskStatistics.getAll()  
-        self._time_series['lun_read_iops'] = { }
-        self._time_series['lun_write_iops'] = { }
-        self._time_series['lun_transfer_bytes'] = { }
-        self._time_series['lun_read_bytes'] = { }
-        self._time_series['lun_write_bytes'] = { }
-        self._time_series['lun_forwarded_bytes'] = { }
-        self._time_series['lun_forwarded_iops'] = { }
-        for stats in vd_stats:
-            index = stats.Index
-            self._vd_stats[index] = stats
+        self._medium_poll_tasks()
 
-            # Note that these maps are indexed by Lun, not by virtual disk (despite
-            # coming from SFAVirtualDiskStatistics objects)
-            # 300 entries is 10 minutes of data at 2 second sample rate
-            self._time_series['lun_read_iops'][self._vd_to_lun[index]] = SFATimeSeries( 300) 
-            self._time_series['lun_write_iops'][self._vd_to_lun[index]] = SFATimeSeries( 300)
-            self._time_series['lun_transfer_bytes'][self._vd_to_lun[index]] = SFATimeSeries( 300)
-            self._time_series['lun_read_bytes'][self._vd_to_lun[index]] = SFATimeSeries( 300)
-            self._time_series['lun_write_bytes'][self._vd_to_lun[index]] = SFATimeSeries( 300)
-            self._time_series['lun_forwarded_bytes'][self._vd_to_lun[index]] = SFATimeSeries( 300)
-            self._time_series['lun_forwarded_iops'][self._vd_to_lun[index]] = SFATimeSeries( 300)
+        # initialize the time series dictionaries
+        # Note that these maps are indexed by Lun, not by virtual disk (despite
+        # coming from SFAVirtualDiskStatistics objects).  The series for
+        # each LUN are created by _add_lun_time_series() the first time
+        # _fast_poll_tasks() sees it.
+        for name in LUN_SERIES_NAMES:
+            self._time_series[name] = { }
+            self._window_rates[name] = { }
+            
+        self._apply_drive_list( self._collect_drive_list())
 
 # Don't need per-disk bandwidth & iops
 #       disk_stats = SFADiskDriveStatistics.getAll()
@@ -688,35 +1259,23 @@ class SFAClient():
 
         
 
+    def _add_lun_time_series(self, lun_num):
+        '''
+        Creates all the time series for a (newly seen) LUN
+        '''
+        for name in LUN_SERIES_NAMES:
+            # 300 entries is 10 minutes of data at 2 second sample rate
+            self._time_series[name][lun_num] = SFATimeSeries( 300)
+            if self._rate_windows:
+                self._window_rates[name][lun_num] = SFARateWindows( self._rate_windows)
+        
+        
     def _check_labels(self):
         '''
         Verify the IO request size and latency labels are what we expect (and have
         hard coded into the database column headings)
         '''
 
-        expected_size_labels = ['<=4KiB', '<=8KiB', '<=16KiB', '<=32KiB',
-            '<=64KiB', '<=128KiB', '<=256KiB', '<=512KiB', '<=1MiB',
-            '<=2MiB', '<=4MiB', '>4MiB']
-
-        
-        # We're assuming the labels changed with the 3.0.0.0 firmware.  We
-        # *know* that the 3.0.1.5 firmware has the new labels, though.
-        # TODO! We should find out exactly which firmware version switched to
-        # the new labels!
-        expected_lun_latency_labels = { } # use the firmware major version for the key
-        expected_lun_latency_labels[2] = \
-            ['<=16ms', '<=32ms', '<=64ms', '<=128ms', '<=256ms', '<=512ms',
-             '<=1s', '<=2s', '<=4s', '<=8s', '<=16s','>16s']
-        
-        expected_lun_latency_labels[3] = \
-            ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
-             '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
-
-        expected_lun_latency_labels[11] = \
-            ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
-             '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
-
-        
 #        expected_dd_latency_labels = ['Latency Counts <=4ms', 'Latency Counts <=8ms',
 #                'Latency Counts <=16ms', 'Latency Counts <=32ms', 'Latency Counts <=64ms',
 #                'Latency Counts <=128ms', 'Latency Counts <=256ms', 'Latency Counts <=512ms',
@@ -730,12 +1289,12 @@ class SFAClient():
             # other sizes.)  Since the numbers themselves didn't change, we're 
             # just going to strip off the "IO Size" part - if it exists - before
             # doing the comparison.  (Latency index labels are similar.)
-            if [x.split()[-1] for x in stats.IOSizeIndexLabels]  != expected_size_labels:
+            if [x.split()[-1] for x in stats.IOSizeIndexLabels]  != EXPECTED_SIZE_LABELS:
                 raise UnexpectedClientDataException(
                         "Unexpected IO size index labels for %s virtual disk %d" % \
                                 (self._get_host_name(), stats.Index))
                             
-            if [x.split()[-1] for x in stats.IOLatencyIndexLabels] != expected_lun_latency_labels[self._fw_major]:
+            if [x.split()[-1] for x in stats.IOLatencyIndexLabels] != EXPECTED_LUN_LATENCY_LABELS[self._fw_major]:
                 raise UnexpectedClientDataException(
                         "Unexpected IO latency index labels for %s virtual disk %d" % \
                                 (self._get_host_name(), stats.Index))
@@ -753,13 +1312,88 @@ class SFAClient():
 #                                (self._get_host_name(), stats.Index))
 
     
+    def _check_dd_labels(self, stats):
+        '''
+        Verify the IO request size and latency labels for a disk drive are
+        what we expect.  Unlike _check_labels(), this just logs an error and
+        returns False if they're not.  (Drive stats are optional, so it's not
+        worth shutting everything else down over them.)
+        '''
+        if [x.split()[-1] for x in stats.IOSizeIndexLabels] != EXPECTED_SIZE_LABELS or \
+           [x.split()[-1] for x in stats.IOLatencyIndexLabels] != EXPECTED_DD_LATENCY_LABELS:
+            self.logger.error( "Unexpected IO size or latency index labels for %s "
+                               "disk drive %d.  Disabling disk drive statistics."%
+                               (self._get_host_name(), stats.Index))
+            return False
+        return True
+
+    
     def _get_host_name(self):
         '''
         Mostly a convenience function so we can map an object back to a
         human-readable name.
         ''' 
-        return self._address
+        return self._host_name
+
 
+    def _get_pool_state( self, lun_num):
+        '''
+        Returns the pool state for the LUN (or 255 - unknown - if we don't
+        have one)
+        '''
+        try:
+            return self._storage_pool_states[lun_num]
+        except KeyError:
+            self.logger.error( "No storage pool states mapped to LUN number %d!!"%lun_num)
+            self.logger.error( "Setting pool state to UNKNOWN!")
+            return 255
+        
+    
+    def _get_raw_lun_values( self, lun_num):
+        '''
+        Returns a tuple of the raw counters for a LUN (from the saved stats)
+        in the order the raw lun table and lun series want them:
+        transfer bytes, read bytes, write bytes, forwarded bytes, total ios,
+        read ios, write ios and forwarded ios.
+        '''
+        return self._vd_stats[lun_num].raw
+    
+    
+    def _get_window_rates( self, lun_num):
+        '''
+        Returns a tuple with one entry for each of the configured rate
+        windows.  Each entry is a tuple of the rates for the series in
+        LUN_RATE_SERIES_NAMES.  (Returns an empty tuple if rate_windows
+        isn't set.)
+        
+        Throws EmptyTimeSeriesException if there's not enough data yet.
+        '''
+        results = [ ]
+        for window in self._rate_windows:
+            results.append( tuple( [ self._window_rates[name][lun_num].rate( window)[0]
+                                     for name in LUN_RATE_SERIES_NAMES ]))
+        return tuple( results)
+    
+    
+    def _should_write( self, table, lun_num, values, update_time):
+        '''
+        Returns False if the change filter says this row hasn't changed since
+        the last time we wrote it.  (Always True if the filter is disabled.)
+        table is just a name that identifies the table/measurement.
+        '''
+        if self._change_filter is None:
+            return True
+        return self._change_filter.should_write( table, lun_num, values, update_time)
+    
+    
+    def _log_suppressed_writes( self):
+        '''
+        Logs (at debug level) how many unchanged rows were skipped
+        '''
+        if self._change_filter is not None:
+            self.logger.debug( "Skipped %d unchanged rows"%
+                               self._change_filter.take_suppressed_count())
+    
 
     def _get_time_series_average( self, series_name, device_num, span):
         '''
@@ -775,13 +1409,6 @@ class SFAClient():
         return self._time_series[series_name][device_num].average(span)
 
                 
-    def _update_lun_map( self):
-        presentations = SFAPresentation.getAll() 
-        for p in presentations:
-            self._vd_to_lun[p.VirtualDiskIndex] = p.LUN
-        self.logger.debug( "Mapped %d virtual disks to LUNs"%len(self._vd_to_lun))
-            
-    
     def _verify_fw_version(self):
         '''
         Checks the controller firmware version and throws an exception if it's too low.
@@ -816,7 +1443,216 @@ class SFAClient():
             raise UnsupportedFirmwareException(
                  "Controller version '%s' is too old.  Minimum version is '%s'"%
                  (fw_version, MINIMUM_FW_VER))
+
+
+
+class MediumPollResults(object):
+    '''
+    The values retrieved by SFAClient._collect_medium_poll_results() and
+    (from the slow tier) SFAClient._collect_drive_list().  (Just a container
+    so they can be handed from the background tier thread to the main thread
+    as a single object.)  topology and storage_pool_states are None if the
+    medium tier didn't run and drive_indexes is None if the slow tier didn't
+    (or the drive sampler is off).
+    '''
+    def __init__(self, topology = None, storage_pool_states = None,
+                 drive_indexes = None):
+        self.topology = topology    # an SFATopology object
+        self.storage_pool_states = storage_pool_states
+        self.drive_indexes = drive_indexes
+
+
+class TierJob(object):
+    '''
+    One batch of work for the TierThread:  which tiers to run, plus the
+    fast tier data they need.
+    '''
+    def __init__(self, medium, slow, histograms, vd_stats, vd_indexes,
+                 update_time):
+        self.medium = medium
+        self.slow = slow
+        self.histograms = histograms
+        self.vd_stats = vd_stats
+        self.vd_indexes = vd_indexes
+        self.update_time = update_time
+
+
+class TierThread(threading.Thread):
+    '''
+    Runs the medium and slow tiers of an SFAClient in a background thread
+    so that they don't delay the fast tier.
+    
+    The DDN API only allows one connection per thread, so this thread opens
+    its own connection to the controller.  It also opens its own database
+    connections.  Results are handed back to the main thread through
+    take_results(), which the main thread calls at the top of each fast
+    iteration.
+    '''
+    
+    def __init__(self, client):
+        threading.Thread.__init__(self, name='DDNTool_tiers_' + client._get_host_name())
+        self.daemon = True  # don't keep the process alive if the main thread exits
+        
+        self._client = client
+        self.logger = client.logger
+        
+        self._wake = threading.Event()
+        self._lock = threading.Lock()   # protects everything below
+        self._job = None
+        self._results = None
+        self._busy = False
+        self._exit_requested = False
+        
+    def submit(self, job):
+        '''
+        Hand a TierJob to the thread.  Returns False (and drops the job) if
+        the thread is still working on the previous one.
+        '''
+        with self._lock:
+            if self._busy:
+                return False
+            self._job = job
+            self._busy = True
+        self._wake.set()
+        return True
+    
+    def take_results(self):
+        '''
+        Returns the MediumPollResults from the most recently finished job (or
+        None if there aren't any new results).  Each result is only returned
+        once.
+        '''
+        with self._lock:
+            results = self._results
+            self._results = None
+        return results
+    
+    def stop(self):
+        '''
+        Ask the thread to exit and wait for it to finish its current job.
+        '''
+        with self._lock:
+            self._exit_requested = True
+        self._wake.set()
+        self.join()
+    
+    def run(self):
+        client = self._client
+        try:
+            APIConnect( client._uri, (client._sfa_user, client._sfa_password))
+            sinks = client._make_sinks( background = True)
+        except Exception, e:
+            self.logger.exception( 'Background tier thread caught %s exception '
+                                   'during startup.  Exiting.'%type(e).__name__)
+            return
+        
+        self.logger.debug( 'Background tier thread started')
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                if self._exit_requested:
+                    break
+                job = self._job
+                self._job = None
+            
+            results = None
+            try:
+                for sink in sinks:
+                    sink.begin_tick()
+                if job.medium:
+                    results = client._collect_medium_poll_results( job.vd_indexes)
+                if job.slow:
+                    drive_indexes = client._collect_drive_list()
+                    if drive_indexes is not None:
+                        if results is None:
+                            results = MediumPollResults()
+                        results.drive_indexes = drive_indexes
+                client._write_records( sinks,
+                                       client._tier_records( job.histograms, job.slow,
+                                                             job.vd_stats,
+                                                             job.update_time))
+                for sink in sinks:
+                    sink.end_tick()
+            except Exception, e:
+                # Log it and keep going.  The next job might work.
+                self.logger.exception( 'Background tier thread caught %s '
+                                       'exception.'%type(e).__name__)
+            
+            with self._lock:
+                if results is not None:
+                    self._results = results
+                self._busy = False
         
+        for sink in sinks:
+            sink.close()
+        APIDisconnect()
+        self.logger.debug( 'Background tier thread exiting')
+
 
+
+class LunStats(object):
+    '''
+    The parts of one SFAVirtualDiskStatistics object that we actually use:
+    the raw counters (as a tuple in the order _get_raw_lun_values() returns
+    them) and the request size & latency buckets (an SFASinks.LunHistograms).
+    Everything is converted to plain ints so we don't keep any of the
+    pywbem objects alive.  On a big array there are thousands of these, so
+    they use __slots__.
+    '''
+    __slots__ = ('raw', 'histograms')
+    
+    def __init__(self, stats):
+        # Note: we actually get back 2 element lists - one element for each
+        # controller in the couplet.  In theory, one of those elements
+        # should always be 0.
+        self.raw = (
+            int( (stats.KBytesTransferred[0] + stats.KBytesTransferred[1]) * 1024),
+            int( (stats.KBytesRead[0] + stats.KBytesRead[1]) * 1024),
+            int( (stats.KBytesWritten[0] + stats.KBytesWritten[1]) * 1024),
+            int( (stats.KBytesForwarded[0] + stats.KBytesForwarded[1]) * 1024),
+            # Note: converted to bytes
+            int( stats.TotalIOs[0] + stats.TotalIOs[1]),
+            int( stats.ReadIOs[0] + stats.ReadIOs[1]),
+            int( stats.WriteIOs[0] + stats.WriteIOs[1]),
+            int( stats.ForwardedIOs[0] + stats.ForwardedIOs[1]))
+        self.histograms = lun_histograms( stats)
+
+
+class DriveSample(object):
+    '''
+    The parts of one SFADiskDriveStatistics object that we actually use.
+    (We don't want to hang on to the whole object while it waits to be
+    sent to the sinks.)
+    '''
+    def __init__(self, stats, update_time):
+        self.index = stats.Index
+        self.update_time = update_time
+        self.sample_time = time.time()
+        
+        self.histograms = lun_histograms( stats)
         
+        # Note: like the virtual disks, these are 2 element lists - one
+        # element for each controller in the couplet.
+        self.read_ios = stats.ReadIOs[0] + stats.ReadIOs[1]
+        self.write_ios = stats.WriteIOs[0] + stats.WriteIOs[1]
+        self.transfer_bytes = \
+                (stats.KBytesTransferred[0] + stats.KBytesTransferred[1]) * 1024
+        # Note: converted to bytes
         
+    def rates_since(self, earlier):
+        '''
+        Returns a (transfer bandwidth, read iops, write iops) tuple computed
+        from this sample and an earlier one for the same drive.  Returns None
+        if the counters went backwards (ie: the controller was rebooted) or
+        no time has passed.
+        '''
+        elapsed = self.sample_time - earlier.sample_time
+        if elapsed <= 0:
+            return None
+        deltas = ( self.transfer_bytes - earlier.transfer_bytes,
+                   self.read_ios - earlier.read_ios,
+                   self.write_ios - earlier.write_ios)
+        if min(deltas) < 0:
+            return None
+        return tuple( [ float(d) / elapsed for d in deltas])
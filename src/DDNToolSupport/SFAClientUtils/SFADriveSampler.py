@@ -0,0 +1,111 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import math
+import time
+
+
+class SFADriveSampler(object):
+    '''
+    Decides which disk drives to fetch statistics for on each iteration.
+
+    Fetching SFADiskDriveStatistics for every drive is far too slow to do
+    on every iteration, so instead we walk through the drives round-robin
+    and fetch a few of them each time.  The number per iteration is chosen
+    so that every drive gets visited once per coverage period.  The caller
+    is also expected to stop early if it runs out of time.  (See
+    SFAClient._drive_stats_tasks().)
+
+    Usage:
+        for index in sampler.this_tick( fast_poll_interval):
+            <fetch the stats for drive 'index'>
+            if <out of time>:
+                break
+
+    Every index that this_tick() yields counts as visited, so the next
+    iteration picks up where this one left off.
+    '''
+
+    def __init__(self, coverage_period, logger):
+        '''
+        coverage_period is how often (in seconds) we want to visit every
+        drive.
+        '''
+        self.coverage_period = coverage_period
+        self.logger = logger
+
+        self._drives = ( )          # tuple of drive indexes
+        self._cursor = 0            # position of the next drive to visit
+        self._sweep_start = None    # time we started the current pass
+                                    # through the drive list
+
+    def set_drives(self, drive_indexes):
+        '''
+        Replaces the list of drives.  (Called when the drive list is
+        re-read.  Safe to call from another thread: the tuple is replaced
+        in one shot.)
+        '''
+        self._drives = tuple( sorted( drive_indexes))
+
+    def num_drives(self):
+        return len( self._drives)
+
+    def drives_per_tick(self, tick_interval):
+        '''
+        Returns how many drives we need to visit each iteration in order to
+        cover all of them in coverage_period seconds.
+        '''
+        drives = self._drives
+        if not drives:
+            return 0
+        ticks = max( 1.0, self.coverage_period / tick_interval)
+        return int( math.ceil( len(drives) / ticks))
+
+    def this_tick(self, tick_interval):
+        '''
+        Generator that yields the indexes of the drives to visit on this
+        iteration.  (See the class description.)
+        '''
+        drives = self._drives   # local copy in case set_drives() is called
+        if not drives:
+            return
+
+        for unused_i in range( min( self.drives_per_tick( tick_interval), len(drives))):
+            if self._cursor >= len(drives):
+                self._cursor = 0
+            if self._cursor == 0:
+                self._sweep_completed()
+
+            index = drives[self._cursor]
+            self._cursor += 1
+            yield index
+
+    def _sweep_completed(self):
+        '''
+        Called each time we start a new pass through the drive list.  Logs
+        a warning if the last pass took longer than we wanted it to.
+        '''
+        now = time.time()
+        if self._sweep_start is not None:
+            sweep_time = now - self._sweep_start
+            if sweep_time > self.coverage_period * 1.1:
+                self.logger.warning( "Disk drive statistics pass took %d seconds "
+                                     "(wanted %d).  Consider increasing the "
+                                     "time budget."%(sweep_time, self.coverage_period))
+            else:
+                self.logger.debug( "Disk drive statistics pass took %d seconds"%
+                                   sweep_time)
+        self._sweep_start = now
@@ -0,0 +1,233 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Percentile and mean estimates from the request size & latency histograms.
+
+The controllers report the request size and latency buckets as cumulative
+counters.  The functions here turn them into per-interval deltas and then
+estimate percentiles and means from the deltas.  Everything is done with
+NumPy on a 2D array (one row per LUN) so the cost doesn't grow much with
+the number of LUNs.
+
+NumPy is an optional dependency.  SFAClient only imports this module if
+request summaries are turned on in the config file.
+'''
+
+import numpy as np
+
+# Multipliers for the units used in the bucket labels.  Latencies are
+# converted to milliseconds and sizes to bytes.
+_UNITS = {
+    'ms'  : 1.0,
+    's'   : 1000.0,
+    'KiB' : 1024.0,
+    'MiB' : 1024.0 * 1024.0,
+    'GiB' : 1024.0 * 1024.0 * 1024.0
+}
+
+# The percentiles we write to the databases
+SUMMARY_PERCENTILES = (50.0, 90.0, 99.0)
+
+
+def bucket_edges( labels):
+    '''
+    Converts a list of bucket labels (such as EXPECTED_SIZE_LABELS or
+    EXPECTED_LUN_LATENCY_LABELS[3] in SFAClient) into two NumPy arrays with
+    the lower and upper edge of each bucket.
+
+    The first bucket starts at 0.  The last bucket ('>4s', for example) has
+    no upper edge, so we assume it's twice its lower edge.  (Estimates that
+    land in that bucket are obviously pretty rough.)
+    '''
+    upper = [ ]
+    for label in labels:
+        if label.startswith( '<='):
+            value = label[2:]
+        elif label.startswith( '>'):
+            value = label[1:]
+        else:
+            raise ValueError( "Can't parse histogram bucket label '%s'"%label)
+
+        for (unit, multiplier) in _UNITS.items():
+            if value.endswith( unit) and value[:-len(unit)].isdigit():
+                upper.append( float( value[:-len(unit)]) * multiplier)
+                break
+        else:
+            raise ValueError( "Can't parse histogram bucket label '%s'"%label)
+
+    if labels[-1].startswith( '>'):
+        upper[-1] = upper[-1] * 2.0
+
+    upper = np.array( upper, dtype=np.float64)
+    lower = np.concatenate( ([0.0], upper[:-1]))
+    if labels[-1].startswith( '>'):
+        lower[-1] = upper[-1] / 2.0
+    return (lower, upper)
+
+
+def estimate_percentiles( deltas, lower, upper, percentiles):
+    '''
+    Estimates percentiles from histogram counts.  deltas is a 2D array with
+    one row of bucket counts for each LUN.  lower and upper are the bucket
+    edges (see bucket_edges()) and percentiles is a sequence of values
+    between 0 and 100.
+
+    Values are linearly interpolated inside the bucket the percentile falls
+    in.  Returns a 2D array with one row per LUN and one column per
+    percentile.  Rows with no requests at all come back as NaN.
+    '''
+    deltas = np.asarray( deltas, dtype=np.float64)
+    cumulative = np.cumsum( deltas, axis=1)
+    totals = cumulative[:, -1]
+    fractions = np.asarray( percentiles, dtype=np.float64) / 100.0
+
+    # targets[i, j] is the request count that percentile j falls on for LUN i
+    targets = totals[:, np.newaxis] * fractions[np.newaxis, :]
+
+    # index of the first bucket whose cumulative count reaches the target
+    reached = cumulative[:, np.newaxis, :] >= targets[:, :, np.newaxis]
+    buckets = np.argmax( reached, axis=2)
+
+    rows = np.arange( deltas.shape[0])[:, np.newaxis]
+    in_bucket = deltas[rows, buckets]
+    before = cumulative[rows, buckets] - in_bucket
+    with np.errstate( divide='ignore', invalid='ignore'):
+        position = np.where( in_bucket > 0,
+                             (targets - before) / in_bucket, 0.0)
+    position = np.clip( position, 0.0, 1.0)
+
+    estimates = lower[buckets] + position * (upper[buckets] - lower[buckets])
+    estimates[totals == 0, :] = np.nan
+    return estimates
+
+
+def estimate_means( deltas, lower, upper):
+    '''
+    Estimates the mean value from histogram counts, assuming the requests
+    in each bucket sit at the bucket's midpoint.  deltas, lower and upper
+    are the same as for estimate_percentiles().  Returns a 1D array with one
+    value per LUN.  Rows with no requests come back as NaN.
+    '''
+    deltas = np.asarray( deltas, dtype=np.float64)
+    totals = deltas.sum( axis=1)
+    midpoints = (lower + upper) / 2.0
+    with np.errstate( divide='ignore', invalid='ignore'):
+        means = np.dot( deltas, midpoints) / totals
+    means[totals == 0] = np.nan
+    return means
+
+
+class HistogramDeltas(object):
+    '''
+    Turns cumulative bucket counters into per-interval deltas.
+
+    Remembers the counters from the previous call.  LUNs that weren't there
+    last time get a row of zeros (there's no interval to diff yet) and rows
+    where any bucket went backwards (the counters were reset) use the
+    current counts as the delta.
+    '''
+
+    def __init__(self):
+        self._luns = ( )
+        self._counts = None
+
+    def update(self, luns, counts):
+        '''
+        luns is a tuple of LUN numbers and counts is a 2D array of the
+        cumulative counters, one row per LUN in the same order.  Returns the
+        deltas since the last call as a 2D array in the same order.
+        '''
+        counts = np.asarray( counts, dtype=np.float64)
+        if self._counts is not None and luns == self._luns:
+            previous = self._counts
+        else:
+            # LUNs were added, removed or re-ordered.  Line up the old rows
+            # with the new ones.  (Rare, so we don't care that it's slow.)
+            previous = counts.copy()
+            if self._counts is not None:
+                old_rows = dict( (lun, i) for (i, lun) in enumerate( self._luns))
+                for (i, lun) in enumerate( luns):
+                    if lun in old_rows:
+                        previous[i] = self._counts[old_rows[lun]]
+
+        deltas = counts - previous
+        reset = (deltas < 0).any( axis=1)
+        deltas[reset] = counts[reset]
+
+        self._luns = luns
+        self._counts = counts
+        return deltas
+
+
+class SFARequestSummary(object):
+    '''
+    Computes the per-LUN request summary (read & write p50, p90, p99
+    latency and mean request size) from a dictionary of
+    SFAVirtualDiskStatistics objects.
+    '''
+
+    def __init__(self, latency_labels, size_labels):
+        '''
+        latency_labels and size_labels are the (firmware specific) bucket
+        labels that SFAClient._check_labels() verified.
+        '''
+        (self._latency_lower, self._latency_upper) = bucket_edges( latency_labels)
+        (self._size_lower, self._size_upper) = bucket_edges( size_labels)
+
+        self._read_latencies = HistogramDeltas()
+        self._write_latencies = HistogramDeltas()
+        self._read_sizes = HistogramDeltas()
+        self._write_sizes = HistogramDeltas()
+
+    def update(self, vd_stats):
+        '''
+        vd_stats is a dictionary of LUN number -> SFAVirtualDiskStatistics
+        (or anything with the same bucket attributes, like
+        SFASinks.LunHistograms).
+        Returns a dictionary of LUN number -> (read p50, read p90, read p99,
+        write p50, write p90, write p99, mean read size, mean write size).
+        Latencies are in milliseconds and sizes in bytes.  Values that
+        can't be estimated (no requests during the interval) are None.
+        '''
+        luns = tuple( sorted( vd_stats.keys()))
+        if not luns:
+            return { }
+
+        read_lat = self._read_latencies.update( luns,
+                [vd_stats[lun].ReadIOLatencyBuckets for lun in luns])
+        write_lat = self._write_latencies.update( luns,
+                [vd_stats[lun].WriteIOLatencyBuckets for lun in luns])
+        read_size = self._read_sizes.update( luns,
+                [vd_stats[lun].ReadIOSizeBuckets for lun in luns])
+        write_size = self._write_sizes.update( luns,
+                [vd_stats[lun].WriteIOSizeBuckets for lun in luns])
+
+        summary = np.hstack( (
+            estimate_percentiles( read_lat, self._latency_lower,
+                                  self._latency_upper, SUMMARY_PERCENTILES),
+            estimate_percentiles( write_lat, self._latency_lower,
+                                  self._latency_upper, SUMMARY_PERCENTILES),
+            estimate_means( read_size, self._size_lower,
+                            self._size_upper)[:, np.newaxis],
+            estimate_means( write_size, self._size_lower,
+                            self._size_upper)[:, np.newaxis]))
+
+        results = { }
+        for (i, lun) in enumerate( luns):
+            results[lun] = tuple( [None if np.isnan(x) else float(x)
+                                   for x in summary[i]])
+        return results
@@ -20,6 +20,8 @@
 
 import copy
 import logging
+
+from SFARateWindows import window_suffix
 from influxdb import InfluxDBClient
 from influxdb.exceptions import InfluxDBClientError
 
@@ -29,7 +31,8 @@ MEASUREMENT_NAMES = {
     "READ_REQUEST_SIZES" : "read_request_sizes",
     "WRITE_REQUEST_SIZES" : "write_request_sizes",
     "READ_REQUEST_LATENCIES" : "read_request_latencies",
-    "WRITE_REQUEST_LATENCIES" : "write_request_latencies"
+    "WRITE_REQUEST_LATENCIES" : "write_request_latencies",
+    "REQUEST_SUMMARY" : "lun_request_summary"
 }
 
 
@@ -60,10 +63,15 @@ class SFAInfluxDb(object):
 
 
 
-    def __init__(self, user, password, host, db_name, use_new_latency_values, init = False):
+    def __init__(self, user, password, host, db_name, use_new_latency_values, init = False,
+                 rate_windows = ()):
         '''
         Connect to the InfluxDB server
         
+        rate_windows is the list of extra windows (in seconds) that get their
+        own set of rate fields in the lun_data measurement.  (See
+        SFARateWindows.)
+        
         Note that we're deliberately *NOT* catching any exceptions that might
         be thrown.  There's really very little that this class could do to
         recover from any errors and without a database connection, this class
@@ -77,6 +85,15 @@ class SFAInfluxDb(object):
         # This holds the JSON data that will be sent to the database
         self._json_body = []
         
+        # Field names for the rate windows (one list per window, in the same
+        # order as the tuples passed to update_lun_series())
+        self._window_fields = [ ]
+        for window in rate_windows:
+            suffix = window_suffix( window)
+            self._window_fields.append( [ name + suffix for name in
+                    ("transfer_bw_", "read_bw_", "write_bw_", "read_iops_",
+                     "write_iops_", "forwarded_bw_", "forwarded_iops_") ])
+        
         # open the database connection
         self._dbcon = InfluxDBClient(host=host, port=8086, username=user, password=password, database=db_name)
         
@@ -111,10 +128,15 @@ class SFAInfluxDb(object):
     def update_lun_series( self, sfa_host_name, update_time, lun_num,
                            transfer_bytes, read_bytes, write_bytes,
                            forwarded_bytes, total_ios, read_ios, write_ios,
-                           forwarded_ios, pool_state):
+                           forwarded_ios, pool_state, window_rates = None):
         '''
         Updates the various per-lun series in the databse
         
+        window_rates has one entry for each of the rate windows passed to the
+        constructor.  Each entry is a tuple of transfer, read & write
+        bandwidth, read & write iops and forwarded bandwidth & iops.  It can
+        be None if the rates aren't available yet.
+        
         Note: This function only queues the values for later output.  To
         actually send anything to the database, you must call flush_to_db(). 
         '''
@@ -124,6 +146,7 @@ class SFAInfluxDb(object):
         #   tags: sfa host name, lun number
         #   values: bytes read, bytes written, bytes transferred, bytes
         #   forwarded, read iops, write iops, forwarded iops and pool state    
+        #   plus the rates for each of the rate windows (read_bw_5m, etc...)
         
         # self.logger.debug( 'Updating lun data for lun %d at %s'%(lun_num, update_time))
         # This generages too much output, even for debug
@@ -149,6 +172,57 @@ class SFAInfluxDb(object):
             }
         })
         
+        if window_rates:
+            fields = self._json_body[-1]["fields"]
+            for (names, rates) in zip( self._window_fields, window_rates):
+                for (name, rate) in zip( names, rates):
+                    fields[name] = rate
+        
+
+    def update_lun_request_summary_series( self, sfa_host_name, update_time,
+                                           lun_num, read_p50, read_p90, read_p99,
+                                           write_p50, write_p90, write_p99,
+                                           read_mean_size, write_mean_size):
+        '''
+        Updates the per-lun latency percentiles and mean request sizes.
+        Latencies are in milliseconds and sizes in bytes.  Values that are
+        None (no requests to estimate them from) are left out.
+
+        Note: This function only queues the values for later output.  To
+        actually send anything to the database, you must call flush_to_db(). 
+        '''
+
+        # Schema:
+        # Measurement is named 'lun_request_summary'
+        # Tags: sfa host name, lun number
+        # Fields: read_p50_ms, read_p90_ms, read_p99_ms, write_p50_ms,
+        #   write_p90_ms, write_p99_ms, read_mean_size, write_mean_size
+        
+        fields = { }
+        for (name, value) in (("read_p50_ms", read_p50),
+                              ("read_p90_ms", read_p90),
+                              ("read_p99_ms", read_p99),
+                              ("write_p50_ms", write_p50),
+                              ("write_p90_ms", write_p90),
+                              ("write_p99_ms", write_p99),
+                              ("read_mean_size", read_mean_size),
+                              ("write_mean_size", write_mean_size)):
+            if value is not None:
+                fields[name] = value
+
+        if not fields:
+            return  # Influx won't accept a point with no fields
+
+        self._json_body.append({
+           "measurement": MEASUREMENT_NAMES["REQUEST_SUMMARY"],
+           "tags": {
+                "sfa_host": sfa_host_name,
+                "lun_num": lun_num
+            },
+           "time": update_time * 1000000000,  # influx wants time in nano-seconds
+           "fields": fields
+        })
+
 
     def update_lun_request_size_series( self, sfa_host_name, update_time,
                                        lun_num, read_series, size_buckets):
@@ -19,8 +19,14 @@
 # A PARTICULAR PURPOSE.
 
 
+import calendar
 import logging
+import re
+import time
 import mysql.connector
+from mysql.connector import errorcode
+
+from SFARateWindows import window_suffix
 
 
 # names for the various database tables
@@ -36,6 +42,7 @@ TABLE_NAMES = {
              "LUN_READ_REQUEST_LATENCY_TABLE_NAME" : u"LunReadRequestLatencies",
              "LUN_WRITE_REQUEST_SIZE_TABLE_NAME" : u"LunWriteRequestSizes",
              "LUN_WRITE_REQUEST_LATENCY_TABLE_NAME" : u"LunWriteRequestLatencies",
+             "LUN_REQUEST_SUMMARY_TABLE_NAME" : u"LunRequestSummary",
              "DD_READ_REQUEST_SIZE_TABLE_NAME" : u"DiskDriveReadRequestSizes",
              "DD_READ_REQUEST_LATENCY_TABLE_NAME" : u"DiskDriveReadRequestLatencies",
              "DD_WRITE_REQUEST_SIZE_TABLE_NAME" : u"DiskDriveWriteRequestSizes",
@@ -44,6 +51,53 @@ TABLE_NAMES = {
  }
 #
 
+# Keys for the request size & latency tables, which all have the same
+# layout:  host, time, device number and NUM_REQUEST_BUCKETS buckets
+REQUEST_TABLE_KEYS = [ "LUN_READ_REQUEST_SIZE_TABLE_NAME",
+                       "LUN_READ_REQUEST_LATENCY_TABLE_NAME",
+                       "LUN_WRITE_REQUEST_SIZE_TABLE_NAME",
+                       "LUN_WRITE_REQUEST_LATENCY_TABLE_NAME",
+                       "DD_READ_REQUEST_SIZE_TABLE_NAME",
+                       "DD_READ_REQUEST_LATENCY_TABLE_NAME",
+                       "DD_WRITE_REQUEST_SIZE_TABLE_NAME",
+                       "DD_WRITE_REQUEST_LATENCY_TABLE_NAME" ]
+NUM_REQUEST_BUCKETS = 12
+
+# Extra things for the compact_keys schema.  (See _compact_table_def().)
+# In that schema, the data lives in tables named <table name> +
+# COMPACT_TABLE_SUFFIX and the names above are views that join in the
+# host names from the hosts table.
+HOSTS_TABLE_NAME = u"Hosts"
+COMPACT_TABLE_SUFFIX = u"ById"
+
+# The (optional) history table.  Unlike the tables above, it's InnoDB, it
+# holds every sample (well, one every history_interval seconds) instead of
+# just the latest one and it's partitioned by day so old data can be
+# dropped cheaply.  (See _new_history_table().)  It's never dropped when
+# the database is initialized.
+HISTORY_TABLE_NAME = u"LunHistory"
+DEFAULT_HISTORY_INTERVAL = 60       # seconds between samples for each LUN
+DEFAULT_HISTORY_BATCH_ROWS = 1000   # rows per INSERT statement
+HISTORY_FLUSH_INTERVAL = 60         # max seconds rows are buffered
+HISTORY_PARTITIONS_AHEAD = 3        # empty partitions kept for future days
+
+# Errors that just mean another process got to the partition first
+_PARTITION_RACE_ERRORS = ( errorcode.ER_SAME_NAME_PARTITION,
+                           errorcode.ER_DROP_PARTITION_NON_EXISTENT,
+                           errorcode.ER_RANGE_NOT_INCREASING_ERROR )
+
+# Matches the key definitions at the end of the regular table definitions
+_KEY_DEF_RE = re.compile(
+    r"CONSTRAINT unique_disk UNIQUE \(Hostname, (\w+)\), *"
+    r"INDEX\( Hostname\), INDEX\( \w+\) \)")
+
+# Prefixes for the extra LunInfo columns for each rate window.  (The full
+# column name is the prefix plus the window suffix - Read_BW_5m, etc...)
+# Same order as the regular rate columns.
+LUN_WINDOW_COLUMN_PREFIXES = [ "Transfer_BW_", "Read_BW_", "Write_BW_",
+                               "Read_IOPS_", "Write_IOPS_",
+                               "Forwarded_BW_", "Forwarded_IOPS_" ]
+
 # Partially complete SQL statements for creating the request size
 # and latency tables
 
@@ -137,16 +191,75 @@ PARTIAL_SIZE_TABLE_DEF = \
 # ever changes, we'll obviously have to change this code, too.
 
 
+def compact_keys_enabled( config):
+    '''
+    Returns True if the SqlDb section of the config file asks for the
+    compact_keys schema.  (Both DDNTool, when it creates the tables, and
+    SFAClient call this so they always agree.)
+    '''
+    return config.has_option('SqlDb', 'compact_keys') and \
+           config.getboolean('SqlDb', 'compact_keys')
+
+
+def history_options( config):
+    '''
+    Returns a dictionary of the history settings from the SqlDb section of
+    the config file.  (Keyword arguments for the SFAMySqlDb constructor.)
+    '''
+    options = { 'history_retention_days' : 0,
+                'history_interval' : DEFAULT_HISTORY_INTERVAL,
+                'history_batch_rows' : DEFAULT_HISTORY_BATCH_ROWS }
+    for name in options.keys():
+        if config.has_option('SqlDb', name):
+            options[name] = config.getint('SqlDb', name)
+    return options
+
+
+def _partition_name( day):
+    '''
+    Returns the name of the history table partition for a day (counted in
+    days since the epoch)
+    '''
+    return 'p' + time.strftime( '%Y%m%d', time.gmtime( day * 86400))
+
+
+def _partition_day( name):
+    '''
+    The opposite of _partition_name()
+    '''
+    return calendar.timegm( time.strptime( name[1:], '%Y%m%d')) // 86400
+
+
 class SFAMySqlDb(object):
     '''
     Encapsulates the database related tasks into one class with a fairly simple interface.
     '''
 
 
-    def __init__(self, user, password, host, db_name, init = False, new_latency_table = False):
+    def __init__(self, user, password, host, db_name, init = False, new_latency_table = False,
+                 rate_windows = (), compact_keys = False,
+                 history_retention_days = 0,
+                 history_interval = DEFAULT_HISTORY_INTERVAL,
+                 history_batch_rows = DEFAULT_HISTORY_BATCH_ROWS):
         '''
         Connect to the database and create the tables (if necessary)
         
+        rate_windows is the list of extra windows (in seconds) that get their
+        own set of rate columns in the lun info table.  (See SFARateWindows.)
+        
+        If compact_keys is True, the tables identify hosts by a small integer
+        id from the hosts table instead of the full host name and the only
+        index is the primary key.  Views with the usual table names and
+        columns are created on top of them, so queries against the old
+        schema still work.  It must match the setting used when the tables
+        were created.
+        
+        If history_retention_days is greater than 0, the raw LUN counters
+        passed to add_lun_history() are also kept in the history table for
+        that many days.  Only one sample every history_interval seconds is
+        kept for each LUN.  Rows are buffered and written
+        history_batch_rows at a time.  (See flush_history().)
+        
         Note that we're deliberately *NOT* catching any exceptions that might
         be thrown.  There's really very little that this class could do to recover
         from any errors and without a database connection and properly initialized
@@ -157,52 +270,105 @@ class SFAMySqlDb(object):
         self.logger = logging.getLogger( 'DDNTool_SFAMySqlDb')
         self.logger.debug( 'Creating instance of SFAMySqlDb')
 
+        self._window_columns = [ ]
+        for window in rate_windows:
+            suffix = window_suffix( window)
+            for prefix in LUN_WINDOW_COLUMN_PREFIXES:
+                self._window_columns.append( prefix + suffix)
+
+        self._compact_keys = compact_keys
+        self._host_ids = { }    # host name -> id (compact_keys only)
+        if compact_keys:
+            self._host_column = "Host_Id"
+        else:
+            self._host_column = "Hostname"
+
+        self._history_retention = history_retention_days
+        self._history_interval = history_interval
+        self._history_batch_rows = history_batch_rows
+        self._history_rows = [ ]
+        self._history_last = { }        # (host name, lun) -> last sample time
+        self._history_oldest = None     # when the oldest buffered row was added
+        self._partition_day = None      # day we last checked the partitions
+
+        self._statements = self._build_statements()
+        self._cursors = { }     # table key -> prepared cursor
+        self._in_tick = False   # between begin_tick() and end_tick()
+
         self._dbcon = mysql.connector.connect(user = user, password = password,
                                               host = host, database = db_name)
         if init:            
             self._create_schema( new_latency_table)
+            if self._history_retention > 0:
+                self._new_history_table()
+            self._dbcon.commit()
+        elif self._history_retention > 0:
+            self._check_history_table()
+        
+    def _table(self, key):
+        '''
+        Returns the name of the table to write to for one of the keys in
+        TABLE_NAMES
+        '''
+        if self._compact_keys:
+            return TABLE_NAMES[key] + COMPACT_TABLE_SUFFIX
+        return TABLE_NAMES[key]
+    
+    def _host_key(self, sfa_client_name):
+        '''
+        Returns the value that goes in the host column for the named host:
+        either the name itself or (with compact_keys) its id from the hosts
+        table.  New hosts are added to the hosts table as needed.
+        '''
+        if not self._compact_keys:
+            return sfa_client_name
+        
+        host_id = self._host_ids.get( sfa_client_name)
+        if host_id is None:
+            cursor = self._dbcon.cursor()
+            cursor.execute( "INSERT IGNORE INTO " + HOSTS_TABLE_NAME +
+                            " (Hostname) VALUES( %s);", (sfa_client_name, ))
+            cursor.execute( "SELECT Host_Id FROM " + HOSTS_TABLE_NAME +
+                            " WHERE Hostname = %s;", (sfa_client_name, ))
+            host_id = cursor.fetchall()[0][0]
+            cursor.close()
+            self._commit_unless_in_tick()   # the hosts table is InnoDB
+            self._host_ids[sfa_client_name] = host_id
+        return host_id
         
  
-    def update_lun_table( self, sfa_client_name, update_time, lun_num,
-                          transfer_bw, read_bw, write_bw,
-                          read_iops, write_iops, forwarded_bw, forwarded_iops,
-                          pool_state):
+    def _build_statements(self):
         '''
-        Updates the row in the lun info table for the specified 
-        client and virtual disk.
+        Builds the SQL for all the update_*() functions.  This happens once,
+        here, rather than on every call.  (The statements are prepared on
+        the server the first time they're used.  See _execute().)
         '''
-
+        statements = { }
         
-        insert_query = "INSERT INTO " + TABLE_NAMES['LUN_TABLE_NAME'] +                 \
-                "(Hostname, LastUpdate, Disk_Num, Transfer_BW, Read_BW, Write_BW, "     \
-                "Read_IOPS, Write_IOPS, Forwarded_BW, Forwarded_IOPS, Pool_State) "     \
-                "VALUES( %s, FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s, %s, %s, %s) "   \
+        query = "INSERT INTO " + self._table( 'LUN_TABLE_NAME') +                     \
+                "(" + self._host_column + ", LastUpdate, Disk_Num, Transfer_BW, "      \
+                "Read_BW, Write_BW, "                                                   \
+                "Read_IOPS, Write_IOPS, Forwarded_BW, Forwarded_IOPS, Pool_State"
+        for column in self._window_columns:
+            query += ", " + column
+        query += ") " \
+                "VALUES( %s, FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s, %s, %s, %s"
+        for unused_column in self._window_columns:
+            query += ", %s"
+        query += ") " \
                 "ON DUPLICATE KEY UPDATE LastUpdate=VALUES(LastUpdate), "               \
                 "Transfer_BW=VALUES(Transfer_BW), Read_BW=VALUES(Read_BW), "            \
                 "Write_BW=VALUES(Write_BW), Read_IOPS=VALUES(Read_IOPS), "              \
                 "Write_IOPS=VALUES(Write_IOPS), Forwarded_BW=VALUES(Forwarded_BW), "    \
-                "Forwarded_IOPS=VALUES(Forwarded_IOPS), Pool_State=VALUES(Pool_State);" 
+                "Forwarded_IOPS=VALUES(Forwarded_IOPS), Pool_State=VALUES(Pool_State)"
+        for column in self._window_columns:
+            query += ", %s=VALUES(%s)"%(column, column)
+        statements['LUN_TABLE_NAME'] = query
         
-        cursor = self._dbcon.cursor()
-        cursor.execute( insert_query, (sfa_client_name, str(update_time),
-                                       str(lun_num), str(transfer_bw),
-                                       str(read_bw), str(write_bw),
-                                       str(read_iops), str(write_iops),
-                                       str(forwarded_bw), str(forwarded_iops),
-                                       str(pool_state)))
-        cursor.close()
-
-    def update_raw_lun_table( self, sfa_client_name, update_time, lun_num,
-                              transfer_bytes, read_bytes, write_bytes,
-                              forwarded_bytes, total_ios, read_ios, write_ios,
-                              forwarded_ios, pool_state):
-        '''
-        Updates the row in the raw lun info table for the specified 
-        client and virtual disk.
-        '''
-        
-        insert_query = "INSERT INTO " + TABLE_NAMES['RAW_LUN_TABLE_NAME'] +   \
-                "(Hostname, LastUpdate, Disk_Num, Transfer_Bytes, "           \
+        statements['RAW_LUN_TABLE_NAME'] = \
+                "INSERT INTO " + self._table( 'RAW_LUN_TABLE_NAME') +         \
+                "(" + self._host_column + ", LastUpdate, Disk_Num, "          \
+                "Transfer_Bytes, "                                            \
                 "Read_Bytes, Write_Bytes, Forwarded_bytes, "                  \
                 "Total_IOs, Read_IOs, Write_IOs, Forwarded_IOs, Pool_State) " \
                 "VALUES( %s, FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s, %s, " \
@@ -215,18 +381,252 @@ class SFAMySqlDb(object):
                 "Total_IOs=VALUES(Total_IOs), Read_IOs=VALUES(Read_IOs), "    \
                 "Write_IOs=VALUES(Write_IOs), "                               \
                 "Forwarded_IOs=VALUES(Forwarded_IOs), "                       \
-                "Pool_State=VALUES(Pool_State);" 
+                "Pool_State=VALUES(Pool_State)"
+        
+        statements['LUN_REQUEST_SUMMARY_TABLE_NAME'] = \
+                "REPLACE INTO " + self._table( 'LUN_REQUEST_SUMMARY_TABLE_NAME') + \
+                "(" + self._host_column + ", LastUpdate, LUN, Read_P50_ms, "   \
+                "Read_P90_ms, "                                                \
+                "Read_P99_ms, Write_P50_ms, Write_P90_ms, Write_P99_ms, "      \
+                "Read_Mean_Size, Write_Mean_Size) "                            \
+                "VALUES( %s, FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+        
+        statements['DISK_TABLE_NAME'] = \
+                "REPLACE INTO " + self._table( 'DISK_TABLE_NAME') +       \
+                "(" + self._host_column + ", LastUpdate, "                 \
+                "Disk_Num, Transfer_BW, "                                  \
+                "Read_IOPS, Write_IOPS) "                                  \
+                "VALUES( %s, FROM_UNIXTIME(%s), %s, %s, %s, %s)"
+        
+        # The request size & latency tables all have the same layout
+        for key in REQUEST_TABLE_KEYS:
+            query = "REPLACE INTO " + self._table( key) + \
+                    " VALUES( %s, FROM_UNIXTIME(%s), %s"
+            for unused_i in range( NUM_REQUEST_BUCKETS):
+                query += ", %s"
+            query += ")"
+            statements[key] = query
+        
+        return statements
+
+    def _execute(self, key, values):
+        '''
+        Runs the statement for one of the tables.  Each table gets its own
+        prepared cursor, which is kept open, so the statement is only
+        prepared on the server once and the values are sent in their
+        native (binary) form.
+        '''
+        cursor = self._cursors.get( key)
+        if cursor is None:
+            cursor = self._dbcon.cursor( prepared = True)
+            self._cursors[key] = cursor
+        cursor.execute( self._statements[key], values)
+
+    def begin_tick(self):
+        '''
+        Starts the transaction for one polling iteration.  Note that only
+        the writes to the InnoDB tables (Hosts and LunHistory) are actually
+        grouped:  LunInfo, LunInfoRaw and the request size & latency tables
+        are HEAP (MEMORY) tables, which don't support transactions, so each
+        of those updates takes effect as soon as it runs.  The tick isn't
+        atomic.  What we get is one commit (and one log flush) per
+        iteration instead of one per statement.
+        '''
+        if self._in_tick:
+            return
+        if self._dbcon.in_transaction:
+            self._dbcon.commit()    # left over from an earlier statement
+        self._dbcon.start_transaction()
+        self._in_tick = True
+        
+    def end_tick(self):
+        '''
+        Commits the InnoDB writes since begin_tick().  (See begin_tick().)
+        '''
+        self._dbcon.commit()
+        self._in_tick = False
+        
+    def _commit_unless_in_tick(self):
+        '''
+        Used by the functions that write to InnoDB tables.  Inside a tick,
+        end_tick() will do the commit.
+        '''
+        if not self._in_tick:
+            self._dbcon.commit()
+ 
+    def update_lun_table( self, sfa_client_name, update_time, lun_num,
+                          transfer_bw, read_bw, write_bw,
+                          read_iops, write_iops, forwarded_bw, forwarded_iops,
+                          pool_state, window_rates = ()):
+        '''
+        Updates the row in the lun info table for the specified 
+        client and virtual disk.
+        
+        window_rates has one entry for each of the rate windows passed to the
+        constructor.  Each entry is a tuple of the same 7 rates as the
+        regular columns (transfer_bw through forwarded_iops).  It can be
+        None if the window rates aren't available (not enough data since
+        startup or the last counter reset).  The window columns are set to
+        NULL then.
+        '''
+        
+        values = (self._host_key( sfa_client_name), update_time, lun_num,
+                  transfer_bw, read_bw, write_bw, read_iops, write_iops,
+                  forwarded_bw, forwarded_iops, pool_state)
+        if window_rates is None:
+            values += (None, ) * len(self._window_columns)
+        else:
+            for rates in window_rates:
+                values += tuple( rates)
+        
+        if len(values) != 11 + len(self._window_columns):
+            raise RuntimeError( "Wrong number of window rates for lun info table")
+
+        self._execute( 'LUN_TABLE_NAME', values)
+
+    def update_raw_lun_table( self, sfa_client_name, update_time, lun_num,
+                              transfer_bytes, read_bytes, write_bytes,
+                              forwarded_bytes, total_ios, read_ios, write_ios,
+                              forwarded_ios, pool_state):
+        '''
+        Updates the row in the raw lun info table for the specified 
+        client and virtual disk.
+        '''
+        
+        counters = (transfer_bytes, read_bytes, write_bytes, forwarded_bytes,
+                    total_ios, read_ios, write_ios, forwarded_ios, pool_state)
+        self._execute( 'RAW_LUN_TABLE_NAME',
+                       (self._host_key( sfa_client_name), update_time, lun_num) +
+                       tuple( [ int(c) for c in counters ]))
+        
+
+    def add_lun_history( self, sfa_client_name, update_time, lun_num,
+                         transfer_bytes, read_bytes, write_bytes,
+                         forwarded_bytes, total_ios, read_ios, write_ios,
+                         forwarded_ios, pool_state):
+        '''
+        Adds the raw counters for one LUN to the history buffer (same
+        arguments as update_raw_lun_table()).  Does nothing if history
+        isn't enabled or if this LUN already has a sample in the current
+        history_interval.
+        
+        Note: nothing is written until flush_history() is called.
+        '''
+        if self._history_retention <= 0:
+            return
+        
+        # Samples are aligned to multiples of the interval, so all the LUNs
+        # (and hosts) get samples at the same times
+        key = (sfa_client_name, lun_num)
+        interval = int(update_time) // self._history_interval
+        if self._history_last.get( key) == interval:
+            return
+        self._history_last[key] = interval
+        
+        if not self._history_rows:
+            self._history_oldest = time.time()
+        self._history_rows.append( (self._host_key( sfa_client_name),
+                                    int(update_time), lun_num,
+                                    transfer_bytes, read_bytes, write_bytes,
+                                    forwarded_bytes, total_ios, read_ios,
+                                    write_ios, forwarded_ios, pool_state))
+    
+    def flush_history( self, force = False):
+        '''
+        Writes out the buffered history rows if there's a full batch of them
+        or the oldest one has been waiting for HISTORY_FLUSH_INTERVAL
+        seconds (or if force is True).  Rows are written with multi-row
+        INSERT statements and committed together, so one connection can
+        handle thousands of rows per second.  Also takes care of adding and
+        dropping partitions when the day changes.
+        '''
+        if not self._history_rows:
+            return
+        if not force and len(self._history_rows) < self._history_batch_rows and \
+           time.time() - self._history_oldest < HISTORY_FLUSH_INTERVAL:
+            return
+        
+        self._rotate_partitions( time.time())
+        
+        # IGNORE is for samples that were already written before a restart.
+        # (Note: cursor.executemany() won't combine INSERT IGNORE statements,
+        # so we build the multi-row statement ourselves.)
+        insert_query = "INSERT IGNORE INTO " + HISTORY_TABLE_NAME +           \
+                "(" + self._host_column + ", Update_Time, Disk_Num, "         \
+                "Transfer_Bytes, Read_Bytes, Write_Bytes, Forwarded_Bytes, "  \
+                "Total_IOs, Read_IOs, Write_IOs, Forwarded_IOs, Pool_State) " \
+                "VALUES "
+        row_values = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
         
         cursor = self._dbcon.cursor()
-        cursor.execute( insert_query, (sfa_client_name, str(update_time),
-                                        str(lun_num), str(transfer_bytes),
-                                        str(read_bytes), str(write_bytes),
-                                        str(forwarded_bytes),
-                                        str(total_ios), str(read_ios),
-                                        str(write_ios), str(forwarded_ios),
-                                        str(pool_state)))
+        rows = self._history_rows
+        for start in range( 0, len(rows), self._history_batch_rows):
+            batch = rows[start:start + self._history_batch_rows]
+            values = [ ]
+            for row in batch:
+                values.extend( row)
+            cursor.execute( insert_query + ", ".join( [row_values] * len(batch)) + ";",
+                            tuple( values))
+        cursor.close()
+        self._commit_unless_in_tick()
+        self._history_rows = [ ]
+
+    def _rotate_partitions( self, now):
+        '''
+        Makes sure the history table has partitions for today and the next
+        few days and drops the ones older than the retention period.  Only
+        does anything the first time it's called each day.
+        
+        Every SFAClient process calls this, so they may race each other.
+        The loser just gets an error that we ignore.
+        '''
+        today = int(now) // 86400
+        if today == self._partition_day:
+            return
+        
+        cursor = self._dbcon.cursor()
+        cursor.execute( "SELECT PARTITION_NAME FROM INFORMATION_SCHEMA.PARTITIONS "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+                        "AND PARTITION_NAME IS NOT NULL;", (HISTORY_TABLE_NAME, ))
+        existing = [ row[0] for row in cursor.fetchall() ]
         cursor.close()
         
+        for day in range( today, today + HISTORY_PARTITIONS_AHEAD + 1):
+            if _partition_name( day) not in existing:
+                self._alter_history_partitions(
+                    "ADD PARTITION (PARTITION %s VALUES LESS THAN (%d))"%
+                    (_partition_name( day), (day + 1) * 86400))
+        
+        for name in existing:
+            if _partition_day( name) < today - self._history_retention:
+                self.logger.info( "Dropping history partition %s"%name)
+                self._alter_history_partitions( "DROP PARTITION %s"%name)
+                
+        self._partition_day = today
+        
+    def _alter_history_partitions( self, alteration):
+        try:
+            self._query_exec( "ALTER TABLE %s %s;"%(HISTORY_TABLE_NAME, alteration))
+        except mysql.connector.Error, e:
+            if e.errno not in _PARTITION_RACE_ERRORS:
+                raise
+
+    def update_lun_request_summary_table( self, sfa_client_name, update_time,
+                                          lun_num, read_p50, read_p90, read_p99,
+                                          write_p50, write_p90, write_p99,
+                                          read_mean_size, write_mean_size):
+        '''
+        Updates the row in the lun request summary table for the specified
+        client and virtual disk.  Latencies are in milliseconds and sizes are
+        in bytes.  Any of the values may be None (written as NULL) if there
+        weren't any requests to estimate them from.
+        '''
+
+        self._execute( 'LUN_REQUEST_SUMMARY_TABLE_NAME',
+                       (self._host_key( sfa_client_name), update_time, lun_num,
+                        read_p50, read_p90, read_p99, write_p50, write_p90,
+                        write_p99, read_mean_size, write_mean_size))
+
     def update_dd_table( self, sfa_client_name, update_time, dd_num,
                          transfer_bw, read_iops, write_iops):
         '''
@@ -234,16 +634,22 @@ class SFAMySqlDb(object):
         client and virtual disk.
         '''
 
-        replace_query = "REPLACE INTO " + TABLE_NAMES['DISK_TABLE_NAME'] + \
-                        "(Hostname, LastUpdate, Disk_Num, Transfer_BW, "   \
-                        "Read_IOPS, Write_IOPS) "                          \
-                        "VALUES( %s, FROM_UNIXTIME(%s), %s, %s, %s, %s);"
-     
-        cursor = self._dbcon.cursor()
-        cursor.execute( replace_query, (sfa_client_name, str(update_time),
-                                        str(dd_num), str(transfer_bw),
-                                        str(read_iops), str(write_iops)))
-        cursor.close()
+        self._execute( 'DISK_TABLE_NAME',
+                       (self._host_key( sfa_client_name), update_time, dd_num,
+                        transfer_bw, read_iops, write_iops))
+
+    def _update_request_table( self, key, sfa_client_name, update_time,
+                               device_num, buckets):
+        '''
+        Common code for the request size & latency tables
+        '''
+        if len(buckets) != NUM_REQUEST_BUCKETS:
+            raise RuntimeError( "Wrong number of buckets for table %s"%TABLE_NAMES[key])
+        # Note: the buckets come straight from the controller as pywbem
+        # integer types.  Convert them to plain ints so they're bound as
+        # numbers.
+        self._execute( key, (self._host_key( sfa_client_name), update_time,
+                             device_num) + tuple( [ int(b) for b in buckets ]))
 
     def update_lun_request_size_table( self, sfa_client_name, update_time,
                                        lun_num, read_table, size_buckets):
@@ -254,27 +660,12 @@ class SFAMySqlDb(object):
         the column headings.
         '''
         
-        replace_query = "REPLACE INTO "
         if read_table:
-            replace_query += TABLE_NAMES["LUN_READ_REQUEST_SIZE_TABLE_NAME"]
+            key = "LUN_READ_REQUEST_SIZE_TABLE_NAME"
         else:    
-            replace_query += TABLE_NAMES["LUN_WRITE_REQUEST_SIZE_TABLE_NAME"]
-
-        replace_query += " VALUES( %s, FROM_UNIXTIME(%s), %s" 
-        
-        for unused_i in range(len(size_buckets)):
-            replace_query += ", %s"
-        replace_query += ");"
-       
-        values = (sfa_client_name, str(update_time), str(lun_num))
-        for size in size_buckets:
-                values += (str(size), )
-        # Note: it seems like I shouldn't have to convert all the sizes to strings manually,
-        # but I get strange mysql errors if I don't...
-
-        cursor = self._dbcon.cursor()
-        cursor.execute( replace_query, values)
-        cursor.close()
+            key = "LUN_WRITE_REQUEST_SIZE_TABLE_NAME"
+        self._update_request_table( key, sfa_client_name, update_time,
+                                    lun_num, size_buckets)
 
     def update_lun_request_latency_table( self, sfa_client_name, update_time,
                                           lun_num, read_table, latency_buckets):
@@ -285,27 +676,12 @@ class SFAMySqlDb(object):
         the latency values listed in the column headings.
         '''
 
-        replace_query = "REPLACE INTO "
         if read_table:
-            replace_query += TABLE_NAMES["LUN_READ_REQUEST_LATENCY_TABLE_NAME"]
+            key = "LUN_READ_REQUEST_LATENCY_TABLE_NAME"
         else:
-            replace_query += TABLE_NAMES["LUN_WRITE_REQUEST_LATENCY_TABLE_NAME"]
-
-        replace_query += " VALUES( %s, FROM_UNIXTIME(%s), %s"
-
-        for unused_i in range(len(latency_buckets)):
-            replace_query += ", %s"
-        replace_query += ");"
-
-        values = (sfa_client_name, str(update_time), str(lun_num))
-        for latency in latency_buckets:
-                values += (str(latency), )
-        # Note: it seems like I shouldn't have to convert all the values to strings manually,
-        # but I get strange mysql errors if I don't...
-
-        cursor = self._dbcon.cursor()
-        cursor.execute( replace_query, values)
-        cursor.close()
+            key = "LUN_WRITE_REQUEST_LATENCY_TABLE_NAME"
+        self._update_request_table( key, sfa_client_name, update_time,
+                                    lun_num, latency_buckets)
 
  
     def update_dd_request_size_table( self, sfa_client_name, update_time,
@@ -317,27 +693,12 @@ class SFAMySqlDb(object):
         the column headings.
         '''
         
-        replace_query = "REPLACE INTO "
         if read_table:
-            replace_query += TABLE_NAMES["DD_READ_REQUEST_SIZE_TABLE_NAME"]
+            key = "DD_READ_REQUEST_SIZE_TABLE_NAME"
         else:    
-            replace_query += TABLE_NAMES["DD_WRITE_REQUEST_SIZE_TABLE_NAME"]
-            
-        replace_query += " VALUES( %s, FROM_UNIXTIME(%s), %s"
-        
-        for unused_i in range(len(size_buckets)):
-            replace_query += ", %s"
-        replace_query += ");"
-        
-        values = (sfa_client_name, str(update_time), str(disk_num))
-        for size in size_buckets:
-                values += (str(size), )
-        # Note: it seems like I shouldn't have to convert all the sizes to strings manually,
-        # but I get strange mysql errors if I don't...
-        
-        cursor = self._dbcon.cursor()
-        cursor.execute( replace_query, values)
-        cursor.close()
+            key = "DD_WRITE_REQUEST_SIZE_TABLE_NAME"
+        self._update_request_table( key, sfa_client_name, update_time,
+                                    disk_num, size_buckets)
         
     def update_dd_request_latency_table( self, sfa_client_name, update_time,
                                          disk_num, read_table, latency_buckets):
@@ -348,28 +709,12 @@ class SFAMySqlDb(object):
         the latency values listed in the column headings.
         '''
 
-        replace_query = "REPLACE INTO "
         if read_table:
-            replace_query += TABLE_NAMES["DD_READ_REQUEST_LATENCY_TABLE_NAME"]
+            key = "DD_READ_REQUEST_LATENCY_TABLE_NAME"
         else:
-            replace_query += TABLE_NAMES["DD_WRITE_REQUEST_LATENCY_TABLE_NAME"]
-            
-        replace_query += " VALUES( %s, FROM_UNIXTIME(%s), %s"
-        
-        for unused_i in range(len(latency_buckets)):
-            replace_query += ", %s"
-        replace_query += ");"
-        
-        values = (sfa_client_name, str(update_time), str(disk_num))
-        for latency in latency_buckets:
-                values += (str(latency), )
-        # Note: it seems like I shouldn't have to convert all the values to strings manually,
-        # but I get strange mysql errors if I don't...
-        
-        cursor = self._dbcon.cursor()
-        cursor.execute( replace_query, values)
-        cursor.close()
-
+            key = "DD_WRITE_REQUEST_LATENCY_TABLE_NAME"
+        self._update_request_table( key, sfa_client_name, update_time,
+                                    disk_num, latency_buckets)
 
     def _create_schema(self, new_latency_table):
         # Drop the old tables (since we're not storing long-term data, it's easier
@@ -379,21 +724,31 @@ class SFAMySqlDb(object):
         # for I/O latency changed.  So, now we have 2 choices for the lun
         # latency tables.
         cursor = self._dbcon.cursor()
-        cursor.execute( "SHOW TABLES;")
+        cursor.execute( "SHOW FULL TABLES;")
         results = cursor.fetchall()
         # results is a list of tuples - each tuple is one row.
-        # In this case, there's only one value in each tuple: a table name
+        # In this case, there's two values in each tuple: a table name and
+        # the table type ('BASE TABLE' or 'VIEW')
         cursor.close()
 
-        values = TABLE_NAMES.values()         
-        for result in results:
-            if result[0] in values:
-                cursor = self._dbcon.cursor()
-                query = "DROP TABLE %s;"%result[0]
-                cursor.execute( query)
-                cursor.close()
+        # Drop the tables from both schemas, in case we're switching between
+        # them.  (Views first, since they depend on the tables.)
+        values = TABLE_NAMES.values()
+        values += [ name + COMPACT_TABLE_SUFFIX for name in TABLE_NAMES.values() ]
+        for table_type in ('VIEW', 'BASE TABLE'):
+            for result in results:
+                if result[0] in values and result[1] == table_type:
+                    cursor = self._dbcon.cursor()
+                    if table_type == 'VIEW':
+                        query = "DROP VIEW %s;"%result[0]
+                    else:
+                        query = "DROP TABLE %s;"%result[0]
+                    cursor.execute( query)
+                    cursor.close()
         
         # create the new table(s)
+        if self._compact_keys:
+            self._new_hosts_table()
         self._new_lun_table()
         self._new_raw_lun_table()
         self._new_dd_table()
@@ -405,6 +760,7 @@ class SFAMySqlDb(object):
         self._new_lun_read_request_latency_table( new_latency_table)
         self._new_lun_write_request_size_table()
         self._new_lun_write_request_latency_table( new_latency_table)
+        self._new_lun_request_summary_table()
 
     def _query_exec(self, query):
         '''
@@ -416,6 +772,138 @@ class SFAMySqlDb(object):
         cursor.execute( query)
         cursor.close()
 
+    def _create_table(self, key, table_def):
+        '''
+        Runs the CREATE TABLE statement for one of the tables in TABLE_NAMES.
+        With compact_keys, the statement is converted first (see
+        _compact_table_def()) and the compatibility view is created, too.
+        '''
+        if not self._compact_keys:
+            self._query_exec( table_def)
+            return
+        
+        self._query_exec( self._compact_table_def( key, table_def))
+        self._new_compat_view( key)
+
+    def _compact_table_def(self, key, table_def):
+        '''
+        Converts a regular table definition to the compact_keys schema:  the
+        table gets the compact name, the host name column becomes a small
+        integer id and the unique constraint plus the two secondary indexes
+        become a single primary key.  (The BTREE index still handles lookups
+        on just the host id, which is all the secondary index on the host
+        name was for.  Nothing looks things up by disk number alone.)
+        '''
+        table_def = table_def.replace( "CREATE TABLE " + TABLE_NAMES[key] + " ",
+                                       "CREATE TABLE " + self._table( key) + " ", 1)
+        table_def = table_def.replace( "Hostname VARCHAR(75) NOT NULL",
+                                       "Host_Id SMALLINT UNSIGNED NOT NULL", 1)
+        (table_def, count) = _KEY_DEF_RE.subn(
+                r"PRIMARY KEY USING BTREE (Host_Id, \1) )", table_def)
+        if count != 1:
+            raise RuntimeError( "Can't convert the definition of table %s "
+                                "to the compact_keys schema"%TABLE_NAMES[key])
+        return table_def
+
+    def _new_compat_view(self, key):
+        '''
+        Creates a view with the regular table name and columns on top of
+        one of the compact_keys tables
+        '''
+        cursor = self._dbcon.cursor()
+        cursor.execute( "SHOW COLUMNS FROM %s;"%self._table( key))
+        columns = [ row[0] for row in cursor.fetchall() if row[0] != "Host_Id" ]
+        cursor.close()
+
+        view_def = "CREATE VIEW " + TABLE_NAMES[key] + " AS SELECT " + \
+                   HOSTS_TABLE_NAME + ".Hostname AS Hostname"
+        for column in columns:
+            view_def += ", t.`%s`"%column
+        view_def += " FROM " + self._table( key) + " AS t JOIN " + \
+                    HOSTS_TABLE_NAME + " USING (Host_Id);"
+
+        self._query_exec( view_def)
+
+    def _new_hosts_table(self):
+        '''
+        Create the table that maps host names to ids for the compact_keys
+        schema.  Unlike the others, it's InnoDB so the ids survive a
+        restart of the database server.  (The HEAP tables are just emptied,
+        but the SFAClient processes would keep using their cached ids.)  It's
+        not dropped when the database is initialized because the history
+        table refers to the ids.
+        '''
+
+        table_def = \
+        "CREATE TABLE IF NOT EXISTS " + HOSTS_TABLE_NAME + " "  \
+        "(Host_Id SMALLINT UNSIGNED NOT NULL AUTO_INCREMENT, " \
+        "Hostname VARCHAR(75) NOT NULL, " \
+        "PRIMARY KEY (Host_Id), " \
+        "CONSTRAINT unique_host UNIQUE (Hostname) )" \
+        "ENGINE=InnoDB" \
+        ";"
+
+        self._query_exec( table_def)
+
+    def _check_history_table(self):
+        '''
+        Unlike the other tables, the history table is never dropped, so if
+        it exists it has to have been created with the same compact_keys
+        setting.  (Its host column is either the name or the id.)  Raises
+        a RuntimeError if it wasn't, rather than writing rows that don't
+        fit or throwing the history away.
+        '''
+        cursor = self._dbcon.cursor()
+        cursor.execute( "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s;",
+                        (HISTORY_TABLE_NAME, ))
+        existing = [ row[0] for row in cursor.fetchall() ]
+        cursor.close()
+        if existing and self._host_column not in existing:
+            raise RuntimeError( "The %s table was created with compact_keys "
+                                "%s.  Change compact_keys back, or rename or "
+                                "drop the table to start a new history."%
+                                (HISTORY_TABLE_NAME,
+                                 "off" if self._compact_keys else "on"))
+
+    def _new_history_table(self):
+        '''
+        Create the history table (if it doesn't already exist).  It's
+        partitioned by day on Update_Time (Unix seconds) and the primary key
+        keeps each LUN's samples together, so reading one LUN's history for
+        a time range only touches those days' partitions.
+
+        An existing history table is kept.  (See _check_history_table().)
+        '''
+
+        self._check_history_table()
+        if self._compact_keys:
+            host_def = "Host_Id SMALLINT UNSIGNED NOT NULL, "
+        else:
+            host_def = "Hostname VARCHAR(75) NOT NULL, "
+        table_def = \
+        "CREATE TABLE IF NOT EXISTS " + HISTORY_TABLE_NAME + " (" + host_def + \
+        "Update_Time INT UNSIGNED NOT NULL, " \
+        "Disk_Num SMALLINT UNSIGNED NOT NULL, "  \
+        "Transfer_Bytes BIGINT UNSIGNED, " \
+        "Read_Bytes BIGINT UNSIGNED, Write_Bytes BIGINT UNSIGNED, " \
+        "Forwarded_Bytes BIGINT UNSIGNED, " \
+        "Total_IOs BIGINT UNSIGNED, "  \
+        "Read_IOs BIGINT UNSIGNED, Write_IOs BIGINT UNSIGNED, "  \
+        "Forwarded_IOs BIGINT UNSIGNED, "  \
+        "Pool_State INT, " \
+        "PRIMARY KEY (" + self._host_column + ", Disk_Num, Update_Time) )" \
+        "ENGINE=InnoDB " \
+        "PARTITION BY RANGE (Update_Time) ("
+        today = int(time.time()) // 86400
+        partitions = [ ]
+        for day in range( today, today + HISTORY_PARTITIONS_AHEAD + 1):
+            partitions.append( "PARTITION %s VALUES LESS THAN (%d)"%
+                               (_partition_name( day), (day + 1) * 86400))
+        table_def += ", ".join( partitions) + ");"
+
+        self._query_exec( table_def)
+
     def _new_lun_table(self):
         '''
         Create the db table that holds processed statistics on all the luns
@@ -428,13 +916,16 @@ class SFAMySqlDb(object):
         "Transfer_BW FLOAT, Read_BW FLOAT, Write_BW FLOAT, " \
         "READ_IOPS FLOAT, WRITE_IOPS FLOAT, "  \
         "Forwarded_BW FLOAT, FORWARDED_IOPS FLOAT, " \
-        "Pool_State INT, " \
+        "Pool_State INT, "
+        for column in self._window_columns:
+            table_def += column + " FLOAT, "
+        table_def += \
         "CONSTRAINT unique_disk UNIQUE (Hostname, Disk_Num), "  \
         "INDEX( Hostname), INDEX( Disk_Num) )"  \
         "ENGINE=HEAP" \
         ";"
 
-        self._query_exec( table_def)
+        self._create_table( "LUN_TABLE_NAME", table_def)
         
     def _new_raw_lun_table(self):
         '''
@@ -457,7 +948,7 @@ class SFAMySqlDb(object):
         "ENGINE=HEAP" \
         ";"
 
-        self._query_exec( table_def)
+        self._create_table( "RAW_LUN_TABLE_NAME", table_def)
 
     def _new_dd_table(self):
         '''
@@ -476,7 +967,7 @@ class SFAMySqlDb(object):
         "ENGINE=HEAP" \
         ";"
 
-        self._query_exec( table_def)
+        self._create_table( "DISK_TABLE_NAME", table_def)
 
 # Virtual disk request size and latency tables
     def _new_lun_read_request_size_table( self):
@@ -489,7 +980,7 @@ class SFAMySqlDb(object):
         " " + PARTIAL_SIZE_TABLE_DEF
         table_def = table_def.replace( 'Disk_Num', 'LUN')
 
-        self._query_exec( table_def)
+        self._create_table( "LUN_READ_REQUEST_SIZE_TABLE_NAME", table_def)
 
     def _new_lun_write_request_size_table( self):
         '''
@@ -501,7 +992,7 @@ class SFAMySqlDb(object):
         " " + PARTIAL_SIZE_TABLE_DEF
         table_def = table_def.replace( 'Disk_Num', 'LUN')
 
-        self._query_exec( table_def)
+        self._create_table( "LUN_WRITE_REQUEST_SIZE_TABLE_NAME", table_def)
 
     def _new_lun_read_request_latency_table( self, new_latency_table):
         '''
@@ -517,7 +1008,7 @@ class SFAMySqlDb(object):
         
         table_def = table_def.replace( 'Disk_Num', 'LUN')
 
-        self._query_exec( table_def)
+        self._create_table( "LUN_READ_REQUEST_LATENCY_TABLE_NAME", table_def)
 
     def _new_lun_write_request_latency_table( self, new_latency_table):
         '''
@@ -533,7 +1024,27 @@ class SFAMySqlDb(object):
     
         table_def = table_def.replace( 'Disk_Num', 'LUN')
 
-        self._query_exec( table_def)
+        self._create_table( "LUN_WRITE_REQUEST_LATENCY_TABLE_NAME", table_def)
+
+    def _new_lun_request_summary_table( self):
+        '''
+        Create the db table that holds the latency percentiles and mean request
+        sizes estimated from the virtual disk request size & latency histograms.
+        '''
+
+        table_def = \
+        "CREATE TABLE " + TABLE_NAMES["LUN_REQUEST_SUMMARY_TABLE_NAME"] + " "  \
+        "(Hostname VARCHAR(75) NOT NULL, LastUpdate TIMESTAMP, " \
+        "LUN SMALLINT UNSIGNED NOT NULL, "  \
+        "Read_P50_ms FLOAT, Read_P90_ms FLOAT, Read_P99_ms FLOAT, " \
+        "Write_P50_ms FLOAT, Write_P90_ms FLOAT, Write_P99_ms FLOAT, " \
+        "Read_Mean_Size FLOAT, Write_Mean_Size FLOAT, " \
+        "CONSTRAINT unique_disk UNIQUE (Hostname, LUN), "  \
+        "INDEX( Hostname), INDEX( LUN) )"  \
+        "ENGINE=HEAP" \
+        ";"
+
+        self._create_table( "LUN_REQUEST_SUMMARY_TABLE_NAME", table_def)
 
     # Disk drive request size and latency tables
     def _new_dd_read_request_size_table( self):
@@ -545,7 +1056,7 @@ class SFAMySqlDb(object):
         "CREATE TABLE " + TABLE_NAMES["DD_READ_REQUEST_SIZE_TABLE_NAME"] + \
         " " + PARTIAL_SIZE_TABLE_DEF
 
-        self._query_exec( table_def)
+        self._create_table( "DD_READ_REQUEST_SIZE_TABLE_NAME", table_def)
 
     def _new_dd_write_request_size_table( self):
         '''
@@ -556,7 +1067,7 @@ class SFAMySqlDb(object):
         "CREATE TABLE " + TABLE_NAMES["DD_WRITE_REQUEST_SIZE_TABLE_NAME"] + \
         " " + PARTIAL_SIZE_TABLE_DEF
 
-        self._query_exec( table_def)
+        self._create_table( "DD_WRITE_REQUEST_SIZE_TABLE_NAME", table_def)
 
     def _new_dd_read_request_latency_table( self):
         '''
@@ -567,7 +1078,7 @@ class SFAMySqlDb(object):
         "CREATE TABLE " + TABLE_NAMES["DD_READ_REQUEST_LATENCY_TABLE_NAME"] + \
         " "  + PARTIAL_DD_LATENCY_TABLE_DEF
         
-        self._query_exec( table_def)
+        self._create_table( "DD_READ_REQUEST_LATENCY_TABLE_NAME", table_def)
     
     def _new_dd_write_request_latency_table( self):
         '''
@@ -578,7 +1089,7 @@ class SFAMySqlDb(object):
         "CREATE TABLE " + TABLE_NAMES["DD_WRITE_REQUEST_LATENCY_TABLE_NAME"] + \
         " "  + PARTIAL_DD_LATENCY_TABLE_DEF
         
-        self._query_exec( table_def)
+        self._create_table( "DD_WRITE_REQUEST_LATENCY_TABLE_NAME", table_def)
 
 
 
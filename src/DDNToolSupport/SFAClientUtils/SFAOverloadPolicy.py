@@ -0,0 +1,128 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+# Overload levels.  Each level includes everything from the levels below it.
+LEVEL_NORMAL = 0            # nothing is being shed
+LEVEL_DEFER_SLOW = 1        # skip the slow tier
+LEVEL_DEFER_HISTOGRAMS = 2  # also skip the medium tier request size & latency writes
+LEVEL_STRETCH_FAST = 3      # also skip some of the fast tier iterations
+
+LEVEL_NAMES = {
+    LEVEL_NORMAL : "NORMAL",
+    LEVEL_DEFER_SLOW : "DEFER_SLOW",
+    LEVEL_DEFER_HISTOGRAMS : "DEFER_HISTOGRAMS",
+    LEVEL_STRETCH_FAST : "STRETCH_FAST"
+}
+
+
+class SFAOverloadPolicy(object):
+    '''
+    Decides what work an SFAClient should shed when its iterations take too
+    long.
+
+    The client calls tick_completed() with the duration of every iteration
+    it actually runs.  After escalate_ticks consecutive iterations over the
+    limit, the policy moves up one level.  After recover_ticks consecutive
+    iterations under the limit, it moves back down one level.  (The
+    different counts give us some hysteresis so we don't bounce back and
+    forth between levels.)  Every level change is logged.
+
+    The client asks defer_slow_tier(), defer_histograms() and skip_tick()
+    what to do.  Since each client has its own policy object, only the
+    controllers that are actually falling behind get their fast interval
+    stretched.
+    '''
+
+    def __init__(self, logger, escalate_ticks = 3, recover_ticks = 30,
+                 stretch_multiple = 2):
+        '''
+        escalate_ticks and recover_ticks are described above.  When the
+        fast interval is stretched, only one of every stretch_multiple
+        iterations is run.
+        '''
+        self.logger = logger
+        self.escalate_ticks = escalate_ticks
+        self.recover_ticks = recover_ticks
+        self.stretch_multiple = stretch_multiple
+
+        self._level = LEVEL_NORMAL
+        self._over_count = 0    # consecutive iterations over the limit
+        self._under_count = 0   # consecutive iterations under the limit
+        self._skip_count = 0    # used by skip_tick()
+
+    @property
+    def level(self):
+        return self._level
+
+    def tick_completed(self, duration, limit):
+        '''
+        Records the duration (in seconds) of one iteration and updates the
+        level if necessary.  limit is the longest an iteration should take.
+        '''
+        if duration > limit:
+            self._over_count += 1
+            self._under_count = 0
+            if self._over_count >= self.escalate_ticks and \
+               self._level < LEVEL_STRETCH_FAST:
+                self._set_level( self._level + 1, duration, limit)
+                self._over_count = 0
+        else:
+            self._under_count += 1
+            self._over_count = 0
+            if self._under_count >= self.recover_ticks and \
+               self._level > LEVEL_NORMAL:
+                self._set_level( self._level - 1, duration, limit)
+                self._under_count = 0
+
+    def defer_slow_tier(self):
+        '''
+        Returns True if the slow tier should be skipped
+        '''
+        return self._level >= LEVEL_DEFER_SLOW
+
+    def defer_histograms(self):
+        '''
+        Returns True if the medium tier request size & latency updates
+        should be skipped
+        '''
+        return self._level >= LEVEL_DEFER_HISTOGRAMS
+
+    def skip_tick(self):
+        '''
+        Called once for each wake up.  Returns True if this iteration should
+        be skipped entirely.
+        '''
+        if self._level < LEVEL_STRETCH_FAST:
+            self._skip_count = 0
+            return False
+
+        self._skip_count += 1
+        return (self._skip_count % self.stretch_multiple) != 0
+
+    def _set_level(self, new_level, duration, limit):
+        '''
+        Changes the level and logs the transition
+        '''
+        if new_level > self._level:
+            log_func = self.logger.warning
+        else:
+            log_func = self.logger.info
+        log_func( "Overload state changed from %s to %s  (last iteration: "
+                  "%.3f sec  limit: %.3f sec)"%(LEVEL_NAMES[self._level],
+                  LEVEL_NAMES[new_level], duration, limit))
+        self._level = new_level
+        self._skip_count = 0
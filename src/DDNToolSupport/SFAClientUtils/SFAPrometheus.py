@@ -0,0 +1,186 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import logging
+import Queue
+
+# Metric families:  name -> (type, help text)
+# Note: the request size & latency buckets from the controllers are counts
+# for each bucket since the controller booted.  Prometheus histograms want
+# cumulative ('less than or equal') buckets, so we add them up as we go.
+# The controllers don't tell us the sum of the latencies or sizes, so the
+# histograms don't have a _sum series.
+METRIC_FAMILIES = {
+    "ddntool_lun_transfer_bytes_total" : ("counter", "Bytes transferred"),
+    "ddntool_lun_read_bytes_total" : ("counter", "Bytes read"),
+    "ddntool_lun_write_bytes_total" : ("counter", "Bytes written"),
+    "ddntool_lun_forwarded_bytes_total" : ("counter", "Bytes forwarded"),
+    "ddntool_lun_ios_total" : ("counter", "Total I/O requests"),
+    "ddntool_lun_read_ios_total" : ("counter", "Read requests"),
+    "ddntool_lun_write_ios_total" : ("counter", "Write requests"),
+    "ddntool_lun_forwarded_ios_total" : ("counter", "Forwarded requests"),
+    "ddntool_lun_pool_state" : ("gauge", "Health state of the LUN's storage pool"),
+    "ddntool_lun_read_request_size_bytes" : ("histogram", "Read request sizes"),
+    "ddntool_lun_write_request_size_bytes" : ("histogram", "Write request sizes"),
+    "ddntool_lun_read_latency_seconds" : ("histogram", "Read request latencies"),
+    "ddntool_lun_write_latency_seconds" : ("histogram", "Write request latencies"),
+    "ddntool_collector_iteration_seconds" : ("gauge", "Duration of the last fast iteration"),
+    "ddntool_collector_iterations_total" : ("counter", "Fast iterations completed"),
+    "ddntool_collector_overload_level" : ("gauge", "Current load shedding level (0 is normal)"),
+    "ddntool_collector_last_update_timestamp_seconds" : ("gauge", "Update time of the last fast iteration")
+}
+
+# Counters in the same order as the arguments to update_lun_series()
+_LUN_COUNTER_NAMES = [ "ddntool_lun_transfer_bytes_total",
+                       "ddntool_lun_read_bytes_total",
+                       "ddntool_lun_write_bytes_total",
+                       "ddntool_lun_forwarded_bytes_total",
+                       "ddntool_lun_ios_total",
+                       "ddntool_lun_read_ios_total",
+                       "ddntool_lun_write_ios_total",
+                       "ddntool_lun_forwarded_ios_total" ]
+
+# Multipliers to convert the bucket label units to seconds and bytes
+_UNITS = { 'ms' : 0.001, 's' : 1.0, 'KiB' : 1024, 'MiB' : 1024 * 1024 }
+
+
+def bucket_bounds( labels):
+    '''
+    Converts bucket labels ('<=4ms', ..., '>4s') to the strings Prometheus
+    wants for the 'le' label ('0.004', ..., '+Inf')
+    '''
+    bounds = [ ]
+    for label in labels:
+        if label.startswith( '>'):
+            bounds.append( '+Inf')
+            continue
+        value = label.lstrip( '<=')
+        for (unit, multiplier) in _UNITS.items():
+            number = value[:-len(unit)]
+            if value.endswith( unit) and number.isdigit():
+                bounds.append( '%.15g'%(float( number) * multiplier))
+                break
+        else:
+            raise ValueError( "Can't parse histogram bucket label '%s'"%label)
+    if bounds[-1] != '+Inf':
+        bounds.append( '+Inf')  # Prometheus requires a +Inf bucket
+    return bounds
+
+
+class SFAPrometheus(object):
+    '''
+    The Prometheus 'database'.  Has the same sort of interface as SFAMySqlDb
+    and SFAInfluxDb, but instead of sending anything over the network, it
+    formats the samples and flush_to_db() sends them to the main process
+    on the snapshot queue.  The main process merges the output from all the
+    controllers and serves it on the /metrics port.  (See
+    DDNToolSupport.status_server.MetricsCache.)
+
+    All the formatting happens here, once per iteration, so the cost of a
+    scrape doesn't depend on the number of scrapers.
+    '''
+
+    def __init__(self, sfa_host_name, snapshot_queue, latency_labels, size_labels):
+        '''
+        latency_labels and size_labels are the (firmware specific) bucket
+        labels that SFAClient._check_labels() verified.
+        '''
+        self.logger = logging.getLogger( 'DDNTool_SFAPrometheus')
+        self.logger.debug( 'Creating instance of SFAPrometheus')
+
+        self._host = sfa_host_name
+        self._queue = snapshot_queue
+        self._latency_bounds = bucket_bounds( latency_labels)
+        self._size_bounds = bucket_bounds( size_labels)
+        self._samples = { }     # family name -> list of formatted lines
+
+    def _add(self, family, labels, value):
+        '''
+        Formats one sample.  labels is a string of extra labels (may be
+        empty) that goes after the host label.
+        '''
+        self._samples.setdefault( family, [ ]).append(
+                '%s{sfa_host="%s"%s} %s'%(family, self._host, labels, value))
+
+    def _add_histogram(self, family, lun_num, bounds, buckets):
+        name = family + '_bucket'
+        lines = self._samples.setdefault( family, [ ])
+        total = 0
+        for (bound, count) in zip( bounds, buckets):
+            total += count
+            lines.append( '%s{sfa_host="%s",lun="%d",le="%s"} %d'%
+                          (name, self._host, lun_num, bound, total))
+        if len(bounds) > len(buckets):
+            # no open-ended bucket in the labels; add the +Inf one
+            lines.append( '%s{sfa_host="%s",lun="%d",le="+Inf"} %d'%
+                          (name, self._host, lun_num, total))
+        lines.append( '%s_count{sfa_host="%s",lun="%d"} %d'%
+                      (family, self._host, lun_num, total))
+
+    def update_lun_series(self, lun_num, transfer_bytes, read_bytes,
+                          write_bytes, forwarded_bytes, total_ios, read_ios,
+                          write_ios, forwarded_ios, pool_state):
+        '''
+        Queues up the raw counters and pool state for one LUN
+        '''
+        lun_label = ',lun="%d"'%lun_num
+        for (family, value) in zip( _LUN_COUNTER_NAMES,
+                                    (transfer_bytes, read_bytes, write_bytes,
+                                     forwarded_bytes, total_ios, read_ios,
+                                     write_ios, forwarded_ios)):
+            self._add( family, lun_label, value)
+        self._add( "ddntool_lun_pool_state", lun_label, pool_state)
+
+    def update_lun_request_size_series(self, lun_num, read_series, size_buckets):
+        if read_series:
+            family = "ddntool_lun_read_request_size_bytes"
+        else:
+            family = "ddntool_lun_write_request_size_bytes"
+        self._add_histogram( family, lun_num, self._size_bounds, size_buckets)
+
+    def update_lun_request_latency_series(self, lun_num, read_series, latency_buckets):
+        if read_series:
+            family = "ddntool_lun_read_latency_seconds"
+        else:
+            family = "ddntool_lun_write_latency_seconds"
+        self._add_histogram( family, lun_num, self._latency_bounds, latency_buckets)
+
+    def update_self_metrics(self, update_time, iteration_seconds, iterations,
+                            overload_level):
+        '''
+        Queues up the collector's own metrics
+        '''
+        self._add( "ddntool_collector_iteration_seconds", '', iteration_seconds)
+        self._add( "ddntool_collector_iterations_total", '', iterations)
+        self._add( "ddntool_collector_overload_level", '', overload_level)
+        self._add( "ddntool_collector_last_update_timestamp_seconds", '', update_time)
+
+    def flush_to_db(self):
+        '''
+        Sends everything that's been queued up to the main process.  If the
+        queue is full, this iteration's samples are dropped.  (The next
+        ones replace them anyway.)
+        '''
+        families = [ ]
+        for (name, lines) in self._samples.items():
+            (metric_type, help_text) = METRIC_FAMILIES[name]
+            families.append( (name, metric_type, help_text, lines))
+        self._samples = { }
+
+        try:
+            self._queue.put_nowait( ('metrics', self._host, families))
+        except Queue.Full:
+            self.logger.debug( "Snapshot queue is full.  Dropping metrics.")
@@ -0,0 +1,138 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import collections
+import time
+
+from SFATimeSeries import EmptyTimeSeriesException
+
+# Number of checkpoints we keep for each window.  The rates are accurate to
+# within about 1/DEFAULT_SLOTS of the window length.
+DEFAULT_SLOTS = 30
+
+
+def window_suffix( window):
+    '''
+    Returns the suffix used for the database column & field names for a
+    window of the given length (in seconds).  For example, 300 -> '5m'
+    '''
+    if window % 60 == 0:
+        return '%dm'%(window / 60)
+    return '%ds'%window
+
+
+def parse_rate_windows( config):
+    '''
+    Reads the (optional) rate_windows option from the polling section of
+    the config file.  Returns a sorted tuple of window lengths in seconds,
+    or an empty tuple if the option isn't there.
+
+    Both DDNTool (when it creates the database tables) and SFAClient call
+    this, so they always agree on the column names.
+    '''
+    if not config.has_option('polling', 'rate_windows'):
+        return ( )
+
+    windows = set()
+    for item in config.get('polling', 'rate_windows').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        window = int( item)
+        if window <= 0:
+            raise ValueError( "rate_windows values must be positive (got %d)"%window)
+        windows.add( window)
+    return tuple( sorted( windows))
+
+
+class SFARateWindows(object):
+    '''
+    Computes the average rate of change of a counter over several windows
+    (1, 5 and 15 minutes, for example) without keeping every sample.
+
+    SFATimeSeries keeps every sample, which is fine for a few minutes but
+    gets expensive for long windows.  This class only keeps a checkpoint
+    every window/slots seconds for each window, so memory is bounded by
+    slots * len(windows) no matter how often append() is called.  Each
+    append() and rate() call only touches the ends of the checkpoint queues,
+    so nothing is rescanned.
+
+    Like SFATimeSeries, the values are expected to be counters that only go
+    up.  If a value goes down (the controller was rebooted and the counters
+    were reset) the checkpoints are thrown away and we start over.
+    '''
+
+    def __init__(self, windows, slots = DEFAULT_SLOTS):
+        '''
+        windows is a sequence of window lengths in seconds.
+        '''
+        self._windows = tuple( windows)
+        self._steps = { }
+        self._checkpoints = { }
+        for window in self._windows:
+            self._steps[window] = float(window) / slots
+            self._checkpoints[window] = collections.deque()
+        self._last = None   # most recent (value, timestamp)
+
+    def append(self, value, timestamp = None):
+        '''
+        Adds one value.  timestamp defaults to the current time.
+        '''
+        if timestamp is None:
+            timestamp = time.time()
+
+        if self._last is not None and value < self._last[0]:
+            # counter reset
+            for checkpoints in self._checkpoints.values():
+                checkpoints.clear()
+
+        self._last = (value, timestamp)
+        for window in self._windows:
+            checkpoints = self._checkpoints[window]
+            if not checkpoints or \
+               (timestamp - checkpoints[-1][1]) >= self._steps[window]:
+                checkpoints.append( self._last)
+
+            # Drop checkpoints that have fallen out of the window, but keep
+            # the newest one that's at or before the start of the window
+            while len(checkpoints) > 1 and \
+                  checkpoints[1][1] <= (timestamp - window):
+                checkpoints.popleft()
+
+    def rate(self, window):
+        '''
+        Returns a tuple of the average rate (per second) over the requested
+        window and the actual span in seconds it covered.  The span will be
+        shorter than the window until we've been running for that long.
+
+        window must be one of the windows passed to the constructor.
+        Raises EmptyTimeSeriesException if we don't have enough values yet.
+        '''
+        checkpoints = self._checkpoints[window]
+        if not checkpoints or self._last is None:
+            raise EmptyTimeSeriesException()
+
+        (first_value, first_time) = checkpoints[0]
+        span = self._last[1] - first_time
+        if span <= 0:
+            raise EmptyTimeSeriesException()
+        return ((self._last[0] - first_value) / span, span)
+
+    def size(self):
+        '''
+        Returns the total number of checkpoints being stored
+        '''
+        return sum( [len(c) for c in self._checkpoints.values()])
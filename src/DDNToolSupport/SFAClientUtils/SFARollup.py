@@ -0,0 +1,162 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Round-robin style history with several resolutions.
+
+Each series is stored in a few tiers.  The finest tier holds every sample
+for a short time and the coarser tiers hold consolidated values (average,
+max and last) for longer and longer periods.  All the storage is allocated
+up front in fixed size arrays, so memory use never grows.
+'''
+
+import array
+import time
+
+# (step in seconds, number of rows) for each tier, finest first:
+# 2 seconds for 10 minutes, 1 minute for 24 hours and 10 minutes for 30 days
+DEFAULT_TIERS = ((2, 300), (60, 1440), (600, 4320))
+
+CONSOLIDATION_FUNCTIONS = ('avg', 'max', 'last')
+
+
+class RollupTier(object):
+    '''
+    One resolution of one series.  Row n holds the consolidated values for
+    the n'th step-sized bucket (modulo the number of rows).  A row is
+    recycled the first time a value lands in it for a newer bucket.
+    '''
+
+    def __init__(self, step, rows):
+        self.step = step
+        self.rows = rows
+
+        # Start time of the bucket each row holds (-1 means empty)
+        self._start = array.array( 'd', [-1.0]) * rows
+        self._sum = array.array( 'd', [0.0]) * rows
+        self._count = array.array( 'd', [0.0]) * rows
+        self._max = array.array( 'd', [0.0]) * rows
+        self._last = array.array( 'd', [0.0]) * rows
+
+    def retention(self):
+        '''
+        Returns how far back (in seconds) this tier goes
+        '''
+        return self.step * self.rows
+
+    def add(self, value, timestamp):
+        bucket = int( timestamp // self.step)
+        row = bucket % self.rows
+        start = float( bucket * self.step)
+        if self._start[row] != start:
+            self._start[row] = start
+            self._sum[row] = value
+            self._count[row] = 1
+            self._max[row] = value
+        else:
+            self._sum[row] += value
+            self._count[row] += 1
+            if value > self._max[row]:
+                self._max[row] = value
+        self._last[row] = value
+
+    def fetch(self, start, end, cf):
+        '''
+        Returns a list of (bucket start time, value) tuples for the buckets
+        between start and end (inclusive).  Empty buckets are left out.
+        cf is one of CONSOLIDATION_FUNCTIONS.
+        '''
+        results = [ ]
+        first = int( start // self.step)
+        last = int( end // self.step)
+        # Never walk around the ring more than once
+        first = max( first, last - self.rows + 1)
+        for bucket in xrange( first, last + 1):
+            row = bucket % self.rows
+            bucket_start = float( bucket * self.step)
+            if self._start[row] != bucket_start:
+                continue
+            if cf == 'avg':
+                value = self._sum[row] / self._count[row]
+            elif cf == 'max':
+                value = self._max[row]
+            elif cf == 'last':
+                value = self._last[row]
+            else:
+                raise ValueError( "Unknown consolidation function '%s'"%cf)
+            results.append( (bucket_start, value))
+        return results
+
+
+class SFARollup(object):
+    '''
+    Multi-resolution history for a set of named series.  (The main process
+    keeps one of these for each controller's LUN rates.  See
+    status_server.HistoryCache.)
+
+    Every value is added to every tier, so the coarse tiers are always up
+    to date.  query() picks the finest tier that still covers the requested
+    start time.
+    '''
+
+    def __init__(self, series_names, tiers = DEFAULT_TIERS):
+        '''
+        tiers is a sequence of (step, rows) tuples, finest first.
+        '''
+        self._tiers = { }
+        for name in series_names:
+            self._tiers[name] = [ RollupTier( step, rows) for (step, rows) in tiers ]
+
+    def series_names(self):
+        return self._tiers.keys()
+
+    def add(self, name, value, timestamp = None):
+        '''
+        Adds one value to the named series.  timestamp defaults to now.
+        '''
+        if timestamp is None:
+            timestamp = time.time()
+        for tier in self._tiers[name]:
+            tier.add( value, timestamp)
+
+    def pick_tier(self, name, start, now = None):
+        '''
+        Returns the finest tier of the named series that goes back as far as
+        start.  (If none of them do, returns the coarsest.)
+        '''
+        if now is None:
+            now = time.time()
+        tiers = self._tiers[name]
+        for tier in tiers:
+            if (now - start) <= tier.retention():
+                return tier
+        return tiers[-1]
+
+    def query(self, name, start, end = None, cf = 'avg'):
+        '''
+        Returns a tuple of the step size that was used and a list of
+        (time, value) tuples for the named series between start and end
+        (default is now).  The tier is picked automatically: a query for
+        the last 5 minutes gets the 2 second samples while one for the last
+        week gets 10 minute consolidations.
+        '''
+        if cf not in CONSOLIDATION_FUNCTIONS:
+            raise ValueError( "Unknown consolidation function '%s'"%cf)
+        now = time.time()
+        if end is None:
+            end = now
+        tier = self.pick_tier( name, start, now)
+        return (tier.step, tier.fetch( start, end, cf))
@@ -0,0 +1,528 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+The output side of SFAClient.
+
+Once per tier per iteration, SFAClient builds one immutable record (see
+FastRecord, MediumRecord and SlowRecord below) with everything the outputs
+need:  the raw counters, rates, pool states, request size & latency
+histograms and so on.  Everything in it is computed exactly once, no matter
+how many outputs there are.  Each output is an SFASink that declares which
+tiers it wants (its tiers attribute) and receives the records for those
+tiers.
+
+The databases, the Prometheus and JSON endpoints and the local archive
+are all sinks.  Other sinks can be added without touching SFAClient: put a
+section like this in the config file
+
+    [sink:my_output]
+    class = mypackage.mymodule.MySink
+    some_option = 42
+
+and SFAClient will create one MySink( host_name, options) per controller
+process, where options is a dictionary of the section's options (all
+strings).  MySink should derive from SFASink and override whichever of
+fast(), medium(), slow(), events() and drives() match its tiers.
+
+The events tier is only produced if anomaly detection is turned on (see
+SFAAnomaly).  Its records hold whatever the detector noticed since the
+previous iteration.
+
+The drives tier is only produced if the drive_stats section is in the
+config file.  The drive sampler visits a few disk drives per iteration (see
+SFADriveSampler) and a DriveRecord is sent whenever a batch of them is
+ready.
+'''
+
+import collections
+import importlib
+import logging
+import Queue
+
+from SFAArchive import ArchiveFormatError
+from SFARateWindows import window_suffix
+
+# Tier names (the values of each record's tier field)
+FAST = 'fast'
+MEDIUM = 'medium'
+SLOW = 'slow'
+EVENTS = 'events'
+DRIVES = 'drives'
+
+# Config file sections that define plugin sinks start with this
+SINK_SECTION_PREFIX = 'sink:'
+
+# Key names for the rates and raw counters in the status snapshots.  They're
+# in the same order as LunRecord.rates and LunRecord.raw.
+SNAPSHOT_RATE_NAMES = [ 'transfer_bw', 'read_bw', 'write_bw', 'read_iops',
+                        'write_iops', 'forwarded_bw', 'forwarded_iops' ]
+SNAPSHOT_RAW_NAMES = [ 'transfer_bytes', 'read_bytes', 'write_bytes',
+                       'forwarded_bytes', 'total_ios', 'read_ios', 'write_ios',
+                       'forwarded_ios' ]
+
+# The raw counter (index into SNAPSHOT_RAW_NAMES) behind each of the rates
+# in SNAPSHOT_RATE_NAMES
+RATE_RAW_INDEXES = [ 0, 1, 2, 5, 6, 3, 7 ]
+
+# The request size & latency buckets for one LUN (or disk drive).  The field
+# names match the SFAVirtualDiskStatistics (and SFADiskDriveStatistics)
+# attributes they come from.
+LunHistograms = collections.namedtuple( 'LunHistograms',
+        [ 'ReadIOSizeBuckets', 'WriteIOSizeBuckets',
+          'ReadIOLatencyBuckets', 'WriteIOLatencyBuckets' ])
+
+# One LUN in a FastRecord:
+#   raw:  tuple of the raw counters (see SNAPSHOT_RAW_NAMES)
+#   pool_state:  state of the LUN's storage pool (255 if unknown)
+#   rates:  tuple of the 60 second average rates (see SNAPSHOT_RATE_NAMES),
+#           or None if there's not enough data yet
+#   window_rates:  one tuple of rates for each of the rate_windows (an empty
+#                  tuple if there aren't any), or None if there's not enough
+#                  data yet.  (That includes right after a counter reset,
+#                  when rates can already have a value again.)
+#   histograms:  a LunHistograms
+LunRecord = collections.namedtuple( 'LunRecord',
+        [ 'lun_num', 'raw', 'pool_state', 'rates', 'window_rates', 'histograms' ])
+
+# One LUN in a MediumRecord.  summary is the request summary tuple (see
+# SFAHistogram.SFARequestSummary.update()), or None if request summaries
+# are turned off.
+MediumLunRecord = collections.namedtuple( 'MediumLunRecord',
+        [ 'lun_num', 'histograms', 'summary' ])
+
+# SFAClient's own stats
+CollectorStats = collections.namedtuple( 'CollectorStats',
+        [ 'iteration_seconds', 'iterations', 'overload_level',
+          'fast_poll_interval' ])
+
+# The records.  luns is a tuple sorted by LUN number.  Note: the iteration
+# time and count in collector are from the previous iteration since the
+# current one isn't finished yet.  sample_time is when the counters were
+# actually read (see SFAClient._fast_poll_tasks()).  update_time is the
+# time stamp for the database rows, which is the same for every controller.
+FastRecord = collections.namedtuple( 'FastRecord',
+        [ 'tier', 'host', 'update_time', 'luns', 'collector', 'sample_time' ])
+MediumRecord = collections.namedtuple( 'MediumRecord',
+        [ 'tier', 'host', 'update_time', 'luns' ])
+SlowRecord = collections.namedtuple( 'SlowRecord',
+        [ 'tier', 'host', 'update_time' ])
+
+# The events (see SFAAnomaly).  An AnomalyEvent is sent when one of a LUN's
+# metrics crosses the z-score threshold (active is True) and again when it
+# drops back under it (active is False).  mean and stddev are the moving
+# averages the value was compared to.
+AnomalyEvent = collections.namedtuple( 'AnomalyEvent',
+        [ 'lun_num', 'metric', 'active', 'value', 'mean', 'stddev', 'zscore' ])
+PoolStateEvent = collections.namedtuple( 'PoolStateEvent',
+        [ 'lun_num', 'old_state', 'new_state' ])
+
+# events is a tuple of AnomalyEvents and PoolStateEvents in the order they
+# happened.  Only sent if there's at least one.
+EventRecord = collections.namedtuple( 'EventRecord',
+        [ 'tier', 'host', 'update_time', 'events' ])
+
+# One disk drive in a DriveRecord.  The drives in a batch were sampled over
+# several iterations, so each has its own update_time.
+#   histograms:  a LunHistograms
+#   rates:  (transfer bandwidth, read iops, write iops) since the previous
+#           visit to this drive, or None if there isn't one (or the counters
+#           went backwards)
+DriveStatsRecord = collections.namedtuple( 'DriveStatsRecord',
+        [ 'drive_num', 'update_time', 'histograms', 'rates' ])
+
+# drives is a tuple of DriveStatsRecords in the order they were sampled
+DriveRecord = collections.namedtuple( 'DriveRecord',
+        [ 'tier', 'host', 'update_time', 'drives' ])
+
+
+def lun_histograms( stats):
+    '''
+    Copies the request size & latency buckets out of an
+    SFAVirtualDiskStatistics object (or anything with the same attributes)
+    as tuples of plain ints
+    '''
+    return LunHistograms( tuple( map( int, stats.ReadIOSizeBuckets)),
+                          tuple( map( int, stats.WriteIOSizeBuckets)),
+                          tuple( map( int, stats.ReadIOLatencyBuckets)),
+                          tuple( map( int, stats.WriteIOLatencyBuckets)))
+
+
+def load_sink_class( dotted_name):
+    '''
+    Imports and returns a sink class from its full dotted name
+    ('package.module.ClassName')
+    '''
+    (module_name, dot, class_name) = dotted_name.rpartition( '.')
+    if not dot:
+        raise ValueError( "Sink class '%s' must include its module name"%dotted_name)
+    return getattr( importlib.import_module( module_name), class_name)
+
+
+class SFASink(object):
+    '''
+    Base class for the outputs.  Subclasses set tiers and override fast(),
+    medium(), slow(), events() and/or drives().
+    
+    If background_tiers is turned on, a second instance of every sink that
+    wants the medium or slow tier is created for the background thread, and
+    each instance only gets the records for its own thread.
+    '''
+    
+    tiers = (FAST, )
+    
+    def write(self, record):
+        '''
+        Hands a record to fast(), medium(), slow(), events() or drives()
+        '''
+        if record.tier == FAST:
+            self.fast( record)
+        elif record.tier == MEDIUM:
+            self.medium( record)
+        elif record.tier == EVENTS:
+            self.events( record)
+        elif record.tier == DRIVES:
+            self.drives( record)
+        else:
+            self.slow( record)
+    
+    def begin_tick(self):
+        '''
+        Called at the start of each iteration, before any records
+        '''
+        pass
+    
+    def end_tick(self):
+        '''
+        Called after the last record of each iteration
+        '''
+        pass
+    
+    def fast(self, record):
+        pass
+    
+    def medium(self, record):
+        pass
+    
+    def slow(self, record):
+        pass
+    
+    def events(self, record):
+        pass
+    
+    def drives(self, record):
+        pass
+    
+    def close(self):
+        '''
+        Called once when the process (or background thread) shuts down
+        '''
+        pass
+
+
+class SqlDbSink(SFASink):
+    '''
+    Writes to the SQL database (an SFAMySqlDb object).  Each iteration is
+    one transaction, but only for the InnoDB tables.  (See
+    SFAMySqlDb.begin_tick().)
+    
+    should_write is SFAClient._should_write() (the change filter).  (The
+    disk drive stats aren't filtered:  each drive is only sampled every few
+    minutes anyway.)
+    '''
+    
+    tiers = (FAST, MEDIUM, SLOW, DRIVES)
+    
+    def __init__(self, sqldb, should_write):
+        self._sqldb = sqldb
+        self._should_write = should_write
+    
+    def begin_tick(self):
+        self._sqldb.begin_tick()
+    
+    def end_tick(self):
+        self._sqldb.end_tick()
+    
+    def fast(self, record):
+        host = record.host
+        update_time = record.update_time
+        for lun in record.luns:
+            # The window rates can be missing when the 60 second ones
+            # aren't (after a counter reset, for example).  Their columns
+            # are left NULL.
+            if lun.rates is not None:
+                values = lun.rates + (lun.pool_state, )
+                if self._should_write( 'sql_lun', lun.lun_num,
+                                       (values, lun.window_rates), update_time):
+                    self._sqldb.update_lun_table( host, update_time,
+                                                  lun.lun_num, *values,
+                                                  window_rates = lun.window_rates)
+            
+            values = lun.raw + (lun.pool_state, )
+            if self._should_write( 'sql_raw_lun', lun.lun_num, values, update_time):
+                self._sqldb.update_raw_lun_table( host, update_time,
+                                                  lun.lun_num, *values)
+            
+            # The history isn't affected by the change filter.  (It does its
+            # own thinning.  See SFAMySqlDb.add_lun_history().)
+            self._sqldb.add_lun_history( host, update_time, lun.lun_num, *values)
+        
+        self._sqldb.flush_history()
+    
+    def medium(self, record):
+        host = record.host
+        update_time = record.update_time
+        for lun in record.luns:
+            h = lun.histograms
+            lun_num = lun.lun_num
+            if self._should_write( 'sql_read_size', lun_num, h.ReadIOSizeBuckets, update_time):
+                self._sqldb.update_lun_request_size_table( host, update_time,
+                        lun_num, True, h.ReadIOSizeBuckets)
+            if self._should_write( 'sql_write_size', lun_num, h.WriteIOSizeBuckets, update_time):
+                self._sqldb.update_lun_request_size_table( host, update_time,
+                        lun_num, False, h.WriteIOSizeBuckets)
+            if self._should_write( 'sql_read_latency', lun_num, h.ReadIOLatencyBuckets, update_time):
+                self._sqldb.update_lun_request_latency_table( host, update_time,
+                        lun_num, True, h.ReadIOLatencyBuckets)
+            if self._should_write( 'sql_write_latency', lun_num, h.WriteIOLatencyBuckets, update_time):
+                self._sqldb.update_lun_request_latency_table( host, update_time,
+                        lun_num, False, h.WriteIOLatencyBuckets)
+            if lun.summary is not None and \
+               self._should_write( 'sql_summary', lun_num, lun.summary, update_time):
+                self._sqldb.update_lun_request_summary_table( host, update_time,
+                        lun_num, *lun.summary)
+    
+    def drives(self, record):
+        host = record.host
+        for drive in record.drives:
+            h = drive.histograms
+            self._sqldb.update_dd_request_size_table( host, drive.update_time,
+                    drive.drive_num, True, h.ReadIOSizeBuckets)
+            self._sqldb.update_dd_request_size_table( host, drive.update_time,
+                    drive.drive_num, False, h.WriteIOSizeBuckets)
+            self._sqldb.update_dd_request_latency_table( host, drive.update_time,
+                    drive.drive_num, True, h.ReadIOLatencyBuckets)
+            self._sqldb.update_dd_request_latency_table( host, drive.update_time,
+                    drive.drive_num, False, h.WriteIOLatencyBuckets)
+            if drive.rates is not None:
+                self._sqldb.update_dd_table( host, drive.update_time,
+                                             drive.drive_num, *drive.rates)
+    
+    def close(self):
+        self._sqldb.flush_history( True)
+
+
+class TsDbSink(SFASink):
+    '''
+    Writes to the time series database (an SFAInfluxDb object).  Everything
+    from one iteration is sent in a single flush.
+    '''
+    
+    tiers = (FAST, MEDIUM, SLOW)
+    
+    def __init__(self, tsdb, should_write):
+        self._tsdb = tsdb
+        self._should_write = should_write
+    
+    def end_tick(self):
+        self._tsdb.flush_to_db()
+    
+    def fast(self, record):
+        for lun in record.luns:
+            values = lun.raw + (lun.pool_state, )
+            if self._should_write( 'tsdb_lun', lun.lun_num,
+                                   (values, lun.window_rates), record.update_time):
+                self._tsdb.update_lun_series( record.host, record.update_time,
+                                              lun.lun_num, *values,
+                                              window_rates = lun.window_rates)
+    
+    def medium(self, record):
+        host = record.host
+        update_time = record.update_time
+        for lun in record.luns:
+            h = lun.histograms
+            lun_num = lun.lun_num
+            if self._should_write( 'tsdb_read_size', lun_num, h.ReadIOSizeBuckets, update_time):
+                self._tsdb.update_lun_request_size_series( host, update_time,
+                        lun_num, True, h.ReadIOSizeBuckets)
+            if self._should_write( 'tsdb_write_size', lun_num, h.WriteIOSizeBuckets, update_time):
+                self._tsdb.update_lun_request_size_series( host, update_time,
+                        lun_num, False, h.WriteIOSizeBuckets)
+            if self._should_write( 'tsdb_read_latency', lun_num, h.ReadIOLatencyBuckets, update_time):
+                self._tsdb.update_lun_request_latency_series( host, update_time,
+                        lun_num, True, h.ReadIOLatencyBuckets)
+            if self._should_write( 'tsdb_write_latency', lun_num, h.WriteIOLatencyBuckets, update_time):
+                self._tsdb.update_lun_request_latency_series( host, update_time,
+                        lun_num, False, h.WriteIOLatencyBuckets)
+            if lun.summary is not None and \
+               self._should_write( 'tsdb_summary', lun_num, lun.summary, update_time):
+                self._tsdb.update_lun_request_summary_series( host, update_time,
+                        lun_num, *lun.summary)
+
+
+class PrometheusSink(SFASink):
+    '''
+    Hands the raw counters, pool states and request size & latency
+    histograms for every LUN (plus our own stats) to an SFAPrometheus
+    object.  Unlike the databases, this isn't filtered by the change filter
+    or done at the medium rate:  Prometheus wants the complete current state
+    on every scrape and the histograms are only formatted, not written
+    anywhere.
+    '''
+    
+    def __init__(self, promdb):
+        self._promdb = promdb
+    
+    def fast(self, record):
+        for lun in record.luns:
+            h = lun.histograms
+            self._promdb.update_lun_series( lun.lun_num,
+                                            *(lun.raw + (lun.pool_state, )))
+            self._promdb.update_lun_request_size_series( lun.lun_num, True,
+                                                         h.ReadIOSizeBuckets)
+            self._promdb.update_lun_request_size_series( lun.lun_num, False,
+                                                         h.WriteIOSizeBuckets)
+            self._promdb.update_lun_request_latency_series( lun.lun_num, True,
+                                                            h.ReadIOLatencyBuckets)
+            self._promdb.update_lun_request_latency_series( lun.lun_num, False,
+                                                            h.WriteIOLatencyBuckets)
+        
+        collector = record.collector
+        self._promdb.update_self_metrics( record.update_time,
+                                          collector.iteration_seconds,
+                                          collector.iterations,
+                                          collector.overload_level)
+        self._promdb.flush_to_db()
+
+
+class ArchiveSink(SFASink):
+    '''
+    Adds the raw counters and pool state for every LUN to the local archive
+    (an SFAArchiveWriter).  The archive buffers them and writes a block at
+    a time.
+    
+    The archive is just a local copy, so errors writing it (disk full, a
+    file from before an upgrade with different columns, etc.) are logged
+    instead of taking the whole process (and the other outputs) down.
+    Whatever couldn't be written is lost.  (See SFAArchiveWriter.)
+    '''
+    
+    def __init__(self, archive):
+        self.logger = logging.getLogger( 'DDNTool_SFASinks')
+        self._archive = archive
+    
+    def fast(self, record):
+        rows = { }
+        for lun in record.luns:
+            rows[lun.lun_num] = lun.raw + (lun.pool_state, )
+        try:
+            self._archive.append( record.update_time, rows)
+        except (EnvironmentError, ArchiveFormatError, ValueError), e:
+            self.logger.error( "Error writing the local archive for %s: %s"%
+                               (record.host, e))
+    
+    def close(self):
+        try:
+            self._archive.close()   # writes out the partial block
+        except (EnvironmentError, ArchiveFormatError, ValueError), e:
+            self.logger.error( "Error writing the local archive: %s"%e)
+
+
+class StatusSink(SFASink):
+    '''
+    Puts a snapshot of the current LUN stats on the snapshot queue for the
+    main process's status server.  The snapshot is a dictionary that gets
+    converted straight to JSON, so it only holds basic types.
+    
+    If the queue is full (the main process isn't keeping up), the snapshot is
+    dropped.  The next one will replace it anyway.
+    '''
+    
+    def __init__(self, snapshot_queue, rate_windows):
+        self.logger = logging.getLogger( 'DDNTool_SFASinks')
+        self._queue = snapshot_queue
+        self._window_names = [ window_suffix( window) for window in rate_windows ]
+    
+    def fast(self, record):
+        luns = { }
+        for lun in record.luns:
+            if lun.rates is None:
+                continue
+            
+            snapshot = dict( zip( SNAPSHOT_RATE_NAMES, lun.rates))
+            snapshot['pool_state'] = lun.pool_state
+            snapshot['raw'] = dict( zip( SNAPSHOT_RAW_NAMES, lun.raw))
+            if lun.window_rates:
+                snapshot['windows'] = { }
+                for (name, values) in zip( self._window_names, lun.window_rates):
+                    snapshot['windows'][name] = dict( zip( SNAPSHOT_RATE_NAMES, values))
+            luns[lun.lun_num] = snapshot
+        
+        snapshot = { 'update_time' : record.update_time,
+                     'fast_poll_interval' : record.collector.fast_poll_interval,
+                     'luns' : luns }
+        try:
+            self._queue.put_nowait( ('status', record.host, snapshot))
+        except Queue.Full:
+            self.logger.debug( "Snapshot queue is full.  Dropping snapshot.")
+
+
+class HistorySink(SFASink):
+    '''
+    Sends the controller-wide rates (the sum over all the LUNs, for each of
+    SNAPSHOT_RATE_NAMES) to the main process over the snapshot queue.  The
+    main process keeps the long term history and serves it.  (See
+    status_server.HistoryCache.)
+    
+    The rates come from the change in each LUN's raw counters since the
+    previous record.  A LUN whose counters went backwards (the controller
+    reset them) or that just showed up is left out of that one sample
+    instead of throwing off the totals.
+    '''
+    
+    def __init__(self, snapshot_queue):
+        self.logger = logging.getLogger( 'DDNTool_SFASinks')
+        self._queue = snapshot_queue
+        self._previous = None   # (sample_time, LUN number -> raw counters)
+    
+    def fast(self, record):
+        counters = dict( [ (lun.lun_num, lun.raw) for lun in record.luns ])
+        previous = self._previous
+        self._previous = (record.sample_time, counters)
+        if previous is None:
+            return
+        (previous_time, previous_counters) = previous
+        elapsed = record.sample_time - previous_time
+        if elapsed <= 0:
+            return
+        
+        totals = [ 0 ] * len(RATE_RAW_INDEXES)
+        for (lun_num, raw) in counters.items():
+            old_raw = previous_counters.get( lun_num)
+            if old_raw is None or \
+               any( new < old for (new, old) in zip( raw, old_raw)):
+                continue
+            for (i, index) in enumerate( RATE_RAW_INDEXES):
+                totals[i] += raw[index] - old_raw[index]
+        
+        rates = dict( zip( SNAPSHOT_RATE_NAMES,
+                           [ total / float(elapsed) for total in totals ]))
+        try:
+            self._queue.put_nowait( ('history', record.host,
+                                     (record.update_time, record.sample_time,
+                                      rates)))
+        except Queue.Full:
+            self.logger.debug( "Snapshot queue is full.  Dropping history sample.")
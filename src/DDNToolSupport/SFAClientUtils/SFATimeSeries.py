@@ -42,11 +42,21 @@ class SFATimeSeries( object):
     
     In truth, if we knew in advance what time spans we'll want to calculate averages
     for, we wouldn't have to keep all the values in between...
+    
+    The exception is when the counters are reset (the controller reboots or
+    fails over) or wrap around.  append() notices when a value goes down and
+    remembers where.  average() then splits the span at those points and
+    only uses the parts where the counter was actually counting up.  Since
+    the resets are found when the values are added, average() is still just
+    a couple of subtractions unless there's a reset inside the span.
     '''
     
     def __init__(self, max_size = None):
         self._series = []
         self._max_size = max_size
+        self._resets = []   # (absolute) indexes of the first value after each reset
+        self._dropped = 0   # number of values dropped from the front of the series
+                            # (converts the absolute indexes to list indexes)
     
     def size(self):
         '''
@@ -67,6 +77,8 @@ class SFATimeSeries( object):
         Delete all the values from the series
         '''
         self._series = []
+        self._resets = []
+        self._dropped = 0
     
     def average(self, span):
         '''
@@ -77,6 +89,11 @@ class SFATimeSeries( object):
         the actual span of seconds that it covered.  (For example, if values are added
         every 2 seconds, but a 5 second average is requested, the actual span will be
         4 seconds.)
+        
+        If the counter was reset during the span, the interval where it went
+        down is left out (we can't know how much it counted during it) and
+        the average covers the rest.  The returned span doesn't include the
+        left out intervals.
         '''
        
         # Sanity check - we need at least to values to compute a meaningful average
@@ -94,22 +111,61 @@ class SFATimeSeries( object):
         if first_index == last_index:
             first_index = last_index - 1
               
-        average = ((self._series[last_index][0] - self._series[first_index][0]) /
-                   (self._series[last_index][1] - self._series[first_index][1]))
-        average = abs( average)
-        return (average, self._series[last_index][1] - self._series[first_index][1]) 
+        
+        if not self._resets or self._resets[-1] - self._dropped <= first_index:
+            # Normal case:  no resets in the span
+            average = ((self._series[last_index][0] - self._series[first_index][0]) /
+                       (self._series[last_index][1] - self._series[first_index][1]))
+            return (average, self._series[last_index][1] - self._series[first_index][1])
+        
+        # Split the span into the segments in between the resets
+        starts = [ first_index ]
+        for reset in self._resets:
+            index = reset - self._dropped
+            if first_index < index <= last_index:
+                starts.append( index)
+        ends = [ index - 1 for index in starts[1:] ] + [ last_index ]
+        
+        delta = 0
+        span = 0.0
+        for (start, end) in zip( starts, ends):
+            delta += self._series[end][0] - self._series[start][0]
+            span += self._series[end][1] - self._series[start][1]
+        if span <= 0:
+            # The only interval we had was the one with the reset
+            raise EmptyTimeSeriesException()
+        return (delta / span, span)
     
-    def append(self, value):
+    def append(self, value, timestamp = None):
         '''
         Adds one value to the time series and - if the max size has been
         exceeded - drops the oldest value.
+        
+        timestamp defaults to the current time.  When several series are
+        filled from the same query, pass them all the time the query was
+        made so their rates use exactly the same intervals.
+        
+        Returns True if the value is lower than the previous one (ie: the
+        counter was reset).
         '''
         
-        self._series.append((value, time.time()))
+        if timestamp is None:
+            timestamp = time.time()
+        
+        reset = bool( self._series) and value < self._series[-1][0]
+        if reset:
+            self._resets.append( self._dropped + len(self._series))
+        self._series.append((value, timestamp))
         
         # Remove any values that are too old
         if ( self._max_size and (len(self._series) > self._max_size)):
-            self._series = self._series[len(self._series) - self._max_size:]
+            excess = len(self._series) - self._max_size
+            self._series = self._series[excess:]
+            self._dropped += excess
+            # A reset at index 0 (or before) isn't inside any span anymore
+            while self._resets and self._resets[0] - self._dropped <= 0:
+                self._resets.pop( 0)
+        return reset
                             
         
     def _binary_search(self, timeval):
@@ -0,0 +1,135 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import time
+
+
+def make_fingerprint( vd_indexes, pool_indexes, vd_to_lun):
+    '''
+    Returns a cheap summary of the virtual disk and storage pool indexes
+    (the counts plus a hash of each set) and the virtual disk index -> LUN
+    number mapping from the presentations.  If a virtual disk or pool is
+    added or removed, or a virtual disk is presented as a different LUN, the
+    fingerprint changes.  (The mapping is kept whole rather than hashed:  a
+    missed re-map would put a virtual disk's stats under the wrong LUN.)
+    '''
+    vd_indexes = frozenset( vd_indexes)
+    pool_indexes = frozenset( pool_indexes)
+    return (len(vd_indexes), len(pool_indexes),
+            hash(vd_indexes), hash(pool_indexes),
+            frozenset( vd_to_lun.items()))
+
+
+def presentation_map( presentations):
+    '''
+    Returns the virtual disk index -> LUN number dictionary for the results
+    of SFAPresentation.getAll()
+    '''
+    vd_to_lun = { }
+    for p in presentations:
+        vd_to_lun[p.VirtualDiskIndex] = p.LUN
+    return vd_to_lun
+
+
+class SFATopology(object):
+    '''
+    A snapshot of how a controller's virtual disks map to LUNs and storage
+    pools.
+
+    The layout of the LUNs almost never changes, so SFAClient keeps one of
+    these around and only builds a new one (with the expensive
+    SFAVirtualDisk query) when the fingerprint of the virtual disk and pool
+    indexes and the presentations changes or the snapshot gets old.
+
+    Instances are never modified once they've been handed to SFAClient.
+    That's what makes it safe to build a new one in the background tier thread and hand it to
+    the main thread.  Each new snapshot gets the next generation number.
+    '''
+
+    def __init__(self, vd_to_lun, vd_to_pool, fingerprint, generation):
+        '''
+        Normally called via build().
+        '''
+        self.vd_to_lun = vd_to_lun      # virtual disk index -> LUN number
+        self.vd_to_pool = vd_to_pool    # virtual disk index -> pool index
+        self.fingerprint = fingerprint
+        self.generation = generation
+        self.built_at = time.time()
+
+    @classmethod
+    def empty(cls):
+        '''
+        Returns a topology with no LUNs (generation 0).  It never matches
+        any fingerprint, so the first refresh always does a full rebuild.
+        '''
+        return cls( {}, {}, None, 0)
+
+    @classmethod
+    def build(cls, presentations, virt_disks, pool_indexes, generation):
+        '''
+        Builds a new topology from the results of SFAPresentation.getAll()
+        and SFAVirtualDisk.getAll().  pool_indexes is the list of all the
+        storage pool indexes.
+
+        Virtual disks that aren't presented as a LUN are left out.
+        '''
+        vd_to_lun = presentation_map( presentations)
+
+        vd_to_pool = { }
+        vd_indexes = [ ]
+        for disk in virt_disks:
+            vd_indexes.append( disk.Index)
+            if disk.Index in vd_to_lun:
+                vd_to_pool[disk.Index] = disk.PoolIndex
+
+        return cls( vd_to_lun, vd_to_pool,
+                    make_fingerprint( vd_indexes, pool_indexes, vd_to_lun),
+                    generation)
+
+    def is_current(self, fingerprint, max_age):
+        '''
+        Returns True if this topology still matches the given fingerprint
+        and is less than max_age seconds old.
+        '''
+        return (fingerprint == self.fingerprint and
+                (time.time() - self.built_at) < max_age)
+
+    def same_layout(self, other):
+        '''
+        Returns True if other has the same fingerprint and maps every
+        virtual disk to the same LUN and pool as this topology.
+        '''
+        return (self.fingerprint == other.fingerprint and
+                self.vd_to_lun == other.vd_to_lun and
+                self.vd_to_pool == other.vd_to_pool)
+
+    def luns(self):
+        '''
+        Returns the set of LUN numbers
+        '''
+        return set( self.vd_to_lun.values())
+
+    def lun_pool_states(self, pool_states):
+        '''
+        Maps storage pool states onto LUNs.  pool_states is a dictionary of
+        pool index -> state.  Returns a dictionary of LUN number -> state.
+        LUNs whose pool isn't in pool_states are left out.
+        '''
+        lun_states = { }
+        for (vd_index, pool_index) in self.vd_to_pool.items():
+            if pool_index in pool_states:
+                lun_states[self.vd_to_lun[vd_index]] = pool_states[pool_index]
+        return lun_states
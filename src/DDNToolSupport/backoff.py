@@ -0,0 +1,115 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Crash-loop protection for the controller processes.
+
+Each process has a RestartBackoff object that works like a circuit breaker:
+
+  closed     The process is running normally.
+  open       The process died.  It won't be restarted until its backoff
+             delay has passed.  The delay doubles (up to a maximum) with each
+             consecutive failure and is jittered so that a group of
+             processes that died together don't all restart together.
+  half-open  The process has been restarted and is on probation.  If it
+             stays up for stable_time seconds, the circuit closes and the
+             failure count is reset.  If it dies, the circuit opens again
+             with a longer delay.
+
+Every state change is logged.
+'''
+
+import logging
+import random
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+DEFAULT_INITIAL_DELAY = 2.0     # seconds
+DEFAULT_MAX_DELAY = 300.0       # seconds
+DEFAULT_STABLE_TIME = 120.0     # seconds
+
+
+class RestartBackoff(object):
+    '''
+    Exponential backoff (with jitter) for restarting one process.  All the
+    methods take the current time so the main loop only has to call
+    time.time() once per iteration.
+    '''
+
+    def __init__(self, name, initial_delay = DEFAULT_INITIAL_DELAY,
+                 max_delay = DEFAULT_MAX_DELAY,
+                 stable_time = DEFAULT_STABLE_TIME, random_func = random.random):
+        '''
+        name is only used in the log messages.  random_func returns a
+        float in [0.0, 1.0).  (It's only a parameter so the tests can make
+        the jitter predictable.)
+        '''
+        self.logger = logging.getLogger( 'DDNTool')
+        self.name = name
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.stable_time = stable_time
+        self._random = random_func
+
+        self.state = CLOSED
+        self.failures = 0           # consecutive failures
+        self.next_attempt = None    # when the open circuit may restart
+        self._restart_time = None   # when the half-open circuit restarted
+
+    def process_died(self, now):
+        '''
+        Opens the circuit and schedules the next restart.  Returns the delay
+        (in seconds).
+        '''
+        self.failures += 1
+        delay = min( self.max_delay,
+                     self.initial_delay * (2 ** (self.failures - 1)))
+        # 'Equal jitter': somewhere between half and all of the delay
+        delay = delay / 2.0 + self._random() * delay / 2.0
+        self.next_attempt = now + delay
+        self.state = OPEN
+        self.logger.warning( "%s: circuit open after %d consecutive "
+                             "failure(s).  Next restart in %.1f seconds.",
+                             self.name, self.failures, delay)
+        return delay
+
+    def should_restart(self, now):
+        '''
+        Returns True (and moves to half-open) if the circuit is open and the
+        backoff delay has passed.
+        '''
+        if self.state != OPEN or now < self.next_attempt:
+            return False
+        self.state = HALF_OPEN
+        self._restart_time = now
+        self.logger.info( "%s: circuit half-open.  Restarting (attempt %d).",
+                          self.name, self.failures + 1)
+        return True
+
+    def process_alive(self, now):
+        '''
+        Call this for a running process.  Closes a half-open circuit once the
+        process has been up for stable_time seconds.
+        '''
+        if self.state == HALF_OPEN and \
+           now - self._restart_time >= self.stable_time:
+            self.logger.info( "%s: circuit closed.  Process has been up for "
+                              "%d seconds.", self.name,
+                              now - self._restart_time)
+            self.state = CLOSED
+            self.failures = 0
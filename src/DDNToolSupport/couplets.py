@@ -0,0 +1,70 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Groups controller host names into couplets.
+
+Both controllers in a couplet see the same virtual disks (each one reports
+the counters for both), so polling both of them just collects the same
+data twice.  DDNTool polls one controller per couplet and fails over to
+the partner when the active one stops working.
+'''
+
+
+def group_couplets( hosts, suffixes):
+    '''
+    Groups a list of hosts into couplets.  Hosts are partners if their names
+    are the same except for a trailing suffix from the suffixes list.  For
+    example, with suffixes of ['a', 'b'], 'sultan-12k1a' and 'sultan-12k1b'
+    are partners.  Only the first part of a fully qualified name is looked
+    at, so 'sultan-12k1a.example.com' and 'sultan-12k1b.example.com' are
+    partners, too.
+
+    Returns a list of (name, members) tuples in the order the hosts first
+    appear.  A couplet's name is its members' name without the suffix
+    ('sultan-12k1' or 'sultan-12k1.example.com') and members is the list of
+    hosts in the couplet in the order they were listed.  Hosts without a
+    partner (or all the hosts if suffixes is empty) are returned as a group
+    of one, named after the host itself.
+    '''
+    groups = [ ]    # list of (name, members) in order
+    by_name = { }   # couplet name -> members list
+    for host in hosts:
+        name = _couplet_name( host, suffixes)
+        if name is None:
+            groups.append( (host, [ host ]))
+        elif name in by_name:
+            by_name[name].append( host)
+        else:
+            by_name[name] = [ host ]
+            groups.append( (name, by_name[name]))
+
+    # A 'couplet' with only one member is just a host
+    return [ (name, members) if len(members) > 1 else (members[0], members)
+             for (name, members) in groups ]
+
+
+def _couplet_name( host, suffixes):
+    '''
+    Returns the name of the couplet the host would belong to, or None if
+    its name doesn't end with any of the suffixes
+    '''
+    parts = host.split( '.', 1)
+    for suffix in suffixes:
+        if suffix and len(parts[0]) > len(suffix) and parts[0].endswith( suffix):
+            parts[0] = parts[0][:-len(suffix)]
+            return '.'.join( parts)
+    return None
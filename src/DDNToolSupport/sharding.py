@@ -0,0 +1,313 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Splits the controllers between several DDNTool instances (nodes).
+
+All the nodes read the same sfa_hosts list and share a directory (NFS,
+for example).  Each node writes a heartbeat file there and the live nodes
+divide the hosts between them by rendezvous (highest random weight)
+hashing, so adding or removing a node only moves the hosts that node
+gains or loses.
+
+A node only polls a host while it holds that host's lease:  a file in the
+shared directory with the owner's name and an expiration time.  Leases (and
+the heartbeat) are renewed well before they expire by a thread of their
+own, so a controller that's slow to respond can't hold up the renewals.
+If a node dies, its heartbeat goes stale, the other nodes re-hash its
+hosts between themselves, and whoever gets each host takes the lease over
+once it expires.  A node that loses a host to a
+new node stops polling it and gives up the lease so the new owner can take
+it right away.
+
+Note: expiration times are compared across nodes, so their clocks need to
+be synchronized (NTP).  This isn't a consensus protocol.  If two nodes go
+for a free lease at the same moment, both renames succeed and the file
+ends up with whichever landed last.  A node that read the file back before
+the other node's rename landed also thinks it got the lease, so both can
+poll the host until the loser's next renewal.  Renewals check the owner
+first (see _renew()), so the loser notices there and lets the host go.
+That's at most lease_time / 3 seconds of double polling.
+'''
+
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+
+DEFAULT_LEASE_TIME = 30     # seconds
+
+NODES_DIR = 'nodes'
+LEASES_DIR = 'leases'
+
+
+def rendezvous_owner( host, nodes):
+    '''
+    Returns the node (from the nodes list) that should own host.  Every
+    node computes the same answer from the same list of nodes.
+    '''
+    best = None
+    best_weight = None
+    for node in nodes:
+        weight = hashlib.md5( node + '\0' + host).hexdigest()
+        if best_weight is None or weight > best_weight:
+            best = node
+            best_weight = weight
+    return best
+
+
+class LeaseManager(object):
+    '''
+    Keeps track of which hosts this node owns.  The main loop calls update()
+    every iteration to find out which hosts it should be polling.  It only
+    touches the shared directory every lease_time / 3 seconds.
+
+    The main loop waits for every controller process to finish its
+    iteration, so it can't be trusted to renew the leases in time.  start()
+    runs a thread that renews our heartbeat and every lease we hold every
+    lease_time / 3 seconds, no matter what the main loop is doing.  (All the
+    methods are thread safe.)
+    '''
+
+    def __init__(self, lease_dir, node_name = None, lease_time = DEFAULT_LEASE_TIME):
+        if node_name is None:
+            node_name = socket.gethostname()
+        self.node_name = node_name
+        self.lease_time = lease_time
+        self._nodes_dir = os.path.join( lease_dir, NODES_DIR)
+        self._leases_dir = os.path.join( lease_dir, LEASES_DIR)
+        for directory in (self._nodes_dir, self._leases_dir):
+            if not os.path.isdir( directory):
+                try:
+                    os.makedirs( directory)
+                except OSError:
+                    # another node may have just created it
+                    if not os.path.isdir( directory):
+                        raise
+
+        self._held = set()      # hosts we hold the lease for
+        self._owned = set()     # the held hosts we should be polling
+        self._last_update = None
+        self.logger = logging.getLogger( 'DDNTool')
+        self._lock = threading.Lock()   # protects everything above
+        self._stopping = threading.Event()
+        self._renewer = None
+
+    def start(self):
+        '''
+        Starts the renewal thread
+        '''
+        self._renewer = threading.Thread( name = 'DDNTool_leases',
+                                          target = self._renew_loop)
+        self._renewer.daemon = True
+        self._renewer.start()
+
+    def stop(self):
+        '''
+        Stops the renewal thread (if it's running)
+        '''
+        if self._renewer is not None:
+            self._stopping.set()
+            self._renewer.join()
+            self._renewer = None
+
+    def _renew_loop(self):
+        # Note: no logging here.  (Same reason as the threads in
+        # status_server:  DDNTool forks while this thread is running.)
+        while not self._stopping.wait( self.lease_time / 3.0):
+            try:
+                self.renew()
+            except EnvironmentError:
+                pass    # shared filesystem trouble.  Try again next time.
+
+    def renew(self, now = None):
+        '''
+        Renews our heartbeat and every lease we hold.  Leases that another
+        node has taken over are dropped.  (update() will then stop
+        returning those hosts.)
+        '''
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._write_heartbeat( now)
+            for host in list( self._held):
+                if not self._renew( host, now):
+                    self._held.discard( host)
+                    self._owned.discard( host)
+
+    def update(self, hosts, now = None):
+        '''
+        Heartbeats, then acquires or renews the leases for the hosts this
+        node should have.  Returns the set of hosts (from the hosts list)
+        this node should be polling.
+
+        Leases for hosts that now belong to another node are renewed until
+        the caller stops polling them and calls release().  (Otherwise the
+        new owner could start before the old process stopped.)
+
+        If the shared directory can't be read or written (an NFS hiccup,
+        etc.), the error is logged and the hosts we were already polling
+        are returned.  We'll try again on the next call.
+        '''
+        if now is None:
+            now = time.time()
+        with self._lock:
+            try:
+                return self._update( hosts, now)
+            except EnvironmentError, e:
+                self.logger.error( "Error updating the leases in %s (%s).  "
+                                   "Keeping the current hosts.",
+                                   self._leases_dir, e)
+                self._last_update = None
+                return set( self._owned)
+
+    def _update(self, hosts, now):
+        if self._last_update is not None and \
+           now - self._last_update < self.lease_time / 3.0:
+            return set( self._owned)
+        self._last_update = now
+
+        self._write_heartbeat( now)
+        nodes = self.live_nodes( now)
+        wanted = set( [ host for host in hosts
+                        if rendezvous_owner( host, nodes) == self.node_name ])
+
+        for host in hosts:
+            if host in wanted:
+                if self._try_acquire( host, now):
+                    self._held.add( host)
+                else:
+                    self._held.discard( host)
+            elif host in self._held:
+                # Keep renewing until the caller has stopped polling it and
+                # called release()
+                if not self._renew( host, now):
+                    self._held.discard( host)
+        self._owned = self._held & wanted
+        return set( self._owned)
+
+    def release(self, host):
+        '''
+        Gives up the lease on a host (if we hold it)
+        '''
+        with self._lock:
+            if host not in self._held:
+                return
+            self._held.discard( host)
+            self._owned.discard( host)
+            path = self._lease_path( host)
+            if self._read_lease( path)[0] == self.node_name:
+                try:
+                    os.remove( path)
+                except OSError:
+                    pass
+
+    def release_all(self):
+        '''
+        Stops the renewal thread and gives up all our leases and our
+        heartbeat (for a clean shutdown), so the other nodes can take over
+        right away
+        '''
+        self.stop()
+        for host in list( self._held):
+            self.release( host)
+        try:
+            os.remove( os.path.join( self._nodes_dir, self.node_name))
+        except OSError:
+            pass
+
+    def live_nodes(self, now):
+        '''
+        Returns the sorted list of nodes whose heartbeats haven't expired
+        (always including this one)
+        '''
+        nodes = set( [ self.node_name ])
+        for name in os.listdir( self._nodes_dir):
+            if name.startswith( '.'):
+                continue    # temporary file
+            expires = self._read_lease( os.path.join( self._nodes_dir, name), False)[1]
+            if expires > now:
+                nodes.add( name)
+        return sorted( nodes)
+
+    def _write_heartbeat(self, now):
+        self._write_file( os.path.join( self._nodes_dir, self.node_name),
+                          '%f\n'%(now + self.lease_time))
+
+    def _lease_path(self, host):
+        return os.path.join( self._leases_dir, host)
+
+    def _try_acquire(self, host, now):
+        '''
+        Takes (or renews) the lease for host if it's free, expired or
+        already ours.  Returns True if we hold it afterwards.
+        '''
+        path = self._lease_path( host)
+        (owner, expires) = self._read_lease( path)
+        if owner is not None and owner != self.node_name and expires > now:
+            return False
+        self._write_file( path, '%s %f\n'%(self.node_name, now + self.lease_time))
+        # If another node was racing us for it, both renames succeed and
+        # the file has whichever one landed last.  If that's not us, we
+        # lost.  (If the other node's rename hasn't landed yet, we can't
+        # tell.  We'll find out at the next renewal.  See the module
+        # docstring.)
+        return self._read_lease( path)[0] == self.node_name
+
+    def _renew(self, host, now):
+        '''
+        Extends our lease on host.  If another node's name is in the lease
+        file (it won a race for the lease, or took it over while we
+        weren't renewing), leaves it alone and returns False.
+        '''
+        path = self._lease_path( host)
+        owner = self._read_lease( path)[0]
+        if owner is not None and owner != self.node_name:
+            return False
+        self._write_file( path, '%s %f\n'%(self.node_name, now + self.lease_time))
+        return True
+
+    def _read_lease(self, path, has_owner = True):
+        '''
+        Returns a tuple of (owner, expiration time) from a lease or
+        heartbeat file.  Missing or unreadable files look like (None, 0).
+        '''
+        try:
+            f = open( path)
+            try:
+                fields = f.read().split()
+            finally:
+                f.close()
+            if has_owner:
+                return (fields[0], float( fields[1]))
+            return (None, float( fields[0]))
+        except (IOError, IndexError, ValueError):
+            return (None, 0.0)
+
+    def _write_file(self, path, contents):
+        '''
+        Replaces a file atomically (write a temporary file, then rename it)
+        '''
+        (directory, name) = os.path.split( path)
+        tmp_path = os.path.join( directory, '.%s.%s.%d'%(name, self.node_name, os.getpid()))
+        f = open( tmp_path, 'w')
+        try:
+            f.write( contents)
+        finally:
+            f.close()
+        os.rename( tmp_path, path)
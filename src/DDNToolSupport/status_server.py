@@ -0,0 +1,446 @@
+# Copyright 2026 UT Battelle, LLC
+#
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+#
+# This file is part of DDNTool_v2.
+#
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+#
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+'''
+Small, read-only HTTP servers that run in the main DDNTool process and
+serve the latest data from all the controller processes.
+
+The controller processes put their data on a multiprocessing.Queue after
+every fast iteration (see SFASinks.StatusSink and SFAPrometheus).
+A SnapshotReader thread in the main process moves it into the right cache
+and the HTTP servers answer requests out of the caches.  Each URL is
+rendered (and gzipped) at most once per iteration, no matter how many
+clients ask for it, and clients that send If-None-Match with the current
+ETag get a 304 with no body.  (The controllers' data trickles in over the
+course of an iteration, so the JSON caches hold on to it until every host
+has sent the same update time.  See RenderCache.)
+
+Queue entries are (kind, host name, data) tuples.  kind is 'status' for
+the JSON API (StatusCache), 'history' for the rate history that's served
+with it (HistoryCache) or 'metrics' for the Prometheus endpoint
+(MetricsCache).  (None, host name, None) means the host was removed and
+clears it out of every cache.
+
+JSON API URLs:
+    /hosts          - list of hosts and the time of their latest snapshot
+    /luns           - latest snapshot for every host
+    /luns/<host>    - latest snapshot for one host
+    /history        - hosts and the series in their rate history
+    /history/<host>/<series>[/<cf>[/<seconds>]]
+                    - the history of one of a host's controller-wide rates
+                      for the last <seconds> (default 3600) consolidated
+                      with <cf> (avg, max or last, default avg)
+
+Prometheus URL:
+    /metrics
+
+Note: the server threads don't log anything.  DDNTool forks new controller
+processes while these threads are running, and a thread holding the
+logging lock at the wrong moment would leave the child deadlocked.
+'''
+
+import BaseHTTPServer
+import gzip
+import hashlib
+import json
+import Queue
+import SocketServer
+import StringIO
+import threading
+import time
+
+from DDNToolSupport.SFAClientUtils.SFARollup import SFARollup, \
+        CONSOLIDATION_FUNCTIONS
+
+# Default span (in seconds) for the /history URLs
+DEFAULT_HISTORY_SECONDS = 3600
+
+
+class RenderCache(object):
+    '''
+    Holds the latest data from each host and the rendered responses.
+    Thread safe.  Subclasses supply _render().
+
+    If the subclass's _snapshot_tick() returns the iteration a snapshot
+    belongs to (the update time every controller shares), new snapshots
+    are held back until every host has sent one for the newest iteration
+    and then published (and the rendered responses invalidated) all at
+    once.  If a host is late, whatever we have is published when the first
+    snapshot of the next iteration shows up.  Otherwise, every update is
+    published right away.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = { }   # host name -> snapshot, as published
+        self._incoming = { }    # host name -> latest snapshot
+        self._tick = None       # newest iteration in _incoming
+        self._generation = 0    # bumped every time _snapshots changes
+        self._rendered = { }    # path -> (generation, body, gzipped body, etag)
+
+    def update(self, host, snapshot):
+        '''
+        Replaces the data for one host.  A snapshot of None removes the
+        host.
+        '''
+        self._lock.acquire()
+        try:
+            if snapshot is None:
+                self._incoming.pop( host, None)
+                self._publish()
+                return
+
+            tick = self._snapshot_tick( snapshot)
+            if tick is None:
+                self._incoming[host] = snapshot
+                self._publish()
+                return
+
+            if self._tick is None or tick > self._tick:
+                if self._incoming != self._snapshots:
+                    # Someone never finished the last iteration
+                    self._publish()
+                self._tick = tick
+            self._incoming[host] = snapshot
+            if [ s for s in self._incoming.values()
+                 if self._snapshot_tick( s) != self._tick ]:
+                return      # still waiting for somebody
+            self._publish()
+        finally:
+            self._lock.release()
+
+    def _snapshot_tick(self, snapshot):
+        '''
+        Returns the update time of the iteration a snapshot came from, or
+        None to publish every snapshot as soon as it arrives
+        '''
+        return None
+
+    def _publish(self):
+        '''
+        Makes the incoming snapshots the ones we render.  Called with the
+        lock held.
+        '''
+        self._snapshots = dict( self._incoming)
+        self._changed()
+
+    def _changed(self):
+        '''
+        Invalidates the rendered responses.  Called with the lock held.
+        '''
+        self._generation += 1
+        # None of them are current anymore.  (Also keeps a client that asks
+        # for lots of different paths from filling up the memory.)
+        self._rendered.clear()
+
+    def get(self, path):
+        '''
+        Returns a tuple of (body, gzipped body, etag) for the requested path,
+        or None if there's no such path.
+        '''
+        self._lock.acquire()
+        try:
+            cached = self._rendered.get( path)
+            if cached is not None and cached[0] == self._generation:
+                return cached[1:]
+
+            body = self._render( path)
+            if body is None:
+                return None
+
+            etag = '"%s"'%hashlib.md5( body).hexdigest()
+            gz_buf = StringIO.StringIO()
+            gz_file = gzip.GzipFile( fileobj = gz_buf, mode = 'wb')
+            gz_file.write( body)
+            gz_file.close()
+
+            self._rendered[path] = (self._generation, body, gz_buf.getvalue(), etag)
+            return (body, gz_buf.getvalue(), etag)
+        finally:
+            self._lock.release()
+
+    def _render(self, path):
+        '''
+        Returns the response body for a path or None if there's no such
+        path.  Called with the lock held.
+        '''
+        raise NotImplementedError()
+
+
+class StatusCache( RenderCache):
+    '''
+    Renders the JSON API from the SFAClient status snapshots.  If history
+    (a HistoryCache) is given, the /history URLs are answered out of it.
+    '''
+
+    content_type = 'application/json'
+
+    def __init__(self, history = None):
+        RenderCache.__init__(self)
+        self.history = history
+
+    def get(self, path):
+        if self.history is not None and \
+           (path == '/history' or path.startswith( '/history/')):
+            return self.history.get( path)
+        return RenderCache.get( self, path)
+
+    def _snapshot_tick(self, snapshot):
+        return snapshot.get( 'update_time')
+
+    def _render(self, path):
+        parts = [ p for p in path.split( '/') if p ]
+        if parts == [ 'hosts' ]:
+            data = { }
+            for (host, snapshot) in self._snapshots.items():
+                data[host] = snapshot.get( 'update_time')
+        elif parts == [ 'luns' ]:
+            data = self._snapshots
+        elif len(parts) == 2 and parts[0] == 'luns' and parts[1] in self._snapshots:
+            data = self._snapshots[parts[1]]
+        else:
+            return None
+        return json.dumps( data, sort_keys = True)
+
+
+class HistoryCache( RenderCache):
+    '''
+    Keeps the long term history of each host's controller-wide rates (one
+    SFARollup per host) and renders it as JSON.  Each update is an
+    (update time, time stamp, dictionary of series name -> rate) tuple from
+    SFASinks.HistorySink.
+
+    The samples go straight into the rollups, but the rendered responses
+    are only invalidated once per iteration (when the first sample with a
+    new update time arrives).  The hosts that report later show up a little
+    later.
+    '''
+
+    content_type = 'application/json'
+
+    def update(self, host, sample):
+        self._lock.acquire()
+        try:
+            if sample is None:
+                self._snapshots.pop( host, None)
+                self._changed()
+                return
+
+            (update_time, timestamp, rates) = sample
+            rollup = self._snapshots.get( host)
+            if rollup is None:
+                rollup = SFARollup( rates.keys())
+                self._snapshots[host] = rollup
+                self._changed()     # new host for /history
+            for (name, value) in rates.items():
+                rollup.add( name, value, timestamp)
+            if self._tick is None or update_time > self._tick:
+                self._tick = update_time
+                self._changed()
+        finally:
+            self._lock.release()
+
+    def _render(self, path):
+        parts = [ p for p in path.split( '/') if p ]
+        if parts == [ 'history' ]:
+            data = { }
+            for (host, rollup) in self._snapshots.items():
+                data[host] = sorted( rollup.series_names())
+            return json.dumps( data, sort_keys = True)
+
+        if not (3 <= len(parts) <= 5) or parts[0] != 'history':
+            return None
+        rollup = self._snapshots.get( parts[1])
+        series = parts[2]
+        if rollup is None or series not in rollup.series_names():
+            return None
+        cf = 'avg'
+        if len(parts) >= 4:
+            cf = parts[3]
+            if cf not in CONSOLIDATION_FUNCTIONS:
+                return None
+        seconds = DEFAULT_HISTORY_SECONDS
+        if len(parts) == 5:
+            try:
+                seconds = int( parts[4])
+            except ValueError:
+                return None
+
+        (step, values) = rollup.query( series, time.time() - seconds, cf = cf)
+        data = { 'host' : parts[1], 'series' : series, 'cf' : cf,
+                 'step' : step, 'values' : values }
+        return json.dumps( data, sort_keys = True)
+
+
+class MetricsCache( RenderCache):
+    '''
+    Renders the Prometheus text exposition format from the metric families
+    the SFAPrometheus objects send.
+
+    Each host sends a list of (name, type, help, lines) tuples where lines
+    is a list of already formatted sample lines.  The exposition format
+    wants all the samples for a family together, so we can't just paste
+    the hosts' output end to end.
+    '''
+
+    content_type = 'text/plain; version=0.0.4'
+
+    def _render(self, path):
+        if path != '/metrics':
+            return None
+
+        headers = { }   # family name -> (type, help)
+        samples = { }   # family name -> list of lists of lines
+        for host in sorted( self._snapshots.keys()):
+            for (name, metric_type, help_text, lines) in self._snapshots[host]:
+                headers.setdefault( name, (metric_type, help_text))
+                samples.setdefault( name, [ ]).append( lines)
+
+        output = [ ]
+        for name in sorted( headers.keys()):
+            output.append( '# HELP %s %s'%(name, headers[name][1]))
+            output.append( '# TYPE %s %s'%(name, headers[name][0]))
+            for lines in samples[name]:
+                output.extend( lines)
+        output.append( '')
+        return '\n'.join( output)
+
+
+class StatusRequestHandler( BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Answers GET and HEAD requests out of the server's cache.  (The
+    base class answers everything else with a 501.)
+    '''
+
+    server_version = 'DDNTool'
+
+    def do_GET(self):
+        self._respond( True)
+
+    def do_HEAD(self):
+        self._respond( False)
+
+    def _respond(self, send_body):
+        path = self.path.split( '?', 1)[0]
+        result = self.server.cache.get( path)
+        if result is None:
+            self.send_error( 404)
+            return
+
+        (body, gz_body, etag) = result
+        if self.headers.get( 'If-None-Match') == etag:
+            self.send_response( 304)
+            self.send_header( 'ETag', etag)
+            self.end_headers()
+            return
+
+        if 'gzip' in self.headers.get( 'Accept-Encoding', ''):
+            body = gz_body
+            gzipped = True
+        else:
+            gzipped = False
+
+        self.send_response( 200)
+        self.send_header( 'Content-Type', self.server.cache.content_type)
+        self.send_header( 'Content-Length', str(len(body)))
+        self.send_header( 'ETag', etag)
+        self.send_header( 'Cache-Control', 'no-cache')
+        if gzipped:
+            self.send_header( 'Content-Encoding', 'gzip')
+            self.send_header( 'Vary', 'Accept-Encoding')
+        self.end_headers()
+        if send_body:
+            self.wfile.write( body)
+
+    def log_message(self, format, *args):
+        # See the note at the top of the file about logging
+        pass
+
+
+class StatusHTTPServer( SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, cache):
+        BaseHTTPServer.HTTPServer.__init__( self, address, StatusRequestHandler)
+        self.cache = cache
+
+
+class StatusServer(object):
+    '''
+    Runs one StatusHTTPServer in a background thread.  Requests are answered
+    out of cache (a RenderCache).
+    '''
+
+    def __init__(self, address, port, cache):
+        self.cache = cache
+        self._httpd = StatusHTTPServer( (address, port), cache)
+        self._thread = threading.Thread( name = 'DDNTool_http_%d'%port,
+                                         target = self._httpd.serve_forever)
+        self._thread.daemon = True
+
+    def port(self):
+        '''
+        Returns the port we're actually listening on (useful if port 0
+        was requested)
+        '''
+        return self._httpd.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class SnapshotReader(object):
+    '''
+    Thread that reads (kind, host, data) tuples off the snapshot queue and
+    hands them to the cache registered for that kind.  Entries for kinds
+    that nobody registered are dropped.
+    '''
+
+    def __init__(self, snapshot_queue):
+        self._queue = snapshot_queue
+        self._caches = { }
+        self._stopping = threading.Event()
+        self._thread = threading.Thread( name = 'DDNTool_snapshots',
+                                         target = self._read_queue)
+        self._thread.daemon = True
+
+    def register(self, kind, cache):
+        self._caches[kind] = cache
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def _read_queue(self):
+        while not self._stopping.is_set():
+            try:
+                (kind, host, data) = self._queue.get( True, 1.0)
+            except Queue.Empty:
+                continue
+            if kind is None:
+                # host removed: applies to every cache
+                for cache in self._caches.values():
+                    cache.update( host, None)
+            elif kind in self._caches:
+                self._caches[kind].update( host, data)
@@ -0,0 +1,143 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import logging
+import threading
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFAAnomaly import SFAEwmaDetector, \
+        SFALunAnalysis
+from DDNToolSupport.SFAClientUtils.SFASinks import FastRecord, LunRecord, \
+        MediumRecord, MediumLunRecord, CollectorStats, AnomalyEvent, \
+        PoolStateEvent, FAST, MEDIUM
+
+def fast_record( pool_states, rates):
+    luns = tuple( [ LunRecord( lun_num, (0,) * 8, pool_states[lun_num],
+                               rates.get( lun_num), (), None)
+                    for lun_num in sorted( pool_states.keys()) ])
+    return FastRecord( FAST, 'sfa1', 1000, luns, CollectorStats( 0.5, 9, 0, 2.0),
+                       1000.5)
+
+
+class SFAAnomaly_Test( unittest.TestCase):
+
+    def _feed(self, detector, luns, rows, count):
+        events = [ ]
+        for i in range( count):
+            # A little noise so the variance isn't 0
+            noisy = [ [ value + (i % 2) for value in row ] for row in rows ]
+            events.extend( detector.update( luns, noisy))
+        return events
+
+    def testSpike(self):
+        detector = SFAEwmaDetector( [ 'a', 'b' ], alpha = 0.1, threshold = 4.0,
+                                    warmup = 5)
+        self.assertEqual( self._feed( detector, (1, 2), [ [100, 50], [10, 20] ], 50), [ ])
+        
+        events = detector.update( (1, 2), [ [100, 50], [10, 500] ])
+        self.assertEqual( len(events), 1)
+        event = events[0]
+        self.assertEqual( (event.lun_num, event.metric, event.active, event.value),
+                          (2, 'b', True, 500.0))
+        self.assertAlmostEqual( event.mean, 20.5, delta = 0.5)
+        self.assertTrue( event.zscore > 4.0)
+        
+        # Still anomalous:  no new event
+        self.assertEqual( detector.update( (1, 2), [ [100, 50], [10, 500] ]), [ ])
+        
+        # Back to normal
+        events = detector.update( (1, 2), [ [100, 50], [10, 20] ])
+        self.assertEqual( [ (e.lun_num, e.metric, e.active) for e in events ],
+                          [ (2, 'b', False) ])
+
+    def testWarmup(self):
+        detector = SFAEwmaDetector( [ 'a' ], warmup = 10)
+        events = self._feed( detector, (1,), [ [100] ], 3)
+        events += detector.update( (1,), [ [1000000] ])
+        self.assertEqual( events, [ ])
+
+    def testMissingValues(self):
+        detector = SFAEwmaDetector( [ 'a', 'b' ], alpha = 0.5, warmup = 0)
+        detector.update( (1,), [ [10, None] ])
+        detector.update( (1,), [ [None, 20] ])
+        self.assertEqual( detector._mean.tolist(), [ [10.0, 20.0] ])
+        self.assertEqual( detector._count.tolist(), [ [1, 1] ])
+
+    def testLunsChange(self):
+        detector = SFAEwmaDetector( [ 'a' ], alpha = 0.5, warmup = 0)
+        detector.update( (1, 2), [ [10], [20] ])
+        detector.update( (2, 3), [ [20], [30] ])
+        self.assertEqual( detector.size(), 2)
+        self.assertEqual( detector._mean.tolist(), [ [20.0], [30.0] ])
+        self.assertEqual( detector._count.tolist(), [ [2], [1] ])
+
+    def testAnalysis(self):
+        analysis = SFALunAnalysis( logging.getLogger( 'SFAAnomaly_Test'),
+                                   warmup = 0)
+        rates = (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0)
+        analysis.write( fast_record( { 1 : 0, 2 : 0 }, { 1 : rates }))
+        analysis.write( fast_record( { 1 : 0, 2 : 2 }, { 1 : rates, 2 : rates }))
+        analysis.write( fast_record( { 1 : 0, 2 : 2 }, { 1 : rates, 2 : rates }))
+        self.assertEqual( analysis.take_events(), [ PoolStateEvent( 2, 0, 2) ])
+        self.assertEqual( analysis.take_events(), [ ])
+        
+        # Latencies from the medium records (read p99 jumps on LUN 1)
+        summary = (1.0, 2.0, 4.0, 1.0, 2.0, 4.0, 4096.0, 4096.0)
+        for i in range( 3):
+            analysis.write( MediumRecord( MEDIUM, 'sfa1', 1000,
+                    ( MediumLunRecord( 1, None, summary), )))
+        analysis.write( MediumRecord( MEDIUM, 'sfa1', 1000,
+                ( MediumLunRecord( 1, None, summary[:2] + (400.0,) + summary[3:]), )))
+        events = analysis.take_events()
+        self.assertEqual( [ (e.lun_num, e.metric, e.active) for e in events ],
+                          [ (1, 'read_p99_ms', True) ])
+        self.assertTrue( isinstance( events[0], AnomalyEvent))
+
+
+    def testMissingRatesKeepAverages(self):
+        analysis = SFALunAnalysis( logging.getLogger( 'SFAAnomaly_Test'))
+        rates = (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0)
+        for i in range( 3):
+            analysis.write( fast_record( { 1 : 0, 2 : 0 }, { 1 : rates, 2 : rates }))
+        # LUN 2's counters were reset:  no rates this time, but it doesn't
+        # lose its averages (and start the warmup over)
+        analysis.write( fast_record( { 1 : 0, 2 : 0 }, { 1 : rates }))
+        self.assertEqual( analysis._state.rates._count.tolist(), [ [4] * 7, [3] * 7 ])
+        
+        summary = (1.0, 2.0, 4.0, 1.0, 2.0, 4.0, 4096.0, 4096.0)
+        for lun_2_summary in (summary, None):
+            analysis.write( MediumRecord( MEDIUM, 'sfa1', 1000,
+                    ( MediumLunRecord( 1, None, summary),
+                      MediumLunRecord( 2, None, lun_2_summary) )))
+        self.assertEqual( analysis._state.latencies._count.tolist(), [ [2] * 6, [1] * 6 ])
+
+
+    def testThreadsHaveTheirOwnDetectors(self):
+        analysis = SFALunAnalysis( logging.getLogger( 'SFAAnomaly_Test'))
+        rates = (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0)
+        analysis.write( fast_record( { 1 : 0 }, { 1 : rates }))
+        thread = threading.Thread( target = analysis.write,
+                                   args = (fast_record( { 1 : 2, 2 : 0 }, { }), ))
+        thread.start()
+        thread.join()
+        self.assertEqual( analysis._state.rates.size(), 1)
+        # The other thread's pool states didn't mix with ours
+        self.assertEqual( analysis.take_events(), [ ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from DDNToolSupport.SFAClientUtils import SFAArchive
+from DDNToolSupport.SFAClientUtils.SFAArchive import SFAArchiveWriter, \
+        SFAArchiveReader, ArchiveFormatError, archive_path, read_lun_history
+
+COLUMNS = [ 'read_bytes', 'write_bytes', 'pool_state' ]
+DAY = 1790812800    # midnight UTC, 2026-10-01
+
+class SFAArchive_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        shutil.rmtree( self.directory)
+        
+    def _write(self, times, luns, block_ticks = 10):
+        writer = SFAArchiveWriter( self.directory, 'sfa1', COLUMNS, block_ticks)
+        for t in times:
+            rows = { }
+            for lun in luns:
+                # mix of small, large and negative deltas
+                rows[lun] = ( lun * 2**40 + (t - DAY) * 7, (t - DAY)**3, t % 2)
+            writer.append( t, rows)
+        writer.close()
+        
+    def testRoundTrip(self):
+        times = range( DAY, DAY + 250, 2)
+        self._write( times, [0, 1, 7])
+        reader = SFAArchiveReader( archive_path( self.directory, 'sfa1', '20261001'))
+        try:
+            self.assertEqual( reader.columns, COLUMNS)
+            self.assertEqual( len( reader.index), 13)
+            self.assertEqual( reader.luns(), set( [0, 1, 7]))
+            (t, values) = reader.read_lun( 7)
+            self.assertEqual( t, times)
+            self.assertEqual( values['read_bytes'],
+                              [ 7 * 2**40 + (x - DAY) * 7 for x in times ])
+            self.assertEqual( values['write_bytes'], [ (x - DAY)**3 for x in times ])
+            self.assertEqual( values['pool_state'], [ x % 2 for x in times ])
+            
+            # time range & column selection
+            (t, values) = reader.read_lun( 1, DAY + 15, DAY + 40, ['write_bytes'])
+            self.assertEqual( t, range( DAY + 16, DAY + 41, 2))
+            self.assertEqual( values.keys(), ['write_bytes'])
+            self.assertEqual( values['write_bytes'][0], 16**3)
+            
+            self.assertEqual( reader.read_lun( 3), ([ ], dict( [ (c, [ ]) for c in COLUMNS ])))
+        finally:
+            reader.close()
+        
+    def testPythonDecoder(self):
+        # Same results without NumPy
+        self._write( range( DAY, DAY + 40, 2), [0])
+        saved = SFAArchive.numpy
+        SFAArchive.numpy = None
+        try:
+            (t, values) = read_lun_history( self.directory, 'sfa1', 0, DAY, DAY + 100)
+        finally:
+            SFAArchive.numpy = saved
+        self.assertEqual( values['write_bytes'], [ (x - DAY)**3 for x in t ])
+        
+    def testAppendAcrossWriters(self):
+        # A second writer (after a restart) adds to the existing file
+        self._write( range( DAY, DAY + 20, 2), [0])
+        self._write( range( DAY + 20, DAY + 40, 2), [0, 1])
+        (t, values) = read_lun_history( self.directory, 'sfa1', 0, DAY, DAY + 100)
+        self.assertEqual( t, range( DAY, DAY + 40, 2))
+        (t, values) = read_lun_history( self.directory, 'sfa1', 1, DAY, DAY + 100)
+        self.assertEqual( t, range( DAY + 20, DAY + 40, 2))
+        
+        writer = SFAArchiveWriter( self.directory, 'sfa1', ['other'])
+        writer.append( DAY + 50, { 0 : (1, ) })
+        self.assertRaises( ArchiveFormatError, writer.close)
+
+    def testColumnsChanged(self):
+        # After an upgrade that changed the columns:  the rest of that day
+        # is skipped (with one error) and the next day gets a new file
+        self._write( range( DAY, DAY + 20, 2), [0])
+        writer = SFAArchiveWriter( self.directory, 'sfa1', ['other'], 2)
+        writer.append( DAY + 50, { 0 : (1, ) })
+        self.assertRaises( ArchiveFormatError, writer.append, DAY + 52, { 0 : (2, ) })
+        for t in range( DAY + 54, DAY + 60, 2):
+            writer.append( t, { 0 : (3, ) })
+        writer.append( DAY + 86400, { 0 : (4, ) })
+        writer.close()
+        reader = SFAArchiveReader( archive_path( self.directory, 'sfa1', '20261002'))
+        try:
+            self.assertEqual( reader.read_lun( 0)[1]['other'], [ 4 ])
+        finally:
+            reader.close()
+        
+    def testDroppedOnError(self):
+        # A block that can't be written is dropped instead of piling up.
+        # (A file where the host's directory should be.)
+        blocker = os.path.join( self.directory, 'sfa1')
+        open( blocker, 'w').close()
+        writer = SFAArchiveWriter( self.directory, 'sfa1', COLUMNS, 2)
+        writer.append( DAY, { 0 : (1, 2, 0) })
+        self.assertRaises( EnvironmentError, writer.append, DAY + 2, { 0 : (1, 2, 0) })
+        os.remove( blocker)
+        writer.append( DAY + 4, { 0 : (1, 2, 0) })
+        writer.close()
+        (t, values) = read_lun_history( self.directory, 'sfa1', 0, DAY, DAY + 100)
+        self.assertEqual( t, [ DAY + 4 ])
+        
+    def testDayFiles(self):
+        self._write( range( DAY + 86400 - 10, DAY + 86400 + 10, 2), [0])
+        self.assertTrue( os.path.exists( archive_path( self.directory, 'sfa1', '20261001')))
+        self.assertTrue( os.path.exists( archive_path( self.directory, 'sfa1', '20261002')))
+        (t, values) = read_lun_history( self.directory, 'sfa1', 0, DAY, DAY + 2 * 86400)
+        self.assertEqual( t, range( DAY + 86400 - 10, DAY + 86400 + 10, 2))
+        
+    def testDamagedIndex(self):
+        # Lose the index (and half of the last block):  the complete blocks
+        # can still be read and the next writer carries on after them.
+        self._write( range( DAY, DAY + 40, 2), [0])
+        path = archive_path( self.directory, 'sfa1', '20261001')
+        reader = SFAArchiveReader( path)
+        last_block = reader.index[-1][0]
+        reader.close()
+        f = open( path, 'r+b')
+        f.truncate( last_block + 20)
+        f.close()
+        
+        (t, values) = read_lun_history( self.directory, 'sfa1', 0, DAY, DAY + 100)
+        self.assertEqual( t, range( DAY, DAY + 20, 2))
+        self._write( range( DAY + 40, DAY + 60, 2), [0])
+        (t, values) = read_lun_history( self.directory, 'sfa1', 0, DAY, DAY + 100)
+        self.assertEqual( t, range( DAY, DAY + 20, 2) + range( DAY + 40, DAY + 60, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import ConfigParser
+import StringIO
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFABackends import configured_backends
+
+class SFABackends_Test( unittest.TestCase):
+
+    def _config(self, text):
+        config = ConfigParser.ConfigParser()
+        config.readfp( StringIO.StringIO( text))
+        return config
+
+    def testConfigured(self):
+        config = self._config( "[SqlDb]\nhost=x\n[TSDb]\nhost=y\n"
+                               "[polling]\nrequest_summary = true\n")
+        self.assertEqual( configured_backends( config),
+                          [ 'sqldb', 'tsdb', 'request_summary' ])
+
+    def testOnlyTsdb(self):
+        config = self._config( "[TSDb]\nhost=y\n"
+                               "[polling]\nrequest_summary = false\n")
+        self.assertEqual( configured_backends( config), [ 'tsdb' ])
+
+    def testAnomalyDetection(self):
+        config = self._config( "[TSDb]\nhost=y\n[anomaly_detection]\n")
+        self.assertEqual( configured_backends( config),
+                          [ 'tsdb', 'anomaly_detection' ])
+
+    def testDeprecatedSection(self):
+        config = self._config( "[database]\ndb_host=x\n")
+        self.assertEqual( configured_backends( config), [ 'sqldb' ])
+
+
+if __name__ == '__main__':
+    unittest.main()
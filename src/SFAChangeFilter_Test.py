@@ -0,0 +1,82 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import threading
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFAChangeFilter import SFAChangeFilter
+
+HEARTBEAT = 60.0
+
+class SFAChangeFilter_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self._filter = SFAChangeFilter( HEARTBEAT)
+        
+    def testFirstWrite(self):
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1000.0))
+        
+    def testUnchangedSkipped(self):
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1000.0))
+        self.assertFalse( self._filter.should_write( 'lun', 1, (0, 0), 1002.0))
+        self.assertFalse( self._filter.should_write( 'lun', 1, (0, 0), 1058.0))
+        self.assertEqual( self._filter.take_suppressed_count(), 2)
+        self.assertEqual( self._filter.take_suppressed_count(), 0)
+        
+    def testChangedWritten(self):
+        self.assertTrue( self._filter.should_write( 'lun', 1, [0, 0], 1000.0))
+        self.assertTrue( self._filter.should_write( 'lun', 1, [0, 5], 1002.0))
+        self.assertFalse( self._filter.should_write( 'lun', 1, [0, 5], 1004.0))
+        
+    def testHeartbeat(self):
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1000.0))
+        self.assertFalse( self._filter.should_write( 'lun', 1, (0, 0), 1030.0))
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1060.0))
+        # heartbeat restarts from the last write
+        self.assertFalse( self._filter.should_write( 'lun', 1, (0, 0), 1100.0))
+        
+    def testTablesAndLunsIndependent(self):
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1000.0))
+        self.assertTrue( self._filter.should_write( 'raw_lun', 1, (0, 0), 1000.0))
+        self.assertTrue( self._filter.should_write( 'lun', 2, (0, 0), 1000.0))
+        
+    def testForgetLun(self):
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1000.0))
+        self.assertTrue( self._filter.should_write( 'raw_lun', 1, (0, 0), 1000.0))
+        self._filter.forget_lun( 1)
+        self.assertTrue( self._filter.should_write( 'lun', 1, (0, 0), 1002.0))
+        self.assertTrue( self._filter.should_write( 'raw_lun', 1, (0, 0), 1002.0))
+
+
+    def testThreads(self):
+        # The main thread and the background tier thread share the filter
+        def write( table):
+            for i in range( 5000):
+                self._filter.should_write( table, 1, (0, 0), 1000.0)
+        threads = [ threading.Thread( target = write, args = (table, ))
+                    for table in ('lun', 'read_size') ]
+        for thread in threads:
+            thread.start()
+        for unused_i in range( 100):
+            self._filter.forget_lun( 2)
+        for thread in threads:
+            thread.join()
+        self.assertEqual( self._filter.take_suppressed_count(), 2 * 4999)
+
+
+if __name__ == '__main__':
+    unittest.main()
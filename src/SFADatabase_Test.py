@@ -43,6 +43,59 @@ class Test(unittest.TestCase):
         db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True)
         # that's basically it: if we can create the object without throwing an
         # exception, the test passes.
+
+    def testCompactKeysInit(self):
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True,
+                         compact_keys = True)
+        db.update_dd_table( 'first', 0, 1, 1.0, 2.0, 3.0)
+        db.update_dd_table( 'second', 0, 1, 1.0, 2.0, 3.0)
+        self.assertNotEqual( db._host_key( 'first'), db._host_key( 'second'))
+        
+        # go back to the regular schema for the other tests
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True)
+
+    def testHistory(self):
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True,
+                         history_retention_days = 7, history_interval = 10)
+        for update_time in range( 1000, 1100, 2):
+            db.add_lun_history( 'first', update_time, 1, *range( 9))
+        self.assertEqual( len( db._history_rows), 10)
+        db.flush_history( True)
+        self.assertEqual( db._history_rows, [ ])
+
+    def testHistoryKeysMismatch(self):
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True,
+                         history_retention_days = 7)
+        # The history table is kept across re-inits, so it can't switch to
+        # the other host column
+        self.assertRaises( RuntimeError, SFAMySqlDb, DB_USER, DB_PASSWORD,
+                           DB_HOST, DB_NAME, True, compact_keys = True,
+                           history_retention_days = 7)
+        db._query_exec( "DROP TABLE LunHistory;")
+
+    def testTick(self):
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True)
+        for update_time in (1000, 1002):
+            db.begin_tick()
+            db.update_raw_lun_table( 'first', update_time, 1, *range( 9))
+            db.update_lun_request_size_table( 'first', update_time, 1, True,
+                                              range( 12))
+            db.end_tick()
+        # one prepared cursor per table, reused
+        self.assertEqual( len( db._cursors), 2)
+        self.assertRaises( RuntimeError, db.update_lun_request_size_table,
+                           'first', 1004, 1, True, range( 11))
+
+    def testNoWindowRates(self):
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True,
+                         rate_windows = [ 300 ])
+        db.update_lun_table( 'first', 1000, 1, *range( 8),
+                             window_rates = [ range( 7) ])
+        # after a counter reset:  the window columns are NULL
+        db.update_lun_table( 'first', 1002, 1, *range( 8), window_rates = None)
+        
+        # go back to the regular schema for the other tests
+        db = SFAMySqlDb( DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, True)
     
 '''
     Commenting out this function because it's *WAY* out of date.
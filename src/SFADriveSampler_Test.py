@@ -0,0 +1,63 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import logging
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFADriveSampler import SFADriveSampler
+
+NUM_DRIVES = 600
+TICK_INTERVAL = 2.0
+COVERAGE_PERIOD = 300.0     # 150 ticks -> 4 drives per tick
+
+class SFADriveSampler_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self._sampler = SFADriveSampler( COVERAGE_PERIOD, logging.getLogger( 'test'))
+        self._sampler.set_drives( range( NUM_DRIVES))
+        
+    def testDrivesPerTick(self):
+        self.assertEqual( self._sampler.drives_per_tick( TICK_INTERVAL), 4)
+        self.assertEqual( len( list( self._sampler.this_tick( TICK_INTERVAL))), 4)
+        
+    def testFullCoverage(self):
+        # Every drive should be visited exactly once per coverage period
+        visited = [ ]
+        for unused_i in range( int( COVERAGE_PERIOD / TICK_INTERVAL)):
+            visited.extend( self._sampler.this_tick( TICK_INTERVAL))
+        self.assertEqual( sorted(visited), range( NUM_DRIVES))
+        
+    def testEarlyStop(self):
+        # Stopping early (ie: out of time) should pick up where we left off
+        for index in self._sampler.this_tick( TICK_INTERVAL):
+            break
+        self.assertEqual( index, 0)
+        self.assertEqual( list( self._sampler.this_tick( TICK_INTERVAL)), [1, 2, 3, 4])
+        
+    def testDriveListChange(self):
+        # Shrink the list out from under the sampler - it should wrap around
+        for unused_i in range( 10):
+            list( self._sampler.this_tick( TICK_INTERVAL))
+        self._sampler.set_drives( range( 20))
+        self.assertEqual( list( self._sampler.this_tick( TICK_INTERVAL)), [0])
+        
+        # And an empty list means nothing to do
+        self._sampler.set_drives( [])
+        self.assertEqual( list( self._sampler.this_tick( TICK_INTERVAL)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
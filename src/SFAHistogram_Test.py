@@ -0,0 +1,111 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import math
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFAHistogram import bucket_edges, \
+        estimate_percentiles, estimate_means, HistogramDeltas, SFARequestSummary
+
+# Same as EXPECTED_SIZE_LABELS and EXPECTED_LUN_LATENCY_LABELS[3] in SFAClient
+# (which we can't import without the DDN API)
+EXPECTED_SIZE_LABELS = ['<=4KiB', '<=8KiB', '<=16KiB', '<=32KiB',
+    '<=64KiB', '<=128KiB', '<=256KiB', '<=512KiB', '<=1MiB',
+    '<=2MiB', '<=4MiB', '>4MiB']
+LATENCY_LABELS = ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
+    '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
+
+
+class FakeStats(object):
+    '''
+    Just the histogram attributes of an SFAVirtualDiskStatistics object
+    '''
+    def __init__(self, read_lat, write_lat, read_size, write_size):
+        self.ReadIOLatencyBuckets = read_lat
+        self.WriteIOLatencyBuckets = write_lat
+        self.ReadIOSizeBuckets = read_size
+        self.WriteIOSizeBuckets = write_size
+
+
+class SFAHistogram_Test( unittest.TestCase):
+    
+    def testBucketEdges(self):
+        (lower, upper) = bucket_edges( LATENCY_LABELS)
+        self.assertEqual( list(upper[:3]), [4.0, 8.0, 16.0])
+        self.assertEqual( lower[0], 0.0)
+        self.assertEqual( lower[8], 512.0)
+        self.assertEqual( upper[8], 1000.0)
+        self.assertEqual( (lower[-1], upper[-1]), (4000.0, 8000.0))
+        
+        (lower, upper) = bucket_edges( EXPECTED_SIZE_LABELS)
+        self.assertEqual( upper[0], 4096.0)
+        self.assertEqual( upper[10], 4.0 * 1024 * 1024)
+        
+        self.assertRaises( ValueError, bucket_edges, ['~4ms'])
+        
+    def testPercentiles(self):
+        (lower, upper) = bucket_edges( LATENCY_LABELS)
+        # 100 requests, all in the 8-16ms bucket
+        deltas = [[0, 0, 100] + [0] * 9,
+                  [0] * 12]
+        est = estimate_percentiles( deltas, lower, upper, (50.0, 90.0, 99.0))
+        self.assertAlmostEqual( est[0][0], 12.0)
+        self.assertAlmostEqual( est[0][1], 15.2)
+        self.assertAlmostEqual( est[0][2], 15.92)
+        # no requests -> NaN
+        self.assertTrue( math.isnan( est[1][0]))
+        
+        # half in the first bucket, half in the second
+        est = estimate_percentiles( [[50, 50] + [0] * 10], lower, upper, (50.0, 90.0))
+        self.assertAlmostEqual( est[0][0], 4.0)
+        self.assertAlmostEqual( est[0][1], 7.2)
+        
+    def testMeans(self):
+        (lower, upper) = bucket_edges( EXPECTED_SIZE_LABELS)
+        means = estimate_means( [[10] + [0] * 11, [0] * 12], lower, upper)
+        self.assertEqual( means[0], 2048.0)
+        self.assertTrue( math.isnan( means[1]))
+        
+    def testDeltas(self):
+        deltas = HistogramDeltas()
+        self.assertEqual( deltas.update( (1, 2), [[5, 5], [1, 1]]).tolist(),
+                          [[0, 0], [0, 0]])
+        self.assertEqual( deltas.update( (1, 2), [[7, 5], [2, 4]]).tolist(),
+                          [[2, 0], [1, 3]])
+        # LUN 3 is new, LUN 1 is gone and LUN 2's counters were reset
+        self.assertEqual( deltas.update( (2, 3), [[1, 0], [9, 9]]).tolist(),
+                          [[1, 0], [0, 0]])
+        
+    def testSummary(self):
+        summary = SFARequestSummary( LATENCY_LABELS, EXPECTED_SIZE_LABELS)
+        idle = [0] * 12
+        stats = { 5 : FakeStats( idle, idle, idle, idle) }
+        self.assertEqual( summary.update( stats), { 5 : (None,) * 8 })
+        
+        busy = [0, 0, 100] + [0] * 9
+        stats = { 5 : FakeStats( busy, idle, busy, idle) }
+        result = summary.update( stats)[5]
+        self.assertAlmostEqual( result[0], 12.0)
+        self.assertEqual( result[3:6], (None, None, None))
+        self.assertEqual( result[6], 12288.0)
+        self.assertEqual( result[7], None)
+        
+        self.assertEqual( summary.update( { }), { })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import logging
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFAOverloadPolicy import SFAOverloadPolicy
+from DDNToolSupport.SFAClientUtils import SFAOverloadPolicy as Policy
+
+LIMIT = 1.6     # seconds
+SLOW_TICK = 2.5
+FAST_TICK = 0.5
+
+class SFAOverloadPolicy_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self._policy = SFAOverloadPolicy( logging.getLogger( 'test'),
+                                          escalate_ticks = 3, recover_ticks = 5)
+    
+    def testEscalation(self):
+        # Two overruns aren't enough to change anything
+        for unused_i in range(2):
+            self._policy.tick_completed( SLOW_TICK, LIMIT)
+        self.assertEqual( self._policy.level, Policy.LEVEL_NORMAL)
+        
+        # Third one moves us up a level
+        self._policy.tick_completed( SLOW_TICK, LIMIT)
+        self.assertEqual( self._policy.level, Policy.LEVEL_DEFER_SLOW)
+        self.assertTrue( self._policy.defer_slow_tier())
+        self.assertFalse( self._policy.defer_histograms())
+        
+        # Keep overrunning until we hit the top
+        for unused_i in range(20):
+            self._policy.tick_completed( SLOW_TICK, LIMIT)
+        self.assertEqual( self._policy.level, Policy.LEVEL_STRETCH_FAST)
+        self.assertTrue( self._policy.defer_histograms())
+    
+    def testOverrunCountResets(self):
+        # A single good iteration should reset the overrun count
+        for unused_i in range(10):
+            self._policy.tick_completed( SLOW_TICK, LIMIT)
+            self._policy.tick_completed( SLOW_TICK, LIMIT)
+            self._policy.tick_completed( FAST_TICK, LIMIT)
+        self.assertEqual( self._policy.level, Policy.LEVEL_NORMAL)
+    
+    def testRecovery(self):
+        for unused_i in range(9):
+            self._policy.tick_completed( SLOW_TICK, LIMIT)
+        self.assertEqual( self._policy.level, Policy.LEVEL_STRETCH_FAST)
+        
+        # Recover one level at a time
+        for expected in [ Policy.LEVEL_DEFER_HISTOGRAMS,
+                          Policy.LEVEL_DEFER_SLOW,
+                          Policy.LEVEL_NORMAL]:
+            for unused_i in range(5):
+                self._policy.tick_completed( FAST_TICK, LIMIT)
+            self.assertEqual( self._policy.level, expected)
+            
+    def testSkipTick(self):
+        # No skipping unless we're at the top level
+        for unused_i in range(10):
+            self.assertFalse( self._policy.skip_tick())
+        
+        for unused_i in range(9):
+            self._policy.tick_completed( SLOW_TICK, LIMIT)
+        skipped = [ self._policy.skip_tick() for unused_i in range(10)]
+        self.assertEqual( skipped.count(True), 5)
+        
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import Queue
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFAPrometheus import SFAPrometheus, bucket_bounds
+
+SIZE_LABELS = ['<=4KiB', '<=8KiB', '<=16KiB', '<=32KiB', '<=64KiB',
+    '<=128KiB', '<=256KiB', '<=512KiB', '<=1MiB', '<=2MiB', '<=4MiB', '>4MiB']
+LATENCY_LABELS = ['<=4ms', '<=8ms', '<=16ms', '<=32ms', '<=64ms', '<=128ms',
+    '<=256ms', '<=512ms', '<=1s', '<=2s', '<=4s', '>4s']
+
+class SFAPrometheus_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self._queue = Queue.Queue( 1)
+        self._prom = SFAPrometheus( 'sfa1', self._queue, LATENCY_LABELS, SIZE_LABELS)
+        
+    def _flush(self):
+        self._prom.flush_to_db()
+        (kind, host, families) = self._queue.get_nowait()
+        self.assertEqual( (kind, host), ('metrics', 'sfa1'))
+        return dict( [ (f[0], f[1:]) for f in families ])
+        
+    def testBounds(self):
+        self.assertEqual( bucket_bounds( LATENCY_LABELS)[:3], ['0.004', '0.008', '0.016'])
+        self.assertEqual( bucket_bounds( LATENCY_LABELS)[-2:], ['4', '+Inf'])
+        self.assertEqual( bucket_bounds( SIZE_LABELS)[-2], '4194304')
+        self.assertEqual( bucket_bounds( ['<=1s', '<=2s']), ['1', '2', '+Inf'])
+        
+    def testCounters(self):
+        self._prom.update_lun_series( 3, 10, 20, 30, 40, 5L, 6, 7, 8, 0)
+        families = self._flush()
+        self.assertEqual( families['ddntool_lun_ios_total'],
+                          ('counter', 'Total I/O requests',
+                           ['ddntool_lun_ios_total{sfa_host="sfa1",lun="3"} 5']))
+        self.assertEqual( families['ddntool_lun_pool_state'][2],
+                          ['ddntool_lun_pool_state{sfa_host="sfa1",lun="3"} 0'])
+        
+    def testHistogram(self):
+        self._prom.update_lun_request_latency_series( 3, True, [1, 2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4])
+        lines = self._flush()['ddntool_lun_read_latency_seconds'][2]
+        self.assertEqual( lines[0], 'ddntool_lun_read_latency_seconds_bucket{sfa_host="sfa1",lun="3",le="0.004"} 1')
+        self.assertEqual( lines[1], 'ddntool_lun_read_latency_seconds_bucket{sfa_host="sfa1",lun="3",le="0.008"} 3')
+        self.assertEqual( lines[11], 'ddntool_lun_read_latency_seconds_bucket{sfa_host="sfa1",lun="3",le="+Inf"} 7')
+        self.assertEqual( lines[12], 'ddntool_lun_read_latency_seconds_count{sfa_host="sfa1",lun="3"} 7')
+        
+    def testQueueFull(self):
+        self._queue.put( 'something')
+        self._prom.update_self_metrics( 1000, 0.5, 10, 0)
+        self._prom.flush_to_db()    # shouldn't block or throw
+        
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import ConfigParser
+import StringIO
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFARateWindows import SFARateWindows, \
+        window_suffix, parse_rate_windows
+from DDNToolSupport.SFAClientUtils.SFATimeSeries import EmptyTimeSeriesException
+
+TICK = 2.0
+WINDOWS = (60, 300, 900)
+
+class SFARateWindows_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self._rates = SFARateWindows( WINDOWS)
+        
+    def _fill(self, seconds, rate, start_value = 0, start_time = 1000.0):
+        '''
+        Appends values increasing at 'rate' per second for 'seconds' seconds
+        '''
+        t = start_time
+        value = start_value
+        while t <= start_time + seconds:
+            self._rates.append( value, t)
+            t += TICK
+            value += rate * TICK
+        return (value - rate * TICK, t - TICK)
+        
+    def testEmpty(self):
+        self.assertRaises( EmptyTimeSeriesException, self._rates.rate, 60)
+        self._rates.append( 10, 1000.0)
+        self.assertRaises( EmptyTimeSeriesException, self._rates.rate, 60)
+        
+    def testConstantRate(self):
+        self._fill( 2000, 5.0)
+        for window in WINDOWS:
+            (rate, span) = self._rates.rate( window)
+            self.assertAlmostEqual( rate, 5.0)
+            self.assertTrue( window <= span <= window * 1.1)
+            
+    def testShortHistory(self):
+        self._fill( 100, 5.0)
+        (rate, span) = self._rates.rate( 900)
+        self.assertAlmostEqual( rate, 5.0)
+        self.assertAlmostEqual( span, 100.0)
+        
+    def testWindowsDiffer(self):
+        # slow for a long time, then fast for the last 2 minutes
+        (value, t) = self._fill( 2000, 1.0)
+        self._fill( 120, 10.0, value, t)
+        self.assertAlmostEqual( self._rates.rate( 60)[0], 10.0, 0)
+        self.assertTrue( self._rates.rate( 300)[0] < 10.0)
+        self.assertTrue( self._rates.rate( 900)[0] < self._rates.rate( 300)[0])
+        
+    def testBoundedMemory(self):
+        self._fill( 20000, 1.0)
+        self.assertTrue( self._rates.size() <= (30 + 2) * len(WINDOWS))
+        
+    def testCounterReset(self):
+        self._fill( 1000, 5.0, 1000000)
+        self._rates.append( 0, 2002.0)
+        self._rates.append( 10, 2004.0)
+        self.assertAlmostEqual( self._rates.rate( 900)[0], 5.0)
+        
+    def testConfig(self):
+        self.assertEqual( window_suffix( 300), '5m')
+        self.assertEqual( window_suffix( 90), '90s')
+        
+        config = ConfigParser.ConfigParser()
+        config.readfp( StringIO.StringIO( "[polling]\n"))
+        self.assertEqual( parse_rate_windows( config), ())
+        config.set( 'polling', 'rate_windows', '900, 60,300,')
+        self.assertEqual( parse_rate_windows( config), (60, 300, 900))
+        config.set( 'polling', 'rate_windows', '0')
+        self.assertRaises( ValueError, parse_rate_windows, config)
+
+
+if __name__ == '__main__':
+    unittest.main()
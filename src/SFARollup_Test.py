@@ -0,0 +1,71 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import time
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFARollup import SFARollup, RollupTier
+
+class SFARollup_Test( unittest.TestCase):
+    
+    def testTierConsolidation(self):
+        tier = RollupTier( 60, 10)
+        for (value, t) in ((1.0, 600.0), (5.0, 620.0), (3.0, 659.0), (7.0, 660.0)):
+            tier.add( value, t)
+        self.assertEqual( tier.fetch( 600.0, 660.0, 'avg'), [(600.0, 3.0), (660.0, 7.0)])
+        self.assertEqual( tier.fetch( 600.0, 660.0, 'max'), [(600.0, 5.0), (660.0, 7.0)])
+        self.assertEqual( tier.fetch( 600.0, 660.0, 'last'), [(600.0, 3.0), (660.0, 7.0)])
+        self.assertRaises( ValueError, tier.fetch, 600.0, 660.0, 'median')
+        
+    def testTierWraps(self):
+        tier = RollupTier( 60, 10)
+        tier.add( 1.0, 0.0)
+        tier.add( 2.0, 600.0)   # same row as time 0
+        self.assertEqual( tier.fetch( 0.0, 600.0, 'avg'), [(600.0, 2.0)])
+        
+    def testPickTier(self):
+        rollup = SFARollup( ['read'])
+        now = time.time()
+        self.assertEqual( rollup.pick_tier( 'read', now - 300, now).step, 2)
+        self.assertEqual( rollup.pick_tier( 'read', now - 3600, now).step, 60)
+        self.assertEqual( rollup.pick_tier( 'read', now - 7 * 86400, now).step, 600)
+        self.assertEqual( rollup.pick_tier( 'read', now - 90 * 86400, now).step, 600)
+        
+    def testQuery(self):
+        rollup = SFARollup( ['read', 'write'])
+        now = time.time()
+        start = now - 1200
+        t = start
+        while t <= now:
+            rollup.add( 'read', 10.0, t)
+            t += 2
+        
+        (step, points) = rollup.query( 'read', now - 300)
+        self.assertEqual( step, 2)
+        self.assertTrue( 145 <= len( points) <= 151)
+        
+        (step, points) = rollup.query( 'read', start)
+        self.assertEqual( step, 60)
+        self.assertTrue( 20 <= len( points) <= 22)
+        self.assertEqual( set( [v for (unused, v) in points]), set( [10.0]))
+        
+        self.assertEqual( rollup.query( 'write', start)[1], [ ])
+        self.assertRaises( ValueError, rollup.query, 'read', start, None, 'min')
+
+
+if __name__ == '__main__':
+    unittest.main()
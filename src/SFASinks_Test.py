@@ -0,0 +1,178 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import Queue
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFASinks import SFASink, SqlDbSink, \
+        ArchiveSink, StatusSink, HistorySink, FastRecord, MediumRecord, \
+        SlowRecord, LunRecord, \
+        MediumLunRecord, CollectorStats, LunHistograms, DriveRecord, \
+        DriveStatsRecord, load_sink_class, lun_histograms, FAST, MEDIUM, SLOW, \
+        DRIVES
+
+HISTOGRAMS = LunHistograms( (1,) * 12, (2,) * 12, (3,) * 12, (4,) * 12)
+RAW = (10, 20, 30, 40, 5, 6, 7, 8)
+RATES = (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0)
+
+def fast_record( rates = RATES, window_rates = ()):
+    luns = ( LunRecord( 3, RAW, 0, rates, window_rates, HISTOGRAMS), )
+    return FastRecord( FAST, 'sfa1', 1000, luns, CollectorStats( 0.5, 9, 0, 2.0),
+                       1000.5)
+
+
+class FakeSqlDb(object):
+    '''
+    Records the calls SqlDbSink makes
+    '''
+    def __init__(self):
+        self.calls = [ ]
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append( (name, args))
+
+
+class SFASinks_Test( unittest.TestCase):
+
+    def testDispatch(self):
+        class TierSink( SFASink):
+            def __init__(self):
+                self.seen = [ ]
+            def fast(self, record):
+                self.seen.append( 'fast')
+            def slow(self, record):
+                self.seen.append( 'slow')
+        sink = TierSink()
+        sink.write( fast_record())
+        sink.write( MediumRecord( MEDIUM, 'sfa1', 1000, ()))
+        sink.write( SlowRecord( SLOW, 'sfa1', 1000))
+        self.assertEqual( sink.seen, [ 'fast', 'slow' ])
+
+    def testSqlDb(self):
+        db = FakeSqlDb()
+        sink = SqlDbSink( db, lambda table, lun, values, update_time: True)
+        sink.write( fast_record())
+        self.assertEqual( [ c[0] for c in db.calls ],
+                          [ 'update_lun_table', 'update_raw_lun_table',
+                            'add_lun_history', 'flush_history' ])
+        self.assertEqual( db.calls[0][1], ('sfa1', 1000, 3) + RATES + (0, ))
+
+        # Not enough data for the rates yet:  only the raw counters
+        db.calls = [ ]
+        sink.write( fast_record( rates = None, window_rates = None))
+        self.assertEqual( db.calls[0][0], 'update_raw_lun_table')
+        
+        # Right after a counter reset, the 60 second rates are back before
+        # the window rates.  They're still written.
+        db.calls = [ ]
+        sink.write( fast_record( window_rates = None))
+        self.assertEqual( db.calls[0], ('update_lun_table',
+                                        ('sfa1', 1000, 3) + RATES + (0, )))
+
+        db.calls = [ ]
+        luns = ( MediumLunRecord( 3, HISTOGRAMS, None), )
+        sink.write( MediumRecord( MEDIUM, 'sfa1', 1000, luns))
+        self.assertEqual( [ c[1][3] for c in db.calls ], [ True, False, True, False ])
+        self.assertEqual( db.calls[3], ('update_lun_request_latency_table',
+                                        ('sfa1', 1000, 3, False, (4,) * 12)))
+
+    def testSqlDbDrives(self):
+        db = FakeSqlDb()
+        sink = SqlDbSink( db, lambda table, lun, values, update_time: True)
+        self.assertTrue( DRIVES in sink.tiers)
+        # The first visit to a drive has no rates.  Each drive keeps its
+        # own update time.
+        drives = ( DriveStatsRecord( 7, 990, HISTOGRAMS, None),
+                   DriveStatsRecord( 8, 995, HISTOGRAMS, (100.0, 1.0, 2.0)) )
+        sink.write( DriveRecord( DRIVES, 'sfa1', 1000, drives))
+        self.assertEqual( [ c[0] for c in db.calls ],
+                          [ 'update_dd_request_size_table' ] * 2 +
+                          [ 'update_dd_request_latency_table' ] * 2 +
+                          [ 'update_dd_request_size_table' ] * 2 +
+                          [ 'update_dd_request_latency_table' ] * 2 +
+                          [ 'update_dd_table' ])
+        self.assertEqual( db.calls[0][1], ('sfa1', 990, 7, True, (1,) * 12))
+        self.assertEqual( db.calls[-1][1], ('sfa1', 995, 8, 100.0, 1.0, 2.0))
+
+    def testArchiveErrors(self):
+        class FullDisk(object):
+            def append(self, update_time, rows):
+                raise IOError( 28, 'No space left on device')
+            close = lambda self: self.append( None, None)
+        # Logged, not raised:  the archive mustn't stop the other outputs
+        sink = ArchiveSink( FullDisk())
+        sink.write( fast_record())
+        sink.close()
+
+    def testStatus(self):
+        queue = Queue.Queue()
+        sink = StatusSink( queue, [ 300 ])
+        sink.write( fast_record( window_rates = (RATES, )))
+        (kind, host, snapshot) = queue.get_nowait()
+        self.assertEqual( (kind, host), ('status', 'sfa1'))
+        self.assertEqual( snapshot['fast_poll_interval'], 2.0)
+        lun = snapshot['luns'][3]
+        self.assertEqual( lun['read_iops'], 4.0)
+        self.assertEqual( lun['raw']['total_ios'], 5)
+        self.assertEqual( lun['windows']['5m']['forwarded_iops'], 7.0)
+        
+        # No window rates (counter reset):  the LUN is still there
+        sink.write( fast_record( window_rates = None))
+        lun = queue.get_nowait()[2]['luns'][3]
+        self.assertEqual( lun['read_iops'], 4.0)
+        self.assertFalse( 'windows' in lun)
+
+    def testHistory(self):
+        def record( sample_time, raws):
+            luns = tuple( [ LunRecord( lun_num, raw, 0, None, None, HISTOGRAMS)
+                            for (lun_num, raw) in raws ])
+            return FastRecord( FAST, 'sfa1', 1000, luns,
+                               CollectorStats( 0.5, 9, 0, 2.0), sample_time)
+        queue = Queue.Queue()
+        sink = HistorySink( queue)
+        sink.write( record( 100.0, [ (1, (100,) * 8), (2, (200,) * 8) ]))
+        self.assertTrue( queue.empty())
+        
+        sink.write( record( 102.0, [ (1, (110,) * 8), (2, (220,) * 8) ]))
+        (kind, host, (update_time, timestamp, rates)) = queue.get_nowait()
+        self.assertEqual( (kind, host, update_time, timestamp),
+                          ('history', 'sfa1', 1000, 102.0))
+        self.assertEqual( rates['read_bw'], 15.0)
+        self.assertEqual( rates['forwarded_iops'], 15.0)
+        
+        # LUN 2 was reset and LUN 3 is new:  only LUN 1 counts
+        sink.write( record( 104.0, [ (1, (120,) * 8), (2, (5,) * 8),
+                                     (3, (1000,) * 8) ]))
+        (kind, host, (update_time, timestamp, rates)) = queue.get_nowait()
+        self.assertEqual( rates['write_iops'], 5.0)
+
+    def testLunHistograms(self):
+        class Stats(object):
+            ReadIOSizeBuckets = [ 1L, 2L ]
+            WriteIOSizeBuckets = [ 3L ]
+            ReadIOLatencyBuckets = [ ]
+            WriteIOLatencyBuckets = [ 4.0 ]
+        h = lun_histograms( Stats())
+        self.assertEqual( h, ((1, 2), (3, ), (), (4, )))
+        self.assertEqual( type( h.WriteIOLatencyBuckets[0]), int)
+
+    def testLoadClass(self):
+        self.assertTrue( load_sink_class(
+                'DDNToolSupport.SFAClientUtils.SFASinks.StatusSink') is StatusSink)
+        self.assertRaises( ValueError, load_sink_class, 'StatusSink')
+
+
+if __name__ == '__main__':
+    unittest.main()
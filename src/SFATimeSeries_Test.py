@@ -139,6 +139,48 @@ class SFATimeSeries_Test( unittest.TestCase):
         result = local_series.average(0.0001)
         # If this doesn't divide by zero, the test passes
         
+    # verify the average() skips the interval where the counter was reset
+    # (The old version returned the abs() of the change, which was huge.)
+    def testResetAverage(self):
+        local_series = SFATimeSeries()
+        for value in [ 0, 100, 200 ]:
+            self.assertFalse( local_series.append( value))
+            time.sleep( 0.05)
+        self.assertTrue( local_series.append( 5))     # reset
+        time.sleep( 0.05)
+        local_series.append( 105)
+        
+        (average, span) = local_series.average( 10)
+        # Three 0.05 second intervals where it counted up 100 each time
+        self.assertAlmostEqual( span, 0.15, delta=0.03)
+        self.assertAlmostEqual( average, 2000, delta=400)
+        
+        # Only the reset interval in the span
+        local_series = SFATimeSeries()
+        local_series.append( 100)
+        time.sleep( 0.01)
+        local_series.append( 5)
+        self.assertRaises( EmptyTimeSeriesException, local_series.average, 10)
+        
+    # verify the average() uses the time stamps passed to append()
+    def testTimestamps(self):
+        local_series = SFATimeSeries()
+        for (value, timestamp) in [ (0, 1000.0), (30, 1002.0), (60, 1004.0) ]:
+            local_series.append( value, timestamp)
+        self.assertEqual( local_series.get( -1), (60, 1004.0))
+        self.assertEqual( local_series.average( 4), (15.0, 4.0))
+        self.assertEqual( local_series.average( 2), (15.0, 2.0))
+        
+    # verify a reset that's been dropped off the front of the series
+    # doesn't matter anymore
+    def testResetDropped(self):
+        local_series = SFATimeSeries( 3)
+        for value in [ 50, 5, 10, 15, 20 ]:
+            local_series.append( value)
+            time.sleep( 0.02)
+        self.assertEqual( local_series._resets, [ ])
+        self.assertTrue( local_series.average( 10)[0] > 0)
+        
         
         
         
@@ -0,0 +1,87 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import unittest
+
+from DDNToolSupport.SFAClientUtils.SFATopology import SFATopology, make_fingerprint
+
+
+class FakePresentation(object):
+    '''Stands in for an SFAPresentation object'''
+    def __init__(self, vd_index, lun):
+        self.VirtualDiskIndex = vd_index
+        self.LUN = lun
+
+class FakeVirtualDisk(object):
+    '''Stands in for an SFAVirtualDisk object'''
+    def __init__(self, index, pool_index):
+        self.Index = index
+        self.PoolIndex = pool_index
+
+
+class SFATopology_Test( unittest.TestCase):
+
+    def setUp(self):
+        # 4 virtual disks on 2 pools.  Virtual disk 3 isn't presented.
+        self._presentations = [ FakePresentation( 0, 10), FakePresentation( 1, 11),
+                                FakePresentation( 2, 12)]
+        self._virt_disks = [ FakeVirtualDisk( 0, 0), FakeVirtualDisk( 1, 0),
+                             FakeVirtualDisk( 2, 1), FakeVirtualDisk( 3, 1)]
+        self._topology = SFATopology.build( self._presentations, self._virt_disks,
+                                            [0, 1], 1)
+
+    def testBuild(self):
+        self.assertEqual( self._topology.luns(), set([10, 11, 12]))
+        self.assertEqual( self._topology.lun_pool_states( {0: 'OK', 1: 'DEGRADED'}),
+                          {10: 'OK', 11: 'OK', 12: 'DEGRADED'})
+        
+    def testFingerprint(self):
+        vd_to_lun = { 0 : 10, 1 : 11, 2 : 12 }
+        # Order doesn't matter
+        self.assertTrue( self._topology.is_current(
+                make_fingerprint( [3, 2, 1, 0], [1, 0], vd_to_lun), 600))
+        # Added virtual disk
+        self.assertFalse( self._topology.is_current(
+                make_fingerprint( [0, 1, 2, 3, 4], [0, 1], vd_to_lun), 600))
+        # Removed pool
+        self.assertFalse( self._topology.is_current(
+                make_fingerprint( [0, 1, 2, 3], [0], vd_to_lun), 600))
+        # Virtual disk 2 re-mapped to a different LUN (same indexes)
+        self.assertFalse( self._topology.is_current(
+                make_fingerprint( [0, 1, 2, 3], [0, 1], { 0 : 10, 1 : 11, 2 : 13 }), 600))
+        # Virtual disk 3 presented
+        self.assertFalse( self._topology.is_current(
+                make_fingerprint( [0, 1, 2, 3], [0, 1], { 0 : 10, 1 : 11, 2 : 12, 3 : 13 }), 600))
+        # Too old
+        self.assertFalse( self._topology.is_current(
+                make_fingerprint( [0, 1, 2, 3], [0, 1], vd_to_lun), -1))
+        # The empty topology never matches anything
+        self.assertFalse( SFATopology.empty().is_current( make_fingerprint( [], [], { }), 600))
+        
+    def testSameLayout(self):
+        rebuilt = SFATopology.build( self._presentations, self._virt_disks, [0, 1], 2)
+        self.assertTrue( rebuilt.same_layout( self._topology))
+        
+        # Re-map a virtual disk to a different LUN without changing any indexes
+        self._presentations[2] = FakePresentation( 2, 13)
+        rebuilt = SFATopology.build( self._presentations, self._virt_disks, [0, 1], 2)
+        self.assertFalse( rebuilt.same_layout( self._topology))
+        self.assertEqual( rebuilt.luns() - self._topology.luns(), set([13]))
+        self.assertEqual( self._topology.luns() - rebuilt.luns(), set([12]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from DDNToolSupport.sharding import LeaseManager, rendezvous_owner
+
+HOSTS = [ 'sfa%d'%i for i in range(20) ]
+
+class Sharding_Test( unittest.TestCase):
+
+    def setUp(self):
+        self.lease_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree( self.lease_dir)
+
+    def testRendezvous(self):
+        nodes = [ 'node1', 'node2', 'node3' ]
+        owners = dict( [ (h, rendezvous_owner( h, nodes)) for h in HOSTS ])
+        self.assertEqual( set( owners.values()), set( nodes))
+        # Removing a node only moves the hosts that node had
+        for h in HOSTS:
+            new_owner = rendezvous_owner( h, [ 'node1', 'node3' ])
+            if owners[h] != 'node2':
+                self.assertEqual( new_owner, owners[h])
+
+    def testSplitAndTakeover(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 30)
+        node2 = LeaseManager( self.lease_dir, 'node2', 30)
+
+        # node1 starts alone and takes everything
+        self.assertEqual( node1.update( HOSTS, 1000), set( HOSTS))
+        # node2 wants half, but node1's leases haven't expired
+        self.assertEqual( node2.update( HOSTS, 1001), set())
+
+        # node1 notices node2 and gives its hosts up
+        owned1 = node1.update( HOSTS, 1011)
+        self.assertTrue( 0 < len( owned1) < len( HOSTS))
+        for h in set( HOSTS) - owned1:
+            node1.release( h)
+        owned2 = node2.update( HOSTS, 1012)
+        self.assertEqual( owned1 | owned2, set( HOSTS))
+        self.assertEqual( owned1 & owned2, set())
+
+        # node1 dies.  node2 takes over once node1's leases expire.
+        self.assertEqual( node2.update( HOSTS, 1030), owned2)
+        self.assertEqual( node2.update( HOSTS, 1050), set( HOSTS))
+
+    def testThrottle(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 30)
+        self.assertEqual( node1.update( HOSTS[:2], 1000), set( HOSTS[:2]))
+        # Less than lease_time / 3 later:  returns the cached answer
+        self.assertEqual( node1.update( HOSTS, 1005), set( HOSTS[:2]))
+        self.assertEqual( node1.update( HOSTS, 1010), set( HOSTS))
+
+    def testRenewDoesntSteal(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 30)
+        node2 = LeaseManager( self.lease_dir, 'node2', 30)
+        self.assertEqual( node1.update( HOSTS[:1], 1000), set( HOSTS[:1]))
+        # node1 stops renewing (hung), its lease expires and node2 takes
+        # over.  (node2 is the only live node by then.)
+        self.assertEqual( node2.update( HOSTS[:1], 1040), set( HOSTS[:1]))
+        # node1 comes back, but now hashes the host to node2.  It must not
+        # renew node2's lease.
+        node1._held.add( HOSTS[0])
+        self.assertFalse( node1._renew( HOSTS[0], 1041))
+        self.assertEqual( node1._read_lease( node1._lease_path( HOSTS[0]))[0],
+                          'node2')
+
+    def testSharedDirError(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 30)
+        self.assertEqual( node1.update( HOSTS[:2], 1000), set( HOSTS[:2]))
+        def broken( now):
+            raise OSError( 5, 'Input/output error')
+        node1.live_nodes = broken
+        # Keeps the hosts it had and tries again on the next call
+        self.assertEqual( node1.update( HOSTS, 1010), set( HOSTS[:2]))
+        del node1.live_nodes
+        self.assertEqual( node1.update( HOSTS, 1011), set( HOSTS))
+
+    def testRenew(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 30)
+        node2 = LeaseManager( self.lease_dir, 'node2', 30)
+        node1.update( HOSTS[:2], 1000)
+        # The main loop is stuck, but the leases and heartbeat stay fresh
+        node1.renew( 1025)
+        node1.renew( 1050)
+        self.assertEqual( node2.live_nodes( 1060), [ 'node1', 'node2' ])
+        self.assertEqual( node2.update( HOSTS[:2], 1060), set())
+
+        # A lease someone else took over is dropped
+        node2._write_file( node2._lease_path( HOSTS[0]), 'node2 2000\n')
+        node1.renew( 1060)
+        self.assertEqual( node1._held, set( HOSTS[1:2]))
+
+    def testRenewThread(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 0.03)
+        node1.update( HOSTS[:1])
+        node1.start()
+        time.sleep( 0.1)
+        node1.release_all()
+        self.assertEqual( node1._renewer, None)
+        self.assertEqual( os.listdir( os.path.join( self.lease_dir, 'leases')), [ ])
+
+    def testReleaseAll(self):
+        node1 = LeaseManager( self.lease_dir, 'node1', 30)
+        node2 = LeaseManager( self.lease_dir, 'node2', 30)
+        node1.update( HOSTS, 1000)
+        node1.release_all()
+        self.assertEqual( node2.live_nodes( 1001), [ 'node2' ])
+        self.assertEqual( node2.update( HOSTS, 1001), set( HOSTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+# Copyright 2026 UT Battelle, LLC
+# 
+# This work was supported by the Oak Ridge Leadership Computing Facility at
+# the Oak Ridge National Laboratory, which is managed by UT Battelle, LLC for
+# the U.S. DOE (under the contract No. DE-AC05-00OR22725).
+# 
+# This file is part of DDNTool_v2.
+# 
+# DDNTool_v2 is free software: you can redistribute it and/or modify it under
+# the terms of the UT-Battelle Permissive Open Source License.  (See the
+# License.pdf file for details.)
+# 
+# DDNTool_v2 is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.
+
+
+import gzip
+import httplib
+import json
+import Queue
+import StringIO
+import time
+import unittest
+
+from DDNToolSupport.status_server import StatusCache, MetricsCache, \
+        HistoryCache, StatusServer, SnapshotReader
+
+SNAPSHOT = { 'update_time' : 1000,
+             'luns' : { 1 : { 'read_bw' : 10.0, 'pool_state' : 0 } } }
+
+class StatusCache_Test( unittest.TestCase):
+    
+    def testRender(self):
+        cache = StatusCache()
+        self.assertEqual( cache.get( '/luns/sfa1'), None)
+        self.assertEqual( json.loads( cache.get( '/luns')[0]), { })
+        
+        cache.update( 'sfa1', SNAPSHOT)
+        (body, gz_body, etag) = cache.get( '/luns/sfa1')
+        self.assertEqual( json.loads( body)['luns']['1']['read_bw'], 10.0)
+        self.assertEqual( gzip.GzipFile( fileobj = StringIO.StringIO( gz_body)).read(), body)
+        self.assertEqual( json.loads( cache.get( '/hosts')[0]), { 'sfa1' : 1000 })
+        self.assertEqual( cache.get( '/bogus'), None)
+        
+        # cached until something changes
+        self.assertTrue( cache.get( '/luns/sfa1')[0] is body)
+        cache.update( 'sfa1', { 'update_time' : 1002, 'luns' : { } })
+        self.assertNotEqual( cache.get( '/luns/sfa1')[2], etag)
+        
+        cache.update( 'sfa1', None)
+        self.assertEqual( cache.get( '/luns/sfa1'), None)
+
+    def testOncePerTick(self):
+        cache = StatusCache()
+        cache.update( 'sfa1', { 'update_time' : 1000, 'luns' : { } })
+        cache.update( 'sfa2', { 'update_time' : 1000, 'luns' : { } })
+        etag = cache.get( '/luns')[2]
+        self.assertEqual( sorted( json.loads( cache.get( '/luns')[0]).keys()),
+                          [ 'sfa1', 'sfa2' ])
+        
+        # Held back until both hosts have sent the next iteration
+        cache.update( 'sfa1', { 'update_time' : 1002, 'luns' : { 1 : { } } })
+        self.assertEqual( cache.get( '/luns')[2], etag)
+        self.assertEqual( json.loads( cache.get( '/luns/sfa1')[0])['update_time'], 1000)
+        cache.update( 'sfa2', { 'update_time' : 1002, 'luns' : { 1 : { } } })
+        etag = cache.get( '/luns')[2]
+        self.assertEqual( json.loads( cache.get( '/hosts')[0]),
+                          { 'sfa1' : 1002, 'sfa2' : 1002 })
+        
+        # sfa2 is stuck:  sfa1's data goes out when its next iteration starts
+        cache.update( 'sfa1', { 'update_time' : 1004, 'luns' : { } })
+        self.assertEqual( cache.get( '/luns')[2], etag)
+        cache.update( 'sfa1', { 'update_time' : 1006, 'luns' : { } })
+        self.assertEqual( json.loads( cache.get( '/hosts')[0]),
+                          { 'sfa1' : 1004, 'sfa2' : 1002 })
+
+
+class HistoryCache_Test( unittest.TestCase):
+    
+    def testRender(self):
+        history = HistoryCache()
+        cache = StatusCache( history)
+        now = time.time()
+        for i in range( 3):
+            history.update( 'sfa1', (1000 + 2 * i, now - 4 + 2 * i,
+                                     { 'read_bw' : 10.0 * i, 'write_bw' : 1.0 }))
+        self.assertEqual( json.loads( cache.get( '/history')[0]),
+                          { 'sfa1' : [ 'read_bw', 'write_bw' ] })
+        
+        data = json.loads( cache.get( '/history/sfa1/read_bw/avg/300')[0])
+        self.assertEqual( data['step'], 2)
+        self.assertEqual( [ v for (t, v) in data['values'] ], [ 0.0, 10.0, 20.0 ])
+        # The default (last hour) comes from the 1 minute tier
+        data = json.loads( cache.get( '/history/sfa1/read_bw')[0])
+        self.assertEqual( (data['step'], data['cf']), (60, 'avg'))
+        data = json.loads( cache.get( '/history/sfa1/read_bw/max/43200')[0])
+        self.assertEqual( data['step'], 60)
+        self.assertEqual( data['values'][-1][1], 20.0)
+        
+        for path in [ '/history/sfa2/read_bw', '/history/sfa1/bogus',
+                      '/history/sfa1/read_bw/median', '/history/sfa1/read_bw/avg/x' ]:
+            self.assertEqual( cache.get( path), None)
+        
+        # Only invalidated once per iteration
+        etag = cache.get( '/history/sfa1/read_bw')[2]
+        history.update( 'sfa1', (1004, now, { 'read_bw' : 0.0, 'write_bw' : 1.0 }))
+        self.assertEqual( cache.get( '/history/sfa1/read_bw')[2], etag)
+        history.update( 'sfa1', (1006, now, { 'read_bw' : 0.0, 'write_bw' : 1.0 }))
+        self.assertNotEqual( cache.get( '/history/sfa1/read_bw')[2], etag)
+        
+        history.update( 'sfa1', None)
+        self.assertEqual( cache.get( '/history/sfa1/read_bw'), None)
+        # Without a HistoryCache, there's no /history
+        self.assertEqual( StatusCache().get( '/history'), None)
+
+
+class MetricsCache_Test( unittest.TestCase):
+    
+    def testMerge(self):
+        cache = MetricsCache()
+        cache.update( 'sfa1', [ ('a_total', 'counter', 'A', ['a_total{sfa_host="sfa1"} 1']),
+                                ('b', 'gauge', 'B', ['b{sfa_host="sfa1"} 2']) ])
+        cache.update( 'sfa2', [ ('a_total', 'counter', 'A', ['a_total{sfa_host="sfa2"} 3']) ])
+        self.assertEqual( cache.get( '/other'), None)
+        self.assertEqual( cache.get( '/metrics')[0].split( '\n'),
+            [ '# HELP a_total A', '# TYPE a_total counter',
+              'a_total{sfa_host="sfa1"} 1', 'a_total{sfa_host="sfa2"} 3',
+              '# HELP b B', '# TYPE b gauge', 'b{sfa_host="sfa1"} 2', '' ])
+        
+
+class StatusServer_Test( unittest.TestCase):
+    
+    def setUp(self):
+        self._queue = Queue.Queue()
+        self._reader = SnapshotReader( self._queue)
+        self._cache = StatusCache()
+        self._reader.register( 'status', self._cache)
+        self._server = StatusServer( '127.0.0.1', 0, self._cache)
+        self._port = self._server.port()
+        self._server.start()
+        self._reader.start()
+        self._queue.put( ('metrics', 'sfa1', [ ]))  # nobody registered - ignored
+        self._queue.put( ('status', 'sfa1', SNAPSHOT))
+        self._wait_for( lambda: self._cache.get( '/luns/sfa1') is not None)
+        
+    def tearDown(self):
+        self._server.stop()
+        self._reader.stop()
+        
+    def _wait_for(self, condition):
+        for unused_i in range( 100):
+            if condition():
+                break
+            time.sleep( 0.01)
+        
+    def _get(self, path, headers = { }):
+        conn = httplib.HTTPConnection( '127.0.0.1', self._port)
+        conn.request( 'GET', path, headers = headers)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return (response, body)
+        
+    def testGet(self):
+        (response, body) = self._get( '/luns/sfa1')
+        self.assertEqual( response.status, 200)
+        self.assertEqual( json.loads( body)['update_time'], 1000)
+        
+        etag = response.getheader( 'ETag')
+        (response, body) = self._get( '/luns/sfa1', { 'If-None-Match' : etag })
+        self.assertEqual( response.status, 304)
+        self.assertEqual( body, '')
+        
+        (response, body) = self._get( '/luns?x=1', { 'Accept-Encoding' : 'gzip' })
+        self.assertEqual( response.getheader( 'Content-Encoding'), 'gzip')
+        
+        (response, body) = self._get( '/nothing')
+        self.assertEqual( response.status, 404)
+        
+    def testHostRemoved(self):
+        self._queue.put( (None, 'sfa1', None))
+        self._wait_for( lambda: self._cache.get( '/luns/sfa1') is None)
+        (response, body) = self._get( '/luns/sfa1')
+        self.assertEqual( response.status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()